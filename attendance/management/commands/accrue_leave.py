@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.utils import LeaveAccrualJob
+
+
+class Command(BaseCommand):
+    help = 'Monthly job: accrue leave for every active employee from the leave accrual rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            help='Year to accrue (default: current year)',
+        )
+        parser.add_argument(
+            '--month',
+            type=int,
+            help='Month to accrue (default: current month)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows written per batch (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        year = options['year'] or today.year
+        month = options['month'] or today.month
+
+        try:
+            job = LeaveAccrualJob(year, month, batch_size=options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        result = job.run()
+
+        if result['already_run']:
+            self.stdout.write(self.style.WARNING(f'Leave for {year}/{month:02d} has already been accrued.'))
+            return
+
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+
+        self.stdout.write(self.style.SUCCESS(f'Accrued leave for {year}/{month:02d}.'))
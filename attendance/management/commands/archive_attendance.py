@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendance.utils import AttendanceArchive
+
+
+class Command(BaseCommand):
+    help = 'Move attendance records of closed payroll years into compressed archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            help='Year to archive (default: every closed year)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the closed years without archiving them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Records read per batch (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        archive = AttendanceArchive(batch_size=options['batch_size'])
+        years = [options['year']] if options['year'] else archive.get_closed_years()
+
+        if not years:
+            self.stdout.write(self.style.WARNING('No closed years to archive.'))
+            return
+
+        if options['dry_run']:
+            for year in years:
+                self.stdout.write(f'  {year}: {archive.get_path(year)}')
+            self.stdout.write(self.style.SUCCESS(f'{len(years)} year(s) would be archived.'))
+            return
+
+        for year in years:
+            try:
+                archived = archive.archive_year(year)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            self.stdout.write(
+                f'  {year}: {archived.record_count} records, {archived.size_bytes} bytes -> {archived.file_name}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {len(years)} year(s).'))
@@ -0,0 +1,124 @@
+import json
+import time
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from employees.models import Employee
+from attendance.utils import flush_attendance_refreshes
+from payroll.utils import QueryCounter
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the check-in and check-out endpoints under a simulated morning rush'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employees',
+            type=int,
+            default=6000,
+            help='Number of employees punching in and out (default: 6000)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the JSON results to this file',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Keep the generated employees and their records instead of deleting them',
+        )
+
+    def handle(self, *args, **options):
+        if options['employees'] < 1:
+            raise CommandError('Employees must be positive.')
+        
+        results = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'employees': options['employees'],
+        }
+        
+        # Run in autocommit like the API does, so commits and on_commit work are measured too
+        employees = self.create_employees(options['employees'])
+        try:
+            client = APIClient()
+            
+            results['check_in'] = self.measure(client, employees, '/api/attendance/attendance/check_in/')
+            results['check_out'] = self.measure(client, employees, '/api/attendance/attendance/check_out/')
+            results['flush'] = self.measure_flush()
+        finally:
+            if not options['keep_data']:
+                # Records, rollups, bitmaps and queued refreshes cascade with the employees
+                Employee.objects.filter(id__in=[employee.id for employee in employees]).delete()
+        
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+            self.stdout.write(f'Results written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def create_employees(self, count):
+        """Create the punching employees in one bulk insert"""
+        password = make_password('benchmark123')
+        
+        return Employee.objects.bulk_create([
+            Employee(
+                username=f'bmpunch{number:06d}',
+                employee_id=f'BMP{number:06d}',
+                password=password,
+                first_name='Benchmark',
+                last_name=str(number),
+            )
+            for number in range(1, count + 1)
+        ], batch_size=5000)
+
+    def measure(self, client, employees, url):
+        """Post one punch per employee and report throughput and latency percentiles"""
+        latencies = []
+        
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            for employee in employees:
+                client.force_authenticate(employee)
+                request_started = time.perf_counter()
+                response = client.post(url, {'location': 'Head office'}, format='json')
+                latencies.append(time.perf_counter() - request_started)
+                
+                if response.status_code != 200:
+                    raise CommandError(f'{url} returned {response.status_code}: {response.data}')
+            wall_time = time.perf_counter() - started
+        
+        latencies.sort()
+        
+        return {
+            'requests': len(latencies),
+            'wall_time': round(wall_time, 4),
+            'requests_per_second': round(len(latencies) / wall_time, 1),
+            'p50_ms': round(self.percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(self.percentile(latencies, 99) * 1000, 3),
+            'queries_per_request': round(counter.count / len(latencies), 2),
+        }
+
+    def measure_flush(self):
+        """Recount the months the punches queued, as the next rollup reader would"""
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            flushed = flush_attendance_refreshes()
+            wall_time = time.perf_counter() - started
+        
+        return {
+            'entries': flushed,
+            'wall_time': round(wall_time, 4),
+            'queries': counter.count,
+        }
+
+    @staticmethod
+    def percentile(sorted_values, percentile):
+        """Get the nearest-rank percentile of sorted values"""
+        index = max(int(round(percentile / 100 * len(sorted_values))) - 1, 0)
+        return sorted_values[index]
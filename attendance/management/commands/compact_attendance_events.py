@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from attendance.utils import AttendanceEventCompactor
+
+
+class Command(BaseCommand):
+    help = 'Fold pending raw punch events into attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Employee-days upserted per batch (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        result = AttendanceEventCompactor(options['batch_size']).run()
+        
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {result['events']} events into {result['records_upserted']} attendance records."
+        ))
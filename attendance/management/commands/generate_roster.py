@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.utils import RosterGenerator
+
+
+class Command(BaseCommand):
+    help = 'Expand shift assignments and rotations into the roster of a month'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            help='Year to generate (default: current year)',
+        )
+        parser.add_argument(
+            '--month',
+            type=int,
+            help='Month to generate (default: current month)',
+        )
+        parser.add_argument(
+            '--employee-ids',
+            type=str,
+            help='Comma-separated employee IDs to regenerate (default: all)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Roster entries inserted per batch (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        year = options['year'] or today.year
+        month = options['month'] or today.month
+        
+        employee_ids = None
+        if options['employee_ids']:
+            try:
+                employee_ids = [int(value) for value in options['employee_ids'].split(',')]
+            except ValueError:
+                raise CommandError('Employee IDs must be comma-separated integers.')
+        
+        try:
+            generator = RosterGenerator(year, month, employee_ids, batch_size=options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        result = generator.run()
+        
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Generated the roster for {year}/{month:02d}.'))
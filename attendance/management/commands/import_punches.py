@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendance.utils import PunchLogImporter
+
+
+class Command(BaseCommand):
+    help = 'Import a door-access punch log export (CSV or JSON Lines) into attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Path to the punch log file',
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=['CSV', 'JSONL'],
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Employee-days upserted per batch (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if not file_format:
+            file_format = 'JSONL' if options['path'].lower().endswith(('.jsonl', '.ndjson')) else 'CSV'
+        
+        importer = PunchLogImporter(file_format, options['batch_size'])
+        
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as punch_file:
+                result = importer.run(punch_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not import punch log: {e}')
+        
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['rows']} punches at {result['rows_per_second']} rows/sec."
+        ))
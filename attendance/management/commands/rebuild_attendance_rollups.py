@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from attendance.utils import rebuild_attendance_rollups, flush_attendance_refreshes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly attendance rollups and yearly bitmaps from attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            help='Only rebuild rollups and bitmaps of this year',
+        )
+        parser.add_argument(
+            '--employee-ids',
+            type=str,
+            help='Comma separated employee primary keys to rebuild',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rollups inserted per batch (default: 5000)',
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only recount the months queued by punches since the last flush',
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            flushed = flush_attendance_refreshes(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Recounted {flushed} queued attendance months.'))
+            return
+        
+        employee_ids = None
+        if options['employee_ids']:
+            employee_ids = [int(pk) for pk in options['employee_ids'].split(',') if pk.strip()]
+        
+        try:
+            created = rebuild_attendance_rollups(
+                year=options['year'],
+                employee_ids=employee_ids,
+                batch_size=options['batch_size']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} monthly attendance rollups and their bitmaps.'))
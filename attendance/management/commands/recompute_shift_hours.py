@@ -0,0 +1,50 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from attendance.models import Shift
+from attendance.utils import ShiftHoursRecalculator
+
+
+class Command(BaseCommand):
+    help = 'Recompute hours and lateness of a shift\'s attendance records after the shift changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'shift_id',
+            type=int,
+            help='ID of the shift to recompute',
+        )
+        parser.add_argument(
+            '--date-from',
+            type=str,
+            help='First date to recompute (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--date-to',
+            type=str,
+            help='Last date to recompute (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Records written per bulk update (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            shift = Shift.objects.get(id=options['shift_id'])
+        except Shift.DoesNotExist:
+            raise CommandError(f'Shift {options["shift_id"]} not found.')
+        
+        try:
+            date_from = datetime.strptime(options['date_from'], '%Y-%m-%d').date() if options['date_from'] else None
+            date_to = datetime.strptime(options['date_to'], '%Y-%m-%d').date() if options['date_to'] else None
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+        
+        result = ShiftHoursRecalculator(shift, date_from, date_to, options['batch_size']).run()
+        
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Recomputed shift {shift.name}.'))
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.utils import OvertimeReconciler
+
+
+class Command(BaseCommand):
+    help = 'Cap punched overtime at approved overtime requests and flag mismatches for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-from',
+            type=str,
+            help='First day to reconcile (YYYY-MM-DD, default: first day of last month)',
+        )
+        parser.add_argument(
+            '--date-to',
+            type=str,
+            help='Last day to reconcile (YYYY-MM-DD, default: yesterday)',
+        )
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        try:
+            if options['date_to']:
+                date_to = datetime.strptime(options['date_to'], '%Y-%m-%d').date()
+            else:
+                date_to = yesterday
+            if options['date_from']:
+                date_from = datetime.strptime(options['date_from'], '%Y-%m-%d').date()
+            else:
+                date_from = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+        except ValueError:
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+        
+        try:
+            reconciler = OvertimeReconciler(date_from, date_to)
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        result = reconciler.run()
+        
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Reconciled overtime from {date_from} to {date_to}.'))
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from attendance.utils import AttendanceSweeper
+
+
+class Command(BaseCommand):
+    help = 'Nightly sweep: mark missing working days ABSENT or LEAVE and auto-close dangling check-ins'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Last day to sweep (YYYY-MM-DD, default: yesterday)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Number of days to sweep back from the last day (default: 1)',
+        )
+        parser.add_argument(
+            '--close-policy',
+            type=str,
+            choices=AttendanceSweeper.CLOSE_POLICIES,
+            help='How to close check-ins without a check-out (default: ATTENDANCE_AUTO_CLOSE_POLICY)',
+        )
+        parser.add_argument(
+            '--close-hours',
+            type=int,
+            help='Hours credited by the FIXED_HOURS policy (default: ATTENDANCE_AUTO_CLOSE_HOURS)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Records written per batch (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['date']:
+                date_to = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            else:
+                date_to = timezone.localdate() - timedelta(days=1)
+        except ValueError:
+            raise CommandError('Date must be in YYYY-MM-DD format.')
+        
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+        date_from = date_to - timedelta(days=options['days'] - 1)
+        
+        try:
+            sweeper = AttendanceSweeper(
+                date_from,
+                date_to,
+                close_policy=options['close_policy'],
+                close_hours=options['close_hours'],
+                batch_size=options['batch_size']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        result = sweeper.run()
+        
+        for key, value in result.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS(f'Swept attendance from {date_from} to {date_to}.'))
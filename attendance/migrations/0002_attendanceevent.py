@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event_type', models.CharField(choices=[('IN', 'Check In'), ('OUT', 'Check Out'), ('PUNCH', 'Punch')], default='PUNCH', max_length=10)),
+                ('source', models.CharField(choices=[('API', 'API'), ('DEVICE', 'Device'), ('IMPORT', 'Import')], default='API', max_length=10)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('is_compacted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['is_compacted', 'id'], name='attendance__is_comp_10fa7e_idx'), models.Index(fields=['employee', 'timestamp'], name='attendance__employe_7086f1_idx')],
+            },
+        ),
+    ]
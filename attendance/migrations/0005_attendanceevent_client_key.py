@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_attendancebitmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendanceevent',
+            name='client_key',
+            field=models.CharField(blank=True, help_text='Idempotency key of punches replayed by offline devices', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_attendanceevent_client_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaveapplication',
+            index=models.Index(fields=['employee', 'status', 'start_date', 'end_date'], name='leave_employee_interval'),
+        ),
+        migrations.AddIndex(
+            model_name='leaveapplication',
+            index=models.Index(fields=['status', 'start_date', 'end_date', 'employee'], name='leave_status_interval'),
+        ),
+    ]
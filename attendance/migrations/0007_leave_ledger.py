@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_employee_counters(apps, schema_editor):
+    LeaveType = apps.get_model('attendance', 'LeaveType')
+    for name, field in [
+        ('Annual Leave', 'annual_leave_balance'),
+        ('Sick Leave', 'sick_leave_balance'),
+        ('Casual Leave', 'casual_leave_balance'),
+    ]:
+        LeaveType.objects.filter(name=name).update(employee_balance_field=field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_leave_interval_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leavetype',
+            name='employee_balance_field',
+            field=models.CharField(blank=True, choices=[('annual_leave_balance', 'Annual leave balance'), ('sick_leave_balance', 'Sick leave balance'), ('casual_leave_balance', 'Casual leave balance')], help_text="Employee counter kept in step with this type's ledger balance", max_length=30),
+        ),
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('accrued', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=6)),
+                ('used', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=6)),
+                ('adjusted', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=6)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=6)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balances', to=settings.AUTH_USER_MODEL)),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='attendance.leavetype')),
+            ],
+            options={
+                'ordering': ['-year', 'leave_type__name'],
+                'unique_together': {('employee', 'leave_type', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('entry_type', models.CharField(choices=[('ACCRUAL', 'Accrual'), ('USAGE', 'Usage'), ('ADJUSTMENT', 'Adjustment')], max_length=10)),
+                ('days', models.DecimalField(decimal_places=2, help_text='Signed change to the balance', max_digits=6)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_leave_entries', to=settings.AUTH_USER_MODEL)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_ledger_entries', to=settings.AUTH_USER_MODEL)),
+                ('leave_application', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='attendance.leaveapplication')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='attendance.leavetype')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['employee', 'leave_type', 'year'], name='attendance__employe_985dce_idx')],
+            },
+        ),
+        migrations.RunPython(link_employee_counters, migrations.RunPython.noop),
+    ]
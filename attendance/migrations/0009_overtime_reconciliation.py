@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:27
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_leave_accrual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancemonthlyrollup',
+            name='payable_overtime_hours',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='overtime_status',
+            field=models.CharField(choices=[('NONE', 'No Overtime'), ('MATCHED', 'Matches Approval'), ('CAPPED', 'Capped at Approval'), ('UNAPPROVED', 'Not Approved'), ('UNDER', 'Below Approval')], default='NONE', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='payable_overtime_hours',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_overtime_reconciliation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftRotation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShiftAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rotation_offset', models.PositiveSmallIntegerField(default=0, help_text='Rotation slot worked on the start date')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_shift_assignments', to=settings.AUTH_USER_MODEL)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shift_assignments', to=settings.AUTH_USER_MODEL)),
+                ('shift', models.ForeignKey(blank=True, help_text='Fixed shift worked on every working day', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='assignments', to='attendance.shift')),
+                ('rotation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='assignments', to='attendance.shiftrotation')),
+            ],
+            options={
+                'ordering': ['employee', '-start_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShiftRotationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('rotation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='attendance.shiftrotation')),
+                ('shift', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='rotation_slots', to='attendance.shift')),
+            ],
+            options={
+                'ordering': ['rotation', 'position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RosterEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roster_entries', to=settings.AUTH_USER_MODEL)),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='roster_entries', to='attendance.shift')),
+                ('assignment', models.ForeignKey(blank=True, help_text='Empty for manual overrides, which regeneration keeps', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='roster_entries', to='attendance.shiftassignment')),
+            ],
+            options={
+                'ordering': ['date', 'employee'],
+                'indexes': [models.Index(fields=['date', 'shift'], name='attendance__date_cdf121_idx')],
+                'unique_together': {('employee', 'date')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shiftassignment',
+            index=models.Index(fields=['start_date', 'end_date'], name='attendance__start_d_201f04_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='shiftrotationslot',
+            unique_together={('rotation', 'position')},
+        ),
+    ]
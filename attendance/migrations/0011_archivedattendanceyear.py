@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0010_shift_roster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendanceYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(unique=True)),
+                ('file_name', models.CharField(max_length=255)),
+                ('record_count', models.IntegerField(default=0)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-year'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0011_archivedattendanceyear'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['date', 'updated_at'], name='attendance__date_72375e_idx'),
+        ),
+    ]
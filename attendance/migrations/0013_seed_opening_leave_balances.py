@@ -0,0 +1,70 @@
+from decimal import Decimal, ROUND_FLOOR
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def seed_opening_balances(apps, schema_editor):
+    """Open this year's linked balances from the legacy Employee counters, once
+    
+    The counters held the allowance of the year the ledger was introduced. Every
+    later year opens from the leave type entitlement instead.
+    """
+    Employee = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    LeaveType = apps.get_model('attendance', 'LeaveType')
+    LeaveApplication = apps.get_model('attendance', 'LeaveApplication')
+    LeaveBalance = apps.get_model('attendance', 'LeaveBalance')
+    LeaveLedgerEntry = apps.get_model('attendance', 'LeaveLedgerEntry')
+    
+    year = timezone.now().year
+    for leave_type in LeaveType.objects.exclude(employee_balance_field=''):
+        field = leave_type.employee_balance_field
+        opened = LeaveBalance.objects.filter(leave_type=leave_type, year=year).values('employee_id')
+        used = dict(
+            LeaveApplication.objects.filter(
+                leave_type=leave_type, status='APPROVED', start_date__year=year
+            ).values('employee_id').annotate(total_days=Sum('total_days')).values_list('employee_id', 'total_days')
+        )
+        
+        balances, entries, employees = [], [], []
+        for employee in Employee.objects.exclude(id__in=opened).only('id', field).iterator(chunk_size=2000):
+            accrued = Decimal(getattr(employee, field))
+            balance = LeaveBalance(
+                employee_id=employee.id, leave_type=leave_type, year=year,
+                accrued=accrued, used=Decimal(used.get(employee.id, 0)),
+            )
+            balance.balance = balance.accrued - balance.used
+            balances.append(balance)
+            
+            if balance.accrued:
+                entries.append(LeaveLedgerEntry(
+                    employee_id=employee.id, leave_type=leave_type, year=year, entry_type='ACCRUAL',
+                    days=balance.accrued, balance_after=balance.accrued, description='Opening entitlement'
+                ))
+            if balance.used:
+                entries.append(LeaveLedgerEntry(
+                    employee_id=employee.id, leave_type=leave_type, year=year, entry_type='USAGE',
+                    days=-balance.used, balance_after=balance.balance,
+                    description='Leave approved before the ledger'
+                ))
+            
+            # The counter follows the ledger balance from now on
+            setattr(employee, field, int(balance.balance.to_integral_value(rounding=ROUND_FLOOR)))
+            employees.append(employee)
+        
+        LeaveBalance.objects.bulk_create(balances, batch_size=2000)
+        LeaveLedgerEntry.objects.bulk_create(entries, batch_size=2000)
+        Employee.objects.bulk_update(employees, [field], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0012_attendancerecord_presence_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_materialized_leave(apps, schema_editor):
+    """Link the LEAVE records approvals already materialized to their application"""
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    LeaveApplication = apps.get_model('attendance', 'LeaveApplication')
+    
+    applications = LeaveApplication.objects.filter(status='APPROVED').values_list(
+        'id', 'employee_id', 'start_date', 'end_date'
+    )
+    for application_id, employee_id, start_date, end_date in applications.iterator():
+        AttendanceRecord.objects.filter(
+            employee_id=employee_id, date__range=[start_date, end_date], status='LEAVE',
+            time_in__isnull=True, notes='Approved leave', leave_application__isnull=True
+        ).update(leave_application_id=application_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0013_seed_opening_leave_balances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='leave_application',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_records', to='attendance.leaveapplication'),
+        ),
+        migrations.RunPython(link_materialized_leave, migrations.RunPython.noop),
+    ]
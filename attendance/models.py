@@ -1,7 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_EVEN
 from datetime import datetime, time, timedelta
 from employees.models import Employee
 
@@ -52,6 +52,140 @@ class Shift(models.Model):
             self.working_hours = Decimal(str(working_duration.total_seconds() / 3600))
         
         super().save(*args, **kwargs)
+        
+        from .utils import shift_cache
+        shift_cache.clear()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        
+        from .utils import shift_cache
+        shift_cache.clear()
+        
+        return result
+
+
+class ShiftRotation(models.Model):
+    """Repeating cycle of shifts, one slot per day of the cycle"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    description = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def pattern(self):
+        """Get the shift ID of each day of the cycle, None for days off"""
+        return [slot.shift_id for slot in self.slots.all()]
+
+
+class ShiftRotationSlot(models.Model):
+    """One day of a shift rotation, a slot without a shift is a day off"""
+    
+    rotation = models.ForeignKey(ShiftRotation, on_delete=models.CASCADE, related_name='slots')
+    position = models.PositiveSmallIntegerField()
+    shift = models.ForeignKey(
+        Shift,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='rotation_slots'
+    )
+
+    class Meta:
+        ordering = ['rotation', 'position']
+        unique_together = ['rotation', 'position']
+
+    def __str__(self):
+        return f"{self.rotation.name} day {self.position + 1}: {self.shift.name if self.shift else 'Off'}"
+
+
+class ShiftAssignment(models.Model):
+    """Assignment of an employee to a fixed shift or a rotation over a date range"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='shift_assignments')
+    shift = models.ForeignKey(
+        Shift,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='assignments',
+        help_text="Fixed shift worked on every working day"
+    )
+    rotation = models.ForeignKey(
+        ShiftRotation,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='assignments'
+    )
+    rotation_offset = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Rotation slot worked on the start date"
+    )
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='created_shift_assignments'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['employee', '-start_date']
+        indexes = [
+            models.Index(fields=['start_date', 'end_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.shift or self.rotation} from {self.start_date}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        
+        if bool(self.shift_id) == bool(self.rotation_id):
+            raise ValidationError("Assign either a shift or a rotation.")
+        
+        if self.end_date and self.start_date and self.start_date > self.end_date:
+            raise ValidationError("Start date cannot be after end date.")
+
+
+class RosterEntry(models.Model):
+    """The shift an employee works on one day, expanded from their assignment"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='roster_entries')
+    date = models.DateField()
+    shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='roster_entries')
+    assignment = models.ForeignKey(
+        ShiftAssignment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='roster_entries',
+        help_text="Empty for manual overrides, which regeneration keeps"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['date', 'employee']
+        unique_together = ['employee', 'date']
+        indexes = [
+            models.Index(fields=['date', 'shift']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.date}: {self.shift_id}"
 
 
 class AttendanceRecord(models.Model):
@@ -66,6 +200,14 @@ class AttendanceRecord(models.Model):
         ('LEAVE', 'On Leave'),
     ]
     
+    OVERTIME_STATUS_CHOICES = [
+        ('NONE', 'No Overtime'),
+        ('MATCHED', 'Matches Approval'),
+        ('CAPPED', 'Capped at Approval'),
+        ('UNAPPROVED', 'Not Approved'),
+        ('UNDER', 'Below Approval'),
+    ]
+    
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records')
     date = models.DateField()
     shift = models.ForeignKey(Shift, on_delete=models.SET_NULL, null=True, blank=True)
@@ -92,6 +234,14 @@ class AttendanceRecord(models.Model):
         decimal_places=2, 
         default=Decimal('0.00')
     )
+    
+    # Overtime reconciled against approved overtime requests
+    payable_overtime_hours = models.DecimalField(
+        max_digits=5, 
+        decimal_places=2, 
+        default=Decimal('0.00')
+    )
+    overtime_status = models.CharField(max_length=10, choices=OVERTIME_STATUS_CHOICES, default='NONE')
     break_duration = models.DecimalField(
         max_digits=4, 
         decimal_places=2, 
@@ -119,18 +269,57 @@ class AttendanceRecord(models.Model):
     )
     approved_at = models.DateTimeField(null=True, blank=True)
     
+    # Approved leave the record was materialized from, hand-made LEAVE records have none
+    leave_application = models.ForeignKey(
+        'LeaveApplication',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='attendance_records'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # Fields that feed the monthly rollup
+    ROLLUP_FIELDS = {
+        'employee_id', 'date', 'status', 'is_late', 'total_hours',
+        'regular_hours', 'overtime_hours', 'payable_overtime_hours'
+    }
 
     class Meta:
         ordering = ['-date', '-time_in']
         unique_together = ['employee', 'date']
+        indexes = [
+            # Presence feeds poll today's records by last change
+            models.Index(fields=['date', 'updated_at']),
+        ]
 
     def __str__(self):
         return f"{self.employee.get_full_name()} - {self.date} ({self.status})"
 
+    def calculate_lateness(self):
+        """Flag a check-in after the start of the record's shift"""
+        from .utils import shift_cache
+        shift = shift_cache.get(self.shift_id)
+        
+        if shift and self.time_in:
+            expected_time = datetime.combine(self.date, shift.start_time)
+            expected_time = timezone.make_aware(expected_time)
+            
+            if self.time_in > expected_time:
+                self.is_late = True
+                late_duration = self.time_in - expected_time
+                self.late_minutes = int(late_duration.total_seconds() / 60)
+            else:
+                self.is_late = False
+                self.late_minutes = 0
+
     def calculate_hours(self):
         """Calculate total hours, regular hours, and overtime"""
+        # Lateness is known from the check-in alone
+        self.calculate_lateness()
+        
         if not self.time_in or not self.time_out:
             return
         
@@ -145,9 +334,13 @@ class AttendanceRecord(models.Model):
         
         self.total_hours = Decimal(str(total_time.total_seconds() / 3600))
         
+        # Resolve the shift from the in-process cache instead of a lazy load
+        from .utils import shift_cache
+        shift = shift_cache.get(self.shift_id)
+        
         # Calculate regular and overtime hours
-        if self.shift:
-            expected_hours = self.shift.working_hours
+        if shift:
+            expected_hours = shift.working_hours
         else:
             expected_hours = Decimal('8.0')  # Default 8 hours
         
@@ -157,23 +350,263 @@ class AttendanceRecord(models.Model):
         else:
             self.regular_hours = expected_hours
             self.overtime_hours = self.total_hours - expected_hours
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this record contributes to its monthly rollup and bitmap
+        instance._rollup_snapshot = instance.get_rollup_contribution()
+        instance._bitmap_snapshot = instance.get_bitmap_contribution()
+        return instance
+
+    def get_rollup_contribution(self):
+        """Get (employee_id, year, month, counters) this record adds to its rollup"""
+        if self.ROLLUP_FIELDS & self.get_deferred_fields():
+            return None
         
-        # Check if late
-        if self.shift and self.time_in:
-            expected_time = datetime.combine(self.date, self.shift.start_time)
-            expected_time = timezone.make_aware(expected_time)
+        def stored(value):
+            # Match the value the database keeps for a 2 decimal place field
+            return Decimal(value or 0).quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN)
+        
+        return (
+            self.employee_id,
+            self.date.year,
+            self.date.month,
+            {
+                'total_records': 1,
+                'present_days': int(self.status == 'PRESENT'),
+                'absent_days': int(self.status == 'ABSENT'),
+                'leave_days': int(self.status == 'LEAVE'),
+                'late_days': int(bool(self.is_late)),
+                'total_hours': stored(self.total_hours),
+                'regular_hours': stored(self.regular_hours),
+                'overtime_hours': stored(self.overtime_hours),
+                'payable_overtime_hours': stored(self.payable_overtime_hours),
+            }
+        )
+
+    def get_bitmap_contribution(self):
+        """Get (employee_id, date, flags) this record sets in its attendance bitmap"""
+        if {'employee_id', 'date', 'status', 'is_late'} & self.get_deferred_fields():
+            return None
+        
+        from .utils import bitmap_flags
+        return (self.employee_id, self.date, bitmap_flags(self.status, self.is_late))
+
+    def save(self, *args, defer_rollups=False, **kwargs):
+        """Save the record and move its rollup and bitmap contribution
+        
+        With defer_rollups the month is only queued for a recount by the next
+        reader, which keeps punches off the shared rollup and bitmap rows.
+        """
+        from .utils import (
+            apply_rollup_change, apply_bitmap_change, refresh_attendance_rollups, attendance_changed,
+            defer_attendance_refresh, get_archived_years
+        )
+        
+        # Archived years only keep their rollups and bitmaps, a new record would desync them.
+        # Only closed past years are archived, so punches for today skip the lookup.
+        if self.date.year < timezone.localdate().year and self.date.year in get_archived_years():
+            raise ValueError(f"Attendance of {self.date.year} is archived, its records cannot be changed.")
+        
+        adding = self._state.adding
+        snapshot = getattr(self, '_rollup_snapshot', None)
+        bitmap_snapshot = getattr(self, '_bitmap_snapshot', None)
+        
+        self.calculate_hours()
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            contribution = self.get_rollup_contribution()
+            bitmap_contribution = self.get_bitmap_contribution()
             
-            if self.time_in > expected_time:
-                self.is_late = True
-                late_duration = self.time_in - expected_time
-                self.late_minutes = int(late_duration.total_seconds() / 60)
+            if defer_rollups:
+                keys = {(self.employee_id, self.date.year, self.date.month)}
+                if snapshot:
+                    keys.add(snapshot[:3])
+                defer_attendance_refresh(keys)
+            elif contribution and (adding or snapshot):
+                apply_rollup_change(snapshot, contribution)
+                apply_bitmap_change(bitmap_snapshot, bitmap_contribution)
             else:
-                self.is_late = False
-                self.late_minutes = 0
+                # Previous contribution unknown, recount the month from its records
+                refresh_attendance_rollups({(self.employee_id, self.date.year, self.date.month)})
+            if not defer_rollups:
+                attendance_changed()
+        self._rollup_snapshot = contribution
+        self._bitmap_snapshot = bitmap_contribution
 
-    def save(self, *args, **kwargs):
-        self.calculate_hours()
-        super().save(*args, **kwargs)
+    def delete(self, *args, **kwargs):
+        from .utils import (
+            apply_rollup_change, apply_bitmap_change, refresh_attendance_rollups, attendance_changed
+        )
+        
+        snapshot = getattr(self, '_rollup_snapshot', None)
+        bitmap_snapshot = getattr(self, '_bitmap_snapshot', None)
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            AttendanceDeletion.objects.create(employee_id=self.employee_id, date=self.date)
+            if snapshot:
+                apply_rollup_change(snapshot, None)
+                apply_bitmap_change(bitmap_snapshot, None)
+            else:
+                refresh_attendance_rollups({(self.employee_id, self.date.year, self.date.month)})
+            attendance_changed()
+        self._rollup_snapshot = None
+        self._bitmap_snapshot = None
+        
+        return result
+
+
+class AttendanceDeletion(models.Model):
+    """Employee day whose attendance record was deleted, so later corrections can find it"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_deletions')
+    date = models.DateField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-deleted_at']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.date} deleted {self.deleted_at}"
+
+
+class AttendanceMonthlyRollup(models.Model):
+    """Per-employee monthly attendance totals, kept in step with AttendanceRecord"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_rollups')
+    year = models.IntegerField()
+    month = models.IntegerField()
+    
+    # Day counters
+    total_records = models.IntegerField(default=0)
+    present_days = models.IntegerField(default=0)
+    absent_days = models.IntegerField(default=0)
+    leave_days = models.IntegerField(default=0)
+    late_days = models.IntegerField(default=0)
+    
+    # Hour totals
+    total_hours = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    regular_hours = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    overtime_hours = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    payable_overtime_hours = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('0.00'))
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = ['employee', 'year', 'month']
+        indexes = [
+            models.Index(fields=['year', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.year}/{self.month:02d}"
+
+
+class PendingAttendanceRefresh(models.Model):
+    """Employee month whose rollup and bitmap wait for a recount, appended by punches"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='pending_attendance_refreshes')
+    year = models.IntegerField()
+    month = models.IntegerField()
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.year}/{self.month:02d} queued {self.queued_at}"
+
+
+class AttendanceBitmap(models.Model):
+    """Per-employee yearly attendance bitmaps, one bit per day of the year for each kind"""
+    
+    # Bit i (little-endian) of each bitmap is day i + 1 of the year
+    BITMAP_BYTES = 46  # 366 bits
+    KINDS = ['present', 'late', 'leave']
+    PRESENT_STATUSES = ['PRESENT', 'LATE', 'HALF_DAY']
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_bitmaps')
+    year = models.IntegerField()
+    present = models.BinaryField(max_length=BITMAP_BYTES, default=bytes(BITMAP_BYTES))
+    late = models.BinaryField(max_length=BITMAP_BYTES, default=bytes(BITMAP_BYTES))
+    leave = models.BinaryField(max_length=BITMAP_BYTES, default=bytes(BITMAP_BYTES))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year']
+        unique_together = ['employee', 'year']
+        indexes = [
+            models.Index(fields=['year']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.year}"
+
+    def get_bits(self, kind):
+        """Get a bitmap as an integer"""
+        return int.from_bytes(bytes(getattr(self, kind)), 'little')
+
+    def set_bits(self, kind, bits):
+        """Store an integer as a bitmap"""
+        setattr(self, kind, bits.to_bytes(self.BITMAP_BYTES, 'little'))
+
+
+class ArchivedAttendanceYear(models.Model):
+    """A closed year whose attendance records were moved to a compressed archive file"""
+    
+    year = models.IntegerField(unique=True)
+    file_name = models.CharField(max_length=255)
+    record_count = models.IntegerField(default=0)
+    size_bytes = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-year']
+
+    def __str__(self):
+        return f"Attendance {self.year} ({self.record_count} records)"
+
+
+class AttendanceEvent(models.Model):
+    """Append-only log of raw punches, folded into AttendanceRecord by compaction"""
+    
+    EVENT_TYPE_CHOICES = [
+        ('IN', 'Check In'),
+        ('OUT', 'Check Out'),
+        ('PUNCH', 'Punch'),
+    ]
+    
+    SOURCE_CHOICES = [
+        ('API', 'API'),
+        ('DEVICE', 'Device'),
+        ('IMPORT', 'Import'),
+    ]
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_events')
+    timestamp = models.DateTimeField(default=timezone.now)
+    event_type = models.CharField(max_length=10, choices=EVENT_TYPE_CHOICES, default='PUNCH')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='API')
+    location = models.CharField(max_length=200, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    client_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True,
+        help_text="Idempotency key of punches replayed by offline devices"
+    )
+    is_compacted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['is_compacted', 'id']),
+            models.Index(fields=['employee', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.event_type} at {self.timestamp}"
 
 
 class LeaveType(models.Model):
@@ -187,6 +620,16 @@ class LeaveType(models.Model):
     is_paid = models.BooleanField(default=True)
     requires_approval = models.BooleanField(default=True)
     advance_notice_days = models.IntegerField(default=1)  # Minimum days notice required
+    employee_balance_field = models.CharField(
+        max_length=30,
+        choices=[
+            ('annual_leave_balance', 'Annual leave balance'),
+            ('sick_leave_balance', 'Sick leave balance'),
+            ('casual_leave_balance', 'Casual leave balance'),
+        ],
+        blank=True,
+        help_text="Employee counter kept in step with this type's ledger balance"
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -198,6 +641,46 @@ class LeaveType(models.Model):
         return self.name
 
 
+class LeaveAccrualRule(models.Model):
+    """Days of a leave type accrued each month by employees of one employment type"""
+    
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, related_name='accrual_rules')
+    employment_type = models.CharField(max_length=20, choices=Employee.EMPLOYMENT_TYPE_CHOICES)
+    days_per_month = models.DecimalField(
+        max_digits=4,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['leave_type__name', 'employment_type']
+        unique_together = ['leave_type', 'employment_type']
+
+    def __str__(self):
+        return f"{self.leave_type.name} - {self.employment_type}: {self.days_per_month}/month"
+
+
+class LeaveAccrualRun(models.Model):
+    """Record of a completed monthly accrual, one per month so reruns are skipped"""
+    
+    year = models.IntegerField()
+    month = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(12)])
+    employees_accrued = models.IntegerField(default=0)
+    entries_created = models.IntegerField(default=0)
+    days_accrued = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = ['year', 'month']
+
+    def __str__(self):
+        return f"Leave accrual {self.year}/{self.month:02d}"
+
+
 class LeaveApplication(models.Model):
     """Model for leave applications"""
     
@@ -238,8 +721,16 @@ class LeaveApplication(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Statuses that block overlapping applications and show on leave calendars
+    ACTIVE_STATUSES = ['PENDING', 'APPROVED']
+
     class Meta:
         ordering = ['-applied_at']
+        indexes = [
+            # Interval indexes: status and start narrow the scan, end_date and employee are covered
+            models.Index(fields=['employee', 'status', 'start_date', 'end_date'], name='leave_employee_interval'),
+            models.Index(fields=['status', 'start_date', 'end_date', 'employee'], name='leave_status_interval'),
+        ]
 
     def __str__(self):
         return f"{self.employee.get_full_name()} - {self.leave_type.name} ({self.start_date} to {self.end_date})"
@@ -259,19 +750,134 @@ class LeaveApplication(models.Model):
         super().save(*args, **kwargs)
 
     def approve(self, approved_by):
-        """Approve the leave application"""
-        self.status = 'APPROVED'
-        self.approved_by = approved_by
-        self.approved_at = timezone.now()
-        self.save()
+        """Approve the leave application, record its usage in the leave ledger and mark its days on leave"""
+        from .utils import materialize_leave_days, post_leave_entry
+        
+        with transaction.atomic():
+            # Lock the application so concurrent approvals post the usage once
+            previous_status = LeaveApplication.objects.select_for_update().values_list(
+                'status', flat=True
+            ).get(pk=self.pk)
+            if previous_status == 'APPROVED':
+                raise ValueError("Leave application is already approved.")
+            
+            # Post before saving, a balance opened here must not count this application yet
+            post_leave_entry(
+                self.employee, self.leave_type, self.start_date.year, 'USAGE', -self.total_days,
+                application=self, created_by=approved_by, description=f"Leave {self.start_date} to {self.end_date}"
+            )
+            
+            self.status = 'APPROVED'
+            self.approved_by = approved_by
+            self.approved_at = timezone.now()
+            self.save()
+            materialize_leave_days([self])
+
+    def release(self, released_by, description):
+        """Return the days of an approved application and remove its LEAVE records"""
+        from .utils import clear_leave_days, post_leave_entry
+        
+        post_leave_entry(
+            self.employee, self.leave_type, self.start_date.year, 'USAGE', self.total_days,
+            application=self, created_by=released_by, description=description
+        )
+        clear_leave_days([self])
 
     def reject(self, rejected_by, reason):
-        """Reject the leave application"""
-        self.status = 'REJECTED'
-        self.approved_by = rejected_by
-        self.approved_at = timezone.now()
-        self.rejection_reason = reason
-        self.save()
+        """Reject the leave application, returning its days if it was approved"""
+        with transaction.atomic():
+            previous_status = LeaveApplication.objects.select_for_update().values_list(
+                'status', flat=True
+            ).get(pk=self.pk)
+            
+            if previous_status == 'APPROVED':
+                self.release(rejected_by, f"Rejected after approval. {reason}".strip())
+            
+            self.status = 'REJECTED'
+            self.approved_by = rejected_by
+            self.approved_at = timezone.now()
+            self.rejection_reason = reason
+            self.save()
+
+    def cancel(self, cancelled_by):
+        """Cancel the leave application, returning its days if it was approved"""
+        with transaction.atomic():
+            previous_status = LeaveApplication.objects.select_for_update().values_list(
+                'status', flat=True
+            ).get(pk=self.pk)
+            if previous_status in ['REJECTED', 'CANCELLED']:
+                raise ValueError(f"Leave application is already {previous_status.lower()}.")
+            
+            if previous_status == 'APPROVED':
+                self.release(cancelled_by, "Cancelled after approval.")
+            
+            self.status = 'CANCELLED'
+            self.save()
+
+
+class LeaveBalance(models.Model):
+    """Running leave balance per employee, leave type and year, maintained by the leave ledger"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_balances')
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, related_name='balances')
+    year = models.IntegerField()
+    
+    # Totals of the ledger entries, balance = accrued - used + adjusted
+    accrued = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal('0.00'))
+    used = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal('0.00'))
+    adjusted = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal('0.00'))
+    balance = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal('0.00'))
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-year', 'leave_type__name']
+        unique_together = ['employee', 'leave_type', 'year']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.leave_type_id} {self.year}: {self.balance}"
+
+
+class LeaveLedgerEntry(models.Model):
+    """Append-only leave ledger, each entry moves one LeaveBalance"""
+    
+    ENTRY_TYPE_CHOICES = [
+        ('ACCRUAL', 'Accrual'),
+        ('USAGE', 'Usage'),
+        ('ADJUSTMENT', 'Adjustment'),
+    ]
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_ledger_entries')
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, related_name='ledger_entries')
+    year = models.IntegerField()
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPE_CHOICES)
+    days = models.DecimalField(max_digits=6, decimal_places=2, help_text="Signed change to the balance")
+    balance_after = models.DecimalField(max_digits=6, decimal_places=2)
+    leave_application = models.ForeignKey(
+        LeaveApplication,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries'
+    )
+    description = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='created_leave_entries'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['employee', 'leave_type', 'year']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.entry_type} {self.days}"
 
 
 class OvertimeRequest(models.Model):
@@ -1,9 +1,15 @@
+import calendar
 from rest_framework import serializers
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
 from .models import (
-    Shift, AttendanceRecord, LeaveType, LeaveApplication, OvertimeRequest
+    Shift, ShiftRotation, ShiftRotationSlot, ShiftAssignment, RosterEntry, AttendanceRecord,
+    LeaveType, LeaveAccrualRule, LeaveApplication, LeaveBalance, LeaveLedgerEntry, OvertimeRequest,
+    ArchivedAttendanceYear
 )
+from .utils import overlapping_leaves
 from employees.models import Employee
 
 
@@ -22,10 +28,125 @@ class ShiftSerializer(serializers.ModelSerializer):
         read_only_fields = ['working_hours', 'created_at', 'updated_at']
     
     def get_employee_count(self, obj):
-        """Get number of employees assigned to this shift"""
-        # This would require a shift assignment model or field
-        # For now, return 0 as placeholder
-        return 0
+        """Get number of employees rostered on this shift today"""
+        # Annotated by ShiftViewSet, a single shift falls back to one query
+        if hasattr(obj, 'employee_count'):
+            return obj.employee_count
+        return obj.roster_entries.filter(date=timezone.localdate()).count()
+
+
+class ShiftRotationSerializer(serializers.ModelSerializer):
+    """Serializer for ShiftRotation model"""
+    
+    pattern = serializers.ListField(
+        child=serializers.IntegerField(allow_null=True),
+        allow_empty=False,
+        max_length=62,
+        help_text="Shift ID worked on each day of the cycle, null for a day off"
+    )
+    
+    class Meta:
+        model = ShiftRotation
+        fields = ['id', 'name', 'description', 'pattern', 'is_active', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+    
+    def validate_pattern(self, value):
+        """Validate the shifts of the cycle"""
+        shift_ids = {shift_id for shift_id in value if shift_id is not None}
+        if not shift_ids:
+            raise serializers.ValidationError("A rotation needs at least one working day.")
+        
+        found = set(Shift.objects.filter(id__in=shift_ids, is_active=True).values_list('id', flat=True))
+        if shift_ids - found:
+            raise serializers.ValidationError(
+                f"Unknown or inactive shifts: {', '.join(str(shift_id) for shift_id in sorted(shift_ids - found))}"
+            )
+        
+        return value
+    
+    def save_pattern(self, rotation, pattern):
+        """Replace the slots of a rotation"""
+        rotation.slots.all().delete()
+        ShiftRotationSlot.objects.bulk_create([
+            ShiftRotationSlot(rotation=rotation, position=position, shift_id=shift_id)
+            for position, shift_id in enumerate(pattern)
+        ])
+    
+    def create(self, validated_data):
+        """Create a rotation with its slots"""
+        pattern = validated_data.pop('pattern')
+        with transaction.atomic():
+            rotation = super().create(validated_data)
+            self.save_pattern(rotation, pattern)
+        return rotation
+    
+    def update(self, instance, validated_data):
+        """Update a rotation, replacing its slots when a pattern is given"""
+        pattern = validated_data.pop('pattern', None)
+        with transaction.atomic():
+            rotation = super().update(instance, validated_data)
+            if pattern is not None:
+                self.save_pattern(rotation, pattern)
+        return rotation
+
+
+class ShiftAssignmentSerializer(serializers.ModelSerializer):
+    """Serializer for ShiftAssignment model"""
+    
+    employee_name = serializers.CharField(source='employee.get_full_name', read_only=True)
+    shift_name = serializers.CharField(source='shift.name', read_only=True)
+    rotation_name = serializers.CharField(source='rotation.name', read_only=True)
+    
+    class Meta:
+        model = ShiftAssignment
+        fields = [
+            'id', 'employee', 'employee_name', 'shift', 'shift_name', 'rotation',
+            'rotation_name', 'rotation_offset', 'start_date', 'end_date',
+            'created_by', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_by', 'created_at', 'updated_at']
+    
+    def validate(self, attrs):
+        """Validate assignment data"""
+        shift = attrs.get('shift', getattr(self.instance, 'shift', None))
+        rotation = attrs.get('rotation', getattr(self.instance, 'rotation', None))
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        
+        if bool(shift) == bool(rotation):
+            raise serializers.ValidationError("Assign either a shift or a rotation.")
+        
+        if end_date and start_date > end_date:
+            raise serializers.ValidationError("Start date cannot be after end date.")
+        
+        return attrs
+
+
+class RosterEntrySerializer(serializers.ModelSerializer):
+    """Serializer for RosterEntry model, entries written through the API are manual overrides"""
+    
+    employee_name = serializers.CharField(source='employee.get_full_name', read_only=True)
+    shift_name = serializers.CharField(source='shift.name', read_only=True)
+    
+    class Meta:
+        model = RosterEntry
+        fields = [
+            'id', 'employee', 'employee_name', 'date', 'shift', 'shift_name',
+            'assignment', 'created_at'
+        ]
+        read_only_fields = ['assignment', 'created_at']
+
+
+class RosterGenerateSerializer(serializers.Serializer):
+    """Serializer for roster generation parameters"""
+    
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    month = serializers.IntegerField(min_value=1, max_value=12)
+    employee_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False
+    )
 
 
 class AttendanceRecordListSerializer(serializers.ModelSerializer):
@@ -41,8 +162,8 @@ class AttendanceRecordListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'employee', 'employee_name', 'employee_id', 'date',
             'shift', 'shift_name', 'time_in', 'time_out', 'total_hours',
-            'regular_hours', 'overtime_hours', 'status', 'is_late',
-            'late_minutes', 'approved_by', 'approved_by_name', 'approved_at'
+            'regular_hours', 'overtime_hours', 'payable_overtime_hours', 'overtime_status',
+            'status', 'is_late', 'late_minutes', 'approved_by', 'approved_by_name', 'approved_at'
         ]
 
 
@@ -60,15 +181,22 @@ class AttendanceRecordDetailSerializer(serializers.ModelSerializer):
             'id', 'employee', 'employee_name', 'employee_id', 'date',
             'shift', 'shift_name', 'time_in', 'time_out', 'break_start',
             'break_end', 'total_hours', 'regular_hours', 'overtime_hours',
-            'break_duration', 'status', 'is_late', 'late_minutes', 'notes',
+            'payable_overtime_hours', 'overtime_status', 'break_duration', 'status', 'is_late', 'late_minutes', 'notes',
             'check_in_location', 'check_out_location', 'ip_address',
-            'approved_by', 'approved_by_name', 'approved_at',
+            'approved_by', 'approved_by_name', 'approved_at', 'leave_application',
             'created_at', 'updated_at'
         ]
         read_only_fields = [
-            'total_hours', 'regular_hours', 'overtime_hours', 'break_duration',
-            'is_late', 'late_minutes', 'created_at', 'updated_at'
+            'total_hours', 'regular_hours', 'overtime_hours', 'payable_overtime_hours',
+            'overtime_status', 'break_duration', 'is_late', 'late_minutes', 'leave_application',
+            'created_at', 'updated_at'
         ]
+    
+    def validate_date(self, value):
+        """Reject dates in archived years"""
+        if ArchivedAttendanceYear.objects.filter(year=value.year).exists():
+            raise serializers.ValidationError(f"Attendance of {value.year} is archived.")
+        return value
 
 
 class AttendanceRecordCreateSerializer(serializers.ModelSerializer):
@@ -82,6 +210,12 @@ class AttendanceRecordCreateSerializer(serializers.ModelSerializer):
             'check_in_location', 'check_out_location'
         ]
     
+    def validate_date(self, value):
+        """Reject dates in archived years"""
+        if ArchivedAttendanceYear.objects.filter(year=value.year).exists():
+            raise serializers.ValidationError(f"Attendance of {value.year} is archived.")
+        return value
+    
     def validate(self, attrs):
         """Validate attendance record data"""
         employee = attrs.get('employee')
@@ -118,17 +252,6 @@ class CheckInSerializer(serializers.Serializer):
     
     location = serializers.CharField(max_length=200, required=False, allow_blank=True)
     notes = serializers.CharField(max_length=500, required=False, allow_blank=True)
-    
-    def validate(self, attrs):
-        """Validate check-in data"""
-        user = self.context['request'].user
-        today = timezone.now().date()
-        
-        # Check if already checked in today
-        if AttendanceRecord.objects.filter(employee=user, date=today, time_in__isnull=False).exists():
-            raise serializers.ValidationError("You have already checked in today.")
-        
-        return attrs
 
 
 class CheckOutSerializer(serializers.Serializer):
@@ -136,25 +259,56 @@ class CheckOutSerializer(serializers.Serializer):
     
     location = serializers.CharField(max_length=200, required=False, allow_blank=True)
     notes = serializers.CharField(max_length=500, required=False, allow_blank=True)
+
+
+class ShiftRecomputeSerializer(serializers.Serializer):
+    """Serializer for shift hours recomputation parameters"""
+    
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
     
     def validate(self, attrs):
-        """Validate check-out data"""
-        user = self.context['request'].user
-        today = timezone.now().date()
-        
-        # Check if checked in today
-        try:
-            attendance = AttendanceRecord.objects.get(employee=user, date=today)
-            if not attendance.time_in:
-                raise serializers.ValidationError("You must check in before checking out.")
-            if attendance.time_out:
-                raise serializers.ValidationError("You have already checked out today.")
-        except AttendanceRecord.DoesNotExist:
-            raise serializers.ValidationError("No check-in record found for today.")
-        
+        """Validate the date range"""
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must be before date_to.")
         return attrs
 
 
+class PunchSerializer(serializers.Serializer):
+    """Serializer for appending a raw punch event"""
+    
+    event_type = serializers.ChoiceField(choices=['IN', 'OUT', 'PUNCH'], default='PUNCH')
+    location = serializers.CharField(max_length=200, required=False, allow_blank=True)
+
+
+class PunchSyncItemSerializer(serializers.Serializer):
+    """Serializer for one punch buffered by an offline kiosk"""
+    
+    client_key = serializers.CharField(max_length=64, help_text="Idempotency key generated by the kiosk")
+    employee_id = serializers.CharField(max_length=20)
+    event_type = serializers.ChoiceField(choices=['IN', 'OUT', 'PUNCH'], default='PUNCH')
+    timestamp = serializers.DateTimeField()
+    location = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+
+class PunchSyncSerializer(serializers.Serializer):
+    """Serializer for a batch of kiosk punches, items are validated one by one"""
+    
+    punches = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'PUNCH_SYNC_MAX_BATCH', 1000)
+    )
+
+
+class PunchImportSerializer(serializers.Serializer):
+    """Serializer for punch log imports"""
+    
+    file = serializers.FileField(help_text="CSV or JSON Lines export with employee_id and timestamp")
+    file_format = serializers.ChoiceField(choices=['CSV', 'JSONL'], default='CSV')
+    batch_size = serializers.IntegerField(default=5000, min_value=100, max_value=50000)
+
+
 class LeaveTypeSerializer(serializers.ModelSerializer):
     """Serializer for LeaveType model"""
     
@@ -162,8 +316,22 @@ class LeaveTypeSerializer(serializers.ModelSerializer):
         model = LeaveType
         fields = [
             'id', 'name', 'description', 'max_days_per_year', 'is_paid',
-            'requires_approval', 'advance_notice_days', 'is_active',
-            'created_at', 'updated_at'
+            'requires_approval', 'advance_notice_days', 'employee_balance_field',
+            'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class LeaveAccrualRuleSerializer(serializers.ModelSerializer):
+    """Serializer for LeaveAccrualRule model"""
+    
+    leave_type_name = serializers.CharField(source='leave_type.name', read_only=True)
+    
+    class Meta:
+        model = LeaveAccrualRule
+        fields = [
+            'id', 'leave_type', 'leave_type_name', 'employment_type', 'days_per_month',
+            'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
@@ -239,12 +407,7 @@ class LeaveApplicationCreateSerializer(serializers.ModelSerializer):
         
         # Check for overlapping leave applications
         employee = self.context['request'].user
-        overlapping = LeaveApplication.objects.filter(
-            employee=employee,
-            status__in=['PENDING', 'APPROVED'],
-            start_date__lte=end_date,
-            end_date__gte=start_date
-        )
+        overlapping = overlapping_leaves(start_date, end_date).filter(employee=employee)
         
         if overlapping.exists():
             raise serializers.ValidationError("You have overlapping leave applications.")
@@ -257,6 +420,86 @@ class LeaveApplicationCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class LeaveCalendarSerializer(serializers.Serializer):
+    """Serializer for team leave calendar query parameters"""
+    
+    department = serializers.IntegerField(required=False)
+    quarter = serializers.RegexField(r'^\d{4}-Q[1-4]$', required=False, help_text="e.g. 2024-Q3")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    status = serializers.MultipleChoiceField(choices=LeaveApplication.ACTIVE_STATUSES, required=False)
+    
+    @staticmethod
+    def quarter_bounds(year, quarter):
+        """Get the first and last day of a quarter"""
+        last_month = quarter * 3
+        return date(year, last_month - 2, 1), date(year, last_month, calendar.monthrange(year, last_month)[1])
+    
+    def validate(self, attrs):
+        """Resolve the date range, defaulting to the current quarter"""
+        if attrs.get('quarter'):
+            year, quarter = attrs['quarter'].split('-Q')
+            attrs['date_from'], attrs['date_to'] = self.quarter_bounds(int(year), int(quarter))
+        elif not attrs.get('date_from') and not attrs.get('date_to'):
+            today = timezone.now().date()
+            attrs['date_from'], attrs['date_to'] = self.quarter_bounds(today.year, (today.month - 1) // 3 + 1)
+        elif not attrs.get('date_from') or not attrs.get('date_to'):
+            raise serializers.ValidationError("Provide both date_from and date_to, or a quarter.")
+        
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("Start date cannot be after end date.")
+        if (attrs['date_to'] - attrs['date_from']).days > 366:
+            raise serializers.ValidationError("The calendar covers at most one year.")
+        
+        return attrs
+
+
+class LeaveBalanceSerializer(serializers.ModelSerializer):
+    """Serializer for LeaveBalance model"""
+    
+    leave_type_name = serializers.CharField(source='leave_type.name', read_only=True)
+    
+    class Meta:
+        model = LeaveBalance
+        fields = [
+            'id', 'employee', 'leave_type', 'leave_type_name', 'year',
+            'accrued', 'used', 'adjusted', 'balance', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class LeaveLedgerEntrySerializer(serializers.ModelSerializer):
+    """Serializer for LeaveLedgerEntry model"""
+    
+    leave_type_name = serializers.CharField(source='leave_type.name', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
+    
+    class Meta:
+        model = LeaveLedgerEntry
+        fields = [
+            'id', 'employee', 'leave_type', 'leave_type_name', 'year', 'entry_type',
+            'days', 'balance_after', 'leave_application', 'description',
+            'created_by', 'created_by_name', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+class LeaveAdjustmentSerializer(serializers.Serializer):
+    """Serializer for manual leave balance adjustments"""
+    
+    employee = serializers.PrimaryKeyRelatedField(queryset=Employee.objects.all())
+    leave_type = serializers.PrimaryKeyRelatedField(queryset=LeaveType.objects.all())
+    year = serializers.IntegerField(required=False, min_value=2000, max_value=2100)
+    days = serializers.DecimalField(max_digits=6, decimal_places=2)
+    description = serializers.CharField(max_length=200)
+    
+    def validate_days(self, value):
+        """Validate the adjustment changes the balance"""
+        if value == 0:
+            raise serializers.ValidationError("Adjustment cannot be zero days.")
+        return value
+
+
 class LeaveApprovalSerializer(serializers.Serializer):
     """Serializer for approving/rejecting leave applications"""
     
@@ -274,6 +517,65 @@ class LeaveApprovalSerializer(serializers.Serializer):
         return attrs
 
 
+class LeaveBulkApprovalSerializer(serializers.Serializer):
+    """Serializer for approving many leave applications at once"""
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=getattr(settings, 'LEAVE_BULK_APPROVAL_MAX_BATCH', 500)
+    )
+    
+    def validate_ids(self, value):
+        """Drop repeated IDs, keeping their first position"""
+        return list(dict.fromkeys(value))
+
+
+class BulkReviewSerializer(serializers.Serializer):
+    """Serializer for approving or rejecting many records selected by ID or by filters"""
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=getattr(settings, 'BULK_REVIEW_MAX_BATCH', 1000)
+    )
+    employee = serializers.IntegerField(required=False)
+    department = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    reason = serializers.CharField(max_length=500, required=False, allow_blank=True)
+    
+    def validate_ids(self, value):
+        """Drop repeated IDs, keeping their first position"""
+        return list(dict.fromkeys(value))
+    
+    def validate(self, attrs):
+        """Validate the selection"""
+        if not any(attrs.get(field) for field in ['ids', 'employee', 'department', 'date_from', 'date_to']):
+            raise serializers.ValidationError("Select records by ids or by at least one filter.")
+        
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("Start date cannot be after end date.")
+        
+        return attrs
+    
+    def filter_queryset(self, queryset):
+        """Narrow a queryset to the selected records"""
+        data = self.validated_data
+        
+        if data.get('employee'):
+            queryset = queryset.filter(employee_id=data['employee'])
+        if data.get('department'):
+            queryset = queryset.filter(employee__department_id=data['department'])
+        if data.get('date_from'):
+            queryset = queryset.filter(date__gte=data['date_from'])
+        if data.get('date_to'):
+            queryset = queryset.filter(date__lte=data['date_to'])
+        
+        return queryset
+
+
 class OvertimeRequestListSerializer(serializers.ModelSerializer):
     """Serializer for OvertimeRequest list view"""
     
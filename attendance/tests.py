@@ -1,3 +1,990 @@
+import asyncio
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from employees.models import Department, Employee
+from payroll.models import Holiday, Payroll, PayrollPeriod
+from . import utils
+from .models import (
+    Shift, ShiftRotation, ShiftRotationSlot, ShiftAssignment, RosterEntry, AttendanceRecord,
+    AttendanceMonthlyRollup, AttendanceBitmap, LeaveType, LeaveAccrualRule, LeaveApplication, LeaveBalance,
+    LeaveLedgerEntry, PendingAttendanceRefresh, AttendanceEvent, OvertimeRequest
+)
+from .utils import (
+    ROLLUP_COUNTERS, rebuild_attendance_rollups, refresh_attendance_rollups, get_leave_balance,
+    post_leave_entry, LeaveAccrualJob, AttendanceArchive, summarize_attendance, PunchLogImporter,
+    AttendanceEventCompactor, ShiftHoursRecalculator, AttendanceSweeper, PresenceFeed,
+    PunchSyncer, RosterGenerator, build_leave_calendar
+)
+from .views import PresenceHub
+
+
+def make_record(employee, day, hours=8, **kwargs):
+    """Create a record checked in at 9:00 for a number of hours"""
+    time_in = timezone.make_aware(datetime.combine(day, time(9, 0)))
+    return AttendanceRecord.objects.create(
+        employee=employee, date=day, time_in=time_in, time_out=time_in + timedelta(hours=hours), **kwargs
+    )
+
+
+class AttendanceRollupTests(TestCase):
+    """Incremental rollup and bitmap updates must match a rebuild from the records"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.other = Employee.objects.create(username='bob', employee_id='EMP0002')
+
+    def get_rollups(self):
+        return {
+            (rollup['employee_id'], rollup['year'], rollup['month']): rollup
+            for rollup in AttendanceMonthlyRollup.objects.values('employee_id', 'year', 'month', *ROLLUP_COUNTERS)
+        }
+
+    def get_bitmaps(self):
+        return {
+            (bitmap.employee_id, bitmap.year): tuple(bitmap.get_bits(kind) for kind in bitmap.KINDS)
+            for bitmap in AttendanceBitmap.objects.all()
+        }
+
+    def get_state(self):
+        # Emptied months and years keep zeroed rows incrementally, a rebuild drops them
+        rollups = {key: rollup for key, rollup in self.get_rollups().items() if rollup['total_records']}
+        bitmaps = {key: bits for key, bits in self.get_bitmaps().items() if any(bits)}
+        return rollups, bitmaps
+
+    def assertMatchesRebuild(self):
+        state = self.get_state()
+        rebuild_attendance_rollups()
+        self.assertEqual(state, self.get_state())
+
+    def test_create(self):
+        for day in range(5, 10):
+            make_record(self.employee, date(2026, 1, day), hours=10)
+        make_record(self.other, date(2026, 1, 5))
+        AttendanceRecord.objects.create(employee=self.employee, date=date(2026, 1, 12), status='ABSENT')
+
+        rollup = AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2026, month=1)
+        self.assertEqual(rollup.total_records, 6)
+        self.assertEqual(rollup.present_days, 5)
+        self.assertEqual(rollup.absent_days, 1)
+        self.assertEqual(rollup.total_hours, Decimal('50.00'))
+        self.assertEqual(rollup.overtime_hours, Decimal('10.00'))
+        self.assertMatchesRebuild()
+
+    def test_update_hours(self):
+        record = make_record(self.employee, date(2026, 2, 2))
+        make_record(self.employee, date(2026, 2, 3))
+
+        record.time_out = record.time_in + timedelta(hours=11)
+        record.save()
+
+        rollup = AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2026, month=2)
+        self.assertEqual(rollup.total_hours, Decimal('19.00'))
+        self.assertEqual(rollup.overtime_hours, Decimal('3.00'))
+        self.assertMatchesRebuild()
+
+    def test_status_change(self):
+        record = make_record(self.employee, date(2026, 3, 2))
+
+        record.status = 'LEAVE'
+        record.save()
+
+        rollup = AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2026, month=3)
+        self.assertEqual((rollup.present_days, rollup.leave_days), (0, 1))
+        self.assertMatchesRebuild()
+
+    def test_move_across_months(self):
+        record = make_record(self.employee, date(2026, 3, 31))
+
+        record.date = date(2026, 4, 1)
+        record.save()
+
+        rollups = self.get_rollups()
+        self.assertEqual(rollups[(self.employee.id, 2026, 3)]['total_records'], 0)
+        self.assertEqual(rollups[(self.employee.id, 2026, 4)]['total_records'], 1)
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        make_record(self.employee, date(2026, 5, 4))
+        record = make_record(self.employee, date(2026, 5, 5), is_late=True)
+
+        record.delete()
+
+        rollup = AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2026, month=5)
+        self.assertEqual((rollup.total_records, rollup.late_days), (1, 0))
+        self.assertEqual(rollup.total_hours, Decimal('8.00'))
+        self.assertMatchesRebuild()
+
+    def test_save_with_deferred_fields(self):
+        make_record(self.employee, date(2026, 6, 1))
+
+        # The previous contribution is unknown, so the month is recounted
+        record = AttendanceRecord.objects.only('id', 'employee', 'date', 'time_in', 'time_out').get()
+        record.status = 'ABSENT'
+        record.save()
+
+        rollup = AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2026, month=6)
+        self.assertEqual((rollup.present_days, rollup.absent_days), (0, 1))
+        self.assertMatchesRebuild()
+
+
+class PunchTests(TestCase):
+    """Punches only queue their month, the next reader brings rollups and bitmaps up to date"""
+
+    def setUp(self):
+        self.employees = [
+            Employee.objects.create(username=f'user{index}', employee_id=f'EMP{index:04d}')
+            for index in range(1, 4)
+        ]
+        self.client = APIClient()
+
+    def punch(self, employee, action):
+        self.client.force_authenticate(employee)
+        response = self.client.post(f'/api/attendance/attendance/{action}/', {'location': 'Gate'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_check_in_queries(self):
+        self.punch(self.employees[0], 'check_in')
+
+        # Savepoint, record insert, queue insert and release, with nothing left for on_commit
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, self.assertNumQueries(4):
+            self.punch(self.employees[1], 'check_in')
+        self.assertEqual(callbacks, [])
+
+        # Record read, record update and queue insert
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, self.assertNumQueries(3):
+            self.punch(self.employees[1], 'check_out')
+        self.assertEqual(callbacks, [])
+
+    def test_readers_flush_the_queue(self):
+        for employee in self.employees:
+            self.punch(employee, 'check_in')
+        self.punch(self.employees[0], 'check_out')
+        self.assertEqual(PendingAttendanceRefresh.objects.count(), 4)
+        self.assertFalse(AttendanceMonthlyRollup.objects.exists())
+
+        today = timezone.localdate()
+        summaries = summarize_attendance(*utils.month_bounds(today.year, today.month))
+
+        self.assertFalse(PendingAttendanceRefresh.objects.exists())
+        self.assertEqual({summary['present_days'] for summary in summaries.values()}, {1})
+        rollups = list(AttendanceMonthlyRollup.objects.order_by('employee_id').values_list('employee_id', 'present_days'))
+        bitmaps = AttendanceBitmap.objects.filter(year=today.year)
+        self.assertEqual(rollups, [(employee.id, 1) for employee in self.employees])
+        self.assertEqual({bitmap.get_bits('present') for bitmap in bitmaps}, {utils.day_bit(today)})
+
+    def test_stats_see_punches(self):
+        admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True)
+        stats_client = APIClient()
+        stats_client.force_authenticate(admin)
+        self.assertEqual(stats_client.get('/api/attendance/attendance/stats/').data['total_records'], 0)
+
+        self.punch(self.employees[0], 'check_in')
+
+        self.assertEqual(stats_client.get('/api/attendance/attendance/stats/').data['total_records'], 1)
+
+
+class PunchLogImporterTests(TestCase):
+    """Re-importing a punch log, whole or in parts, leaves the same records"""
+
+    LOG = [
+        'employee_id,timestamp',
+        'EMP0001,2026-03-02T08:55:00',
+        'EMP0002,2026-03-02T09:10:00',
+        'EMP0001,2026-03-02T17:05:00',
+        'EMP0002,not a time',
+        'EMP0001,2026-03-03T09:00:00',
+        'EMP9999,2026-03-02T09:00:00',
+        'EMP0002,2026-03-02T18:00:00',
+        'EMP0001,2026-03-03T12:30:00',
+    ]
+
+    def setUp(self):
+        self.alice = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.bob = Employee.objects.create(username='bob', employee_id='EMP0002')
+
+    def run_import(self, lines, batch_size=5000):
+        return PunchLogImporter('CSV', batch_size).run(lines)
+
+    def get_records(self):
+        return sorted(AttendanceRecord.objects.values_list(
+            'employee__employee_id', 'date', 'time_in', 'time_out', 'total_hours', 'status'
+        ))
+
+    def test_reimport(self):
+        result = self.run_import(self.LOG)
+        records = self.get_records()
+
+        self.assertEqual((result['rows'], result['invalid_rows'], result['invalid_lines']), (8, 1, [5]))
+        self.assertEqual((result['records_upserted'], result['unknown_employees']), (3, ['EMP9999']))
+        self.assertEqual([record[4] for record in records], [Decimal('8.17'), Decimal('3.50'), Decimal('8.83')])
+
+        self.run_import(self.LOG)
+        self.assertEqual(self.get_records(), records)
+
+        # Batches of one day each, with the log replayed in two overlapping parts
+        self.run_import(self.LOG[:5], batch_size=1)
+        self.run_import(self.LOG[:1] + self.LOG[3:], batch_size=1)
+        self.assertEqual(self.get_records(), records)
+
+    def test_parts_extend_the_day(self):
+        self.run_import(self.LOG[:1] + self.LOG[2:3])
+        self.run_import(self.LOG[:1] + self.LOG[7:8])
+        # A single punch already inside the day does not shrink it
+        self.run_import(self.LOG[:1] + self.LOG[2:3])
+
+        record = AttendanceRecord.objects.get(employee=self.bob)
+        self.assertEqual((record.time_in.hour, record.time_out.hour), (9, 18))
+        self.assertEqual(summarize_attendance(date(2026, 3, 1), date(2026, 3, 31))[self.bob.id]['present_days'], 1)
+
+    def test_jsonl(self):
+        lines = [
+            '{"employee_id": "EMP0001", "timestamp": "2026-03-02T09:00:00"}',
+            '{"employee_id": "EMP0001", "timestamp": "2026-03-02T17:00:00"}',
+            '{broken',
+            '',
+        ]
+        result = PunchLogImporter('JSONL').run(lines)
+
+        self.assertEqual((result['rows'], result['invalid_lines'], result['records_upserted']), (3, [3], 1))
+        self.assertEqual(AttendanceRecord.objects.get().total_hours, Decimal('8.00'))
+
+
+class AttendanceEventCompactorTests(TestCase):
+    """Compaction folds each event in once, and folding them again changes nothing"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+
+    def log(self, day, hour, minute=0):
+        return AttendanceEvent.objects.create(
+            employee=self.employee, timestamp=timezone.make_aware(datetime.combine(day, time(hour, minute)))
+        )
+
+    def get_records(self):
+        return list(AttendanceRecord.objects.order_by('date').values_list('date', 'time_in', 'time_out', 'total_hours'))
+
+    def test_rerun(self):
+        for hour in (9, 12, 17):
+            self.log(date(2026, 4, 6), hour)
+        self.log(date(2026, 4, 7), 8, 30)
+
+        first = AttendanceEventCompactor().run()
+        records = self.get_records()
+        second = AttendanceEventCompactor().run()
+
+        self.assertEqual((first['events'], first['records_upserted']), (4, 2))
+        self.assertEqual((second['events'], second['records_upserted']), (0, 0))
+        self.assertEqual(self.get_records(), records)
+        self.assertEqual(records[0][3], Decimal('8.00'))
+        self.assertIsNone(records[1][2])
+        self.assertFalse(AttendanceEvent.objects.filter(is_compacted=False).exists())
+
+        # Replaying the whole log again, one event per batch, leaves the same records
+        AttendanceEvent.objects.update(is_compacted=False)
+        AttendanceEventCompactor(batch_size=1).run()
+        self.assertEqual(self.get_records(), records)
+
+    def test_late_events_extend_the_day(self):
+        self.log(date(2026, 4, 7), 8, 30)
+        AttendanceEventCompactor().run()
+
+        self.log(date(2026, 4, 7), 16, 30)
+        result = AttendanceEventCompactor().run()
+
+        self.assertEqual(result['events'], 1)
+        record = AttendanceRecord.objects.get()
+        self.assertEqual(record.total_hours, Decimal('8.00'))
+        self.assertEqual(summarize_attendance(date(2026, 4, 1), date(2026, 4, 30))[self.employee.id]['total_hours'], Decimal('8.00'))
+
+
+class AttendanceStatsCacheTests(TestCase):
+    """Cached stats are served until a write bumps the version, which never expires"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get_stats(self):
+        return self.client.get('/api/attendance/attendance/stats/', {'date_from': '2026-05-01'}).data
+
+    def test_writes_invalidate(self):
+        make_record(self.employee, date(2026, 5, 4))
+        self.assertEqual(self.get_stats()['total_records'], 1)
+
+        # Served from the cache while nothing changes
+        AttendanceRecord.objects.filter(employee=self.employee).update(status='ABSENT')
+        self.assertEqual(self.get_stats()['present_days'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_record(self.employee, date(2026, 5, 5))
+        stats = self.get_stats()
+        self.assertEqual((stats['total_records'], stats['present_days']), (2, 1))
+
+    def test_version_never_expires(self):
+        versions = {utils.get_attendance_stats_version()}
+        for _ in range(3):
+            utils.bump_attendance_stats_version()
+            versions.add(utils.get_attendance_stats_version())
+        self.assertEqual(len(versions), 4)
+
+        stats_cache = utils.get_stats_cache()
+        if not isinstance(stats_cache, DatabaseCache):
+            self.skipTest('Expiry is read from the database cache table')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT expires FROM {stats_cache._table} WHERE cache_key = %s',
+                [stats_cache.make_key(utils.ATTENDANCE_STATS_VERSION_KEY)]
+            )
+            self.assertEqual(cursor.fetchone()[0].year, 9999)
+
+
+class ShiftHoursRecalculatorTests(TestCase):
+    """Recomputing a shift's records must match a fresh calculation and flag open payrolls"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.other = Employee.objects.create(username='bob', employee_id='EMP0002')
+        self.shift = Shift.objects.create(name='Day', start_time=time(9, 0), end_time=time(17, 0))
+        for day in range(5, 10):
+            make_record(self.employee, date(2026, 1, day), hours=8, shift=self.shift)
+            make_record(self.other, date(2026, 1, day), hours=9, shift=self.shift)
+        make_record(self.employee, date(2026, 1, 12), hours=8)
+
+    def create_payroll(self, employee, start_date, end_date, status):
+        period, _ = PayrollPeriod.objects.get_or_create(
+            name=start_date.strftime('%B %Y'), start_date=start_date, end_date=end_date,
+            defaults={'pay_date': end_date + timedelta(days=5)}
+        )
+        return Payroll.objects.create(employee=employee, payroll_period=period, status=status)
+
+    def test_recompute(self):
+        self.assertEqual(AttendanceRecord.objects.get(employee=self.employee, date=date(2026, 1, 5)).overtime_hours, 1)
+        self.shift.start_time = time(8, 0)
+        self.shift.save()
+
+        result = ShiftHoursRecalculator(self.shift).run()
+
+        self.assertEqual(result['records_checked'], 10)
+        self.assertEqual(result['records_updated'], 10)
+        self.assertEqual(result['employees_affected'], 2)
+        for record in AttendanceRecord.objects.filter(shift=self.shift):
+            values = (record.regular_hours, record.overtime_hours, record.is_late, record.late_minutes)
+            record.calculate_hours()
+            self.assertEqual(values, (record.regular_hours, record.overtime_hours, record.is_late, record.late_minutes))
+            self.assertEqual(record.late_minutes, 60)
+        self.assertEqual(
+            AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2026, month=1).overtime_hours, 0
+        )
+        rollups = list(AttendanceMonthlyRollup.objects.order_by('employee_id', 'month').values(*ROLLUP_COUNTERS))
+        rebuild_attendance_rollups()
+        self.assertEqual(
+            rollups, list(AttendanceMonthlyRollup.objects.order_by('employee_id', 'month').values(*ROLLUP_COUNTERS))
+        )
+
+        # Nothing changed since, a second run leaves every record alone
+        self.assertEqual(ShiftHoursRecalculator(self.shift).run()['records_updated'], 0)
+
+    def test_date_range(self):
+        self.shift.start_time = time(8, 0)
+        self.shift.save()
+
+        result = ShiftHoursRecalculator(self.shift, date(2026, 1, 6), date(2026, 1, 7)).run()
+
+        self.assertEqual((result['records_checked'], result['records_updated']), (4, 4))
+        self.assertFalse(AttendanceRecord.objects.get(employee=self.employee, date=date(2026, 1, 5)).is_late)
+
+    def test_marks_open_payrolls_stale(self):
+        calculated = self.create_payroll(self.employee, date(2026, 1, 1), date(2026, 1, 31), 'CALCULATED')
+        approved = self.create_payroll(self.other, date(2026, 1, 1), date(2026, 1, 31), 'APPROVED')
+        february = self.create_payroll(self.employee, date(2026, 2, 1), date(2026, 2, 28), 'DRAFT')
+        self.shift.end_time = time(16, 0)
+        self.shift.save()
+
+        result = ShiftHoursRecalculator(self.shift).run()
+
+        self.assertEqual(result['payrolls_marked_stale'], 1)
+        calculated.refresh_from_db()
+        approved.refresh_from_db()
+        february.refresh_from_db()
+        self.assertEqual((calculated.is_stale, approved.is_stale, february.is_stale), (True, False, False))
+
+
+class AttendanceSweeperTests(TestCase):
+    """The sweep fills each missing working day once and reports only the rows it wrote"""
+
+    def setUp(self):
+        self.annual = LeaveType.objects.create(name='Annual Leave', max_days_per_year=21, advance_notice_days=0)
+        self.alice = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.bob = Employee.objects.create(username='bob', employee_id='EMP0002', hire_date=date(2026, 3, 4))
+        self.carol = Employee.objects.create(
+            username='carol', employee_id='EMP0003', termination_date=date(2026, 3, 3)
+        )
+        Employee.objects.create(username='dave', employee_id='EMP0004', is_active=False)
+        make_record(self.alice, date(2026, 3, 2))
+        AttendanceRecord.objects.create(
+            employee=self.alice, date=date(2026, 3, 3),
+            time_in=timezone.make_aware(datetime(2026, 3, 3, 9, 0))
+        )
+        self.leave = LeaveApplication.objects.create(
+            employee=self.alice, leave_type=self.annual, start_date=date(2026, 3, 5),
+            end_date=date(2026, 3, 6), reason='Holiday', status='APPROVED'
+        )
+
+    def sweep(self, date_from=date(2026, 3, 2), date_to=date(2026, 3, 8)):
+        return AttendanceSweeper(date_from, date_to, close_policy='FIXED_HOURS', close_hours=8).run()
+
+    def test_fill_and_close(self):
+        result = self.sweep()
+
+        self.assertEqual(result['absent_created'], 6)
+        self.assertEqual(result['leave_created'], 2)
+        self.assertEqual(result['check_ins_closed'], 1)
+        records = {
+            (record.employee_id, record.date): record
+            for record in AttendanceRecord.objects.filter(notes=AttendanceSweeper.SWEEP_NOTE)
+        }
+        self.assertEqual(sorted(day.day for employee_id, day in records if employee_id == self.bob.id), [4, 5, 6])
+        self.assertEqual(sorted(day.day for employee_id, day in records if employee_id == self.carol.id), [2, 3])
+        for day in (5, 6):
+            record = records[(self.alice.id, date(2026, 3, day))]
+            self.assertEqual((record.status, record.leave_application_id), ('LEAVE', self.leave.id))
+        self.assertEqual(records[(self.alice.id, date(2026, 3, 4))].status, 'ABSENT')
+        self.assertEqual(
+            AttendanceRecord.objects.get(employee=self.alice, date=date(2026, 3, 3)).total_hours, Decimal('8.00')
+        )
+
+        # Everything is filled, sweeping again writes nothing
+        self.assertEqual(self.sweep(), {
+            'absent_created': 0, 'leave_created': 0, 'check_ins_closed': 0, 'payrolls_marked_stale': 0
+        })
+
+    def test_conflicts_are_not_counted(self):
+        # A punch landing between the select and the insert
+        with mock.patch.object(AttendanceSweeper, 'get_existing', return_value=set()):
+            result = self.sweep(date_to=date(2026, 3, 2))
+
+        self.assertEqual((result['absent_created'], result['leave_created']), (1, 0))
+        self.assertEqual(AttendanceRecord.objects.get(employee=self.alice, date=date(2026, 3, 2)).status, 'PRESENT')
+
+    def test_queries_do_not_grow_with_days(self):
+        # Holidays, records, leaves, staff, one insert and the count of inserted rows
+        with self.assertNumQueries(6):
+            AttendanceSweeper(date(2026, 3, 2), date(2026, 3, 2)).fill_missing_days({})
+        with self.assertNumQueries(6):
+            AttendanceSweeper(date(2026, 3, 3), date(2026, 3, 8)).fill_missing_days({})
+
+
+class PresenceHubTests(TestCase):
+    """Open streams share one poll per process and only see their own department"""
+
+    def setUp(self):
+        self.sales = Department.objects.create(name='Sales')
+        self.support = Department.objects.create(name='Support')
+        self.alice = Employee.objects.create(username='alice', employee_id='EMP0001', department=self.sales)
+        self.bob = Employee.objects.create(username='bob', employee_id='EMP0002', department=self.support)
+        self.today = timezone.now().date()
+        self.check_in(self.alice)
+
+    def check_in(self, employee):
+        return AttendanceRecord.objects.create(employee=employee, date=self.today, time_in=timezone.now())
+
+    def run_hub(self, scenario):
+        hub = PresenceHub(interval=0.01)
+        polls = []
+        poll = PresenceFeed.poll
+
+        def counted_poll(feed):
+            polls.append(feed)
+            return poll(feed)
+
+        with mock.patch.object(PresenceFeed, 'poll', counted_poll):
+            async_to_sync(scenario)(hub)
+        return hub, polls
+
+    def test_fan_out(self):
+        async def scenario(hub):
+            everyone = await hub.subscribe()
+            sales = await hub.subscribe(self.sales.id)
+            self.assertEqual((await everyone.get())[1]['count'], 1)
+            self.assertEqual((await sales.get())[1]['count'], 1)
+
+            record = await sync_to_async(self.check_in)(self.bob)
+            event, entry, cursor = await asyncio.wait_for(everyone.get(), 5)
+            self.assertEqual((event, entry['employee']), ('check_in', self.bob.id))
+
+            record.time_out = timezone.now()
+            await sync_to_async(record.save)()
+            self.assertEqual((await asyncio.wait_for(everyone.get(), 5))[0], 'check_out')
+            # Support changes never reach the sales stream
+            self.assertTrue(sales.empty())
+
+            hub.unsubscribe(everyone)
+            hub.unsubscribe(sales)
+            await asyncio.wait_for(hub.task, 5)
+
+        hub, polls = self.run_hub(scenario)
+
+        self.assertTrue(polls)
+        self.assertTrue(all(feed is hub.feed for feed in polls))
+        self.assertIsNone(hub.task)
+
+    def test_resume(self):
+        since = timezone.now()
+        self.check_in(self.bob)
+
+        async def scenario(hub):
+            support = await hub.subscribe(self.support.id, since)
+            event, entry, cursor = support.get_nowait()
+            self.assertEqual((event, entry['employee']), ('check_in', self.bob.id))
+            self.assertTrue(support.empty())
+            hub.unsubscribe(support)
+            await asyncio.wait_for(hub.task, 5)
+
+        self.run_hub(scenario)
+
+
+class PunchSyncerTests(TestCase):
+    """Kiosk punches are acknowledged as applied only when this sync wrote them"""
+
+    def setUp(self):
+        self.alice = Employee.objects.create(username='alice', employee_id='EMP0001')
+
+    def punch(self, key, hour, employee_id='EMP0001'):
+        return {'client_key': key, 'employee_id': employee_id, 'timestamp': f'2026-03-02T{hour:02d}:00:00Z'}
+
+    def statuses(self, result):
+        return {item['client_key']: item['status'] for item in result['results']}
+
+    def test_replay(self):
+        punches = [self.punch('k1', 9), self.punch('k2', 17), self.punch('k3', 12, 'EMP9999'), {'client_key': 'k4'}]
+
+        result = PunchSyncer().run(punches)
+
+        self.assertEqual(self.statuses(result), {
+            'k1': 'applied', 'k2': 'applied', 'k3': 'unknown_employee', 'k4': 'invalid'
+        })
+        record = AttendanceRecord.objects.get(employee=self.alice, date=date(2026, 3, 2))
+        self.assertEqual(record.total_hours, Decimal('8.00'))
+
+        # The kiosk did not get the answer and replays the whole batch
+        result = PunchSyncer().run(punches + [self.punch('k1', 9)])
+
+        self.assertEqual((result['applied'], result['duplicates'], result['records_upserted']), (0, 3, 0))
+        self.assertEqual(AttendanceEvent.objects.count(), 2)
+
+    def test_concurrent_and_dropped_rows(self):
+        bulk_create = AttendanceEvent.objects.bulk_create
+
+        def racing_bulk_create(events, **kwargs):
+            # Another replay commits k1 first, and k3 is lost by the insert
+            AttendanceEvent.objects.create(
+                employee=self.alice, timestamp=events[0].timestamp, client_key='k1', is_compacted=True
+            )
+            return bulk_create([event for event in events if event.client_key != 'k3'], **kwargs)
+
+        with mock.patch.object(AttendanceEvent.objects, 'bulk_create', side_effect=racing_bulk_create):
+            result = PunchSyncer().run([self.punch('k1', 9), self.punch('k2', 18), self.punch('k3', 8)])
+
+        self.assertEqual(self.statuses(result), {'k1': 'duplicate', 'k2': 'applied', 'k3': 'failed'})
+        self.assertEqual((result['applied'], result['failed']), (1, 1))
+        # Only the applied punch is folded, the unsent 8:00 punch is not on the record
+        record = AttendanceRecord.objects.get(employee=self.alice, date=date(2026, 3, 2))
+        self.assertEqual((record.time_in.hour, record.time_out), (18, None))
+
+        result = PunchSyncer().run([self.punch('k3', 8)])
+        self.assertEqual(self.statuses(result), {'k3': 'applied'})
+
+
+class LeaveCalendarTests(TestCase):
+    """The team calendar clips leaves to the range and counts each employee once a day"""
+
+    def setUp(self):
+        self.sales = Department.objects.create(name='Sales')
+        self.support = Department.objects.create(name='Support')
+        self.annual = LeaveType.objects.create(name='Annual Leave', max_days_per_year=21, advance_notice_days=0)
+        self.alice = Employee.objects.create(
+            username='alice', employee_id='EMP0001', first_name='Alice', department=self.sales
+        )
+        self.bob = Employee.objects.create(username='bob', employee_id='EMP0002', department=self.sales)
+        self.carol = Employee.objects.create(username='carol', employee_id='EMP0003', department=self.support)
+
+    def apply(self, employee, start_date, end_date, status='APPROVED'):
+        return LeaveApplication.objects.create(
+            employee=employee, leave_type=self.annual, start_date=start_date,
+            end_date=end_date, reason='Holiday', status=status
+        )
+
+    def test_calendar(self):
+        self.apply(self.alice, date(2026, 3, 30), date(2026, 4, 2))
+        # Touching applications of the same employee
+        self.apply(self.alice, date(2026, 4, 3), date(2026, 4, 3), status='PENDING')
+        self.apply(self.bob, date(2026, 4, 2), date(2026, 4, 3))
+        self.apply(self.bob, date(2026, 4, 6), date(2026, 4, 7), status='REJECTED')
+        self.apply(self.carol, date(2026, 4, 1), date(2026, 4, 1))
+
+        calendar = build_leave_calendar(date(2026, 4, 1), date(2026, 4, 30), self.sales.id)
+
+        self.assertEqual(calendar['employee_count'], 2)
+        self.assertEqual(calendar['daily_counts'], {'2026-04-01': 1, '2026-04-02': 2, '2026-04-03': 2})
+        alice = calendar['employees'][0]
+        self.assertEqual((alice['employee_code'], alice['employee_name']), ('EMP0001', 'Alice'))
+        self.assertEqual([leave['status'] for leave in alice['leaves']], ['APPROVED', 'PENDING'])
+
+        calendar = build_leave_calendar(date(2026, 4, 1), date(2026, 4, 30), statuses=['PENDING'])
+        self.assertEqual(calendar['daily_counts'], {'2026-04-03': 1})
+
+    def test_own_department_only(self):
+        self.apply(self.carol, date(2026, 4, 1), date(2026, 4, 1))
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = '/api/attendance/leave-applications/team_calendar/'
+
+        response = client.get(url, {'quarter': '2026-Q2', 'department': self.support.id})
+        self.assertEqual(response.status_code, 403)
+
+        response = client.get(url, {'quarter': '2026-Q2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['department'], response.data['employee_count']), (self.sales.id, 0))
+
+
+class BulkReviewTests(TestCase):
+    """Bulk reviews decide the pending rows of a selection and report every ID"""
+
+    def setUp(self):
+        self.manager = Employee.objects.create(
+            username='manager', employee_id='EMP0000', is_staff=True, is_superuser=True
+        )
+        self.alice = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.bob = Employee.objects.create(username='bob', employee_id='EMP0002')
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def request_overtime(self, employee, day, status='PENDING'):
+        return OvertimeRequest.objects.create(
+            employee=employee, date=day, start_time=time(17, 0), end_time=time(19, 0),
+            hours_requested=Decimal('2.00'), reason='Release', status=status
+        )
+
+    def test_overtime_by_ids(self):
+        pending = self.request_overtime(self.alice, date(2026, 3, 2))
+        rejected = self.request_overtime(self.alice, date(2026, 3, 3), status='REJECTED')
+
+        response = self.client.post('/api/attendance/overtime-requests/bulk_approve/', {
+            'ids': [pending.id, rejected.id, 999999]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['approved'], response.data['skipped'], response.data['failed']), (1, 1, 1))
+        self.assertEqual([result['id'] for result in response.data['results']], [pending.id, rejected.id, 999999])
+        pending.refresh_from_db()
+        rejected.refresh_from_db()
+        self.assertEqual((pending.status, pending.approved_by), ('APPROVED', self.manager))
+        self.assertEqual(rejected.status, 'REJECTED')
+
+    def test_overtime_by_filters(self):
+        first = self.request_overtime(self.alice, date(2026, 3, 2))
+        second = self.request_overtime(self.alice, date(2026, 3, 9))
+        other = self.request_overtime(self.bob, date(2026, 3, 2))
+
+        response = self.client.post('/api/attendance/overtime-requests/bulk_reject/', {
+            'employee': self.alice.id, 'date_to': '2026-03-05', 'reason': 'Over budget'
+        }, format='json')
+
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(
+            list(OvertimeRequest.objects.filter(id__in=[first.id, second.id, other.id]).order_by('id').values_list(
+                'status', 'rejection_reason'
+            )),
+            [('REJECTED', 'Over budget'), ('PENDING', ''), ('PENDING', '')]
+        )
+
+    def test_attendance_and_batch_limit(self):
+        records = [make_record(self.alice, date(2026, 3, day)) for day in (2, 3)]
+
+        with mock.patch.object(utils, 'BULK_REVIEW_MAX_BATCH', 1):
+            response = self.client.post('/api/attendance/attendance/bulk_approve/', {
+                'employee': self.alice.id
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AttendanceRecord.objects.filter(approved_at__isnull=False).exists())
+
+        response = self.client.post('/api/attendance/attendance/bulk_approve/', {
+            'employee': self.alice.id
+        }, format='json')
+        self.assertEqual(response.data['approved'], 2)
+        # Approved records keep their hours and are skipped when approved again
+        self.assertEqual(
+            set(AttendanceRecord.objects.values_list('id', 'total_hours', 'approved_by')),
+            {(record.id, Decimal('8.00'), self.manager.id) for record in records}
+        )
+        response = self.client.post('/api/attendance/attendance/bulk_approve/', {
+            'ids': [records[0].id]
+        }, format='json')
+        self.assertEqual(response.data['skipped'], 1)
+
+
+class RosterGeneratorTests(TestCase):
+    """Generated rosters follow the latest assignment and never replace manual overrides"""
+
+    def setUp(self):
+        self.day = Shift.objects.create(name='Day', start_time=time(9, 0), end_time=time(17, 0))
+        self.night = Shift.objects.create(name='Night', start_time=time(21, 0), end_time=time(5, 0))
+        self.alice = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.bob = Employee.objects.create(username='bob', employee_id='EMP0002')
+        Holiday.objects.create(name='Founders Day', date=date(2026, 3, 10))
+
+    def get_roster(self, employee):
+        return dict(RosterEntry.objects.filter(employee=employee).values_list('date', 'shift_id'))
+
+    def test_fixed_and_rotating(self):
+        ShiftAssignment.objects.create(employee=self.alice, shift=self.day, start_date=date(2026, 2, 1))
+        ShiftAssignment.objects.create(employee=self.alice, shift=self.night, start_date=date(2026, 3, 16))
+        rotation = ShiftRotation.objects.create(name='Day, night, off')
+        for position, shift in enumerate([self.day, self.night, None]):
+            ShiftRotationSlot.objects.create(rotation=rotation, position=position, shift=shift)
+        ShiftAssignment.objects.create(
+            employee=self.bob, rotation=rotation, rotation_offset=1,
+            start_date=date(2026, 3, 1), end_date=date(2026, 3, 6)
+        )
+
+        result = RosterGenerator(2026, 3).run()
+
+        self.assertEqual(result['assignments'], 3)
+        alice = self.get_roster(self.alice)
+        # Weekdays only, without the holiday, the night shift from the 16th
+        self.assertEqual(len(alice), 21)
+        self.assertNotIn(date(2026, 3, 10), alice)
+        self.assertEqual((alice[date(2026, 3, 13)], alice[date(2026, 3, 16)]), (self.day.id, self.night.id))
+        # Rotations run through weekends, starting on their offset slot
+        self.assertEqual(self.get_roster(self.bob), {
+            date(2026, 3, 1): self.night.id, date(2026, 3, 3): self.day.id,
+            date(2026, 3, 4): self.night.id, date(2026, 3, 6): self.day.id,
+        })
+
+    def test_regenerate_keeps_overrides(self):
+        ShiftAssignment.objects.create(employee=self.alice, shift=self.day, start_date=date(2026, 3, 1))
+        RosterEntry.objects.create(employee=self.alice, date=date(2026, 3, 2), shift=self.night)
+        RosterGenerator(2026, 3).run()
+        roster = self.get_roster(self.alice)
+
+        result = RosterGenerator(2026, 3, employee_ids=[self.alice.id]).run()
+
+        self.assertEqual(result['entries_deleted'], 20)
+        self.assertEqual(self.get_roster(self.alice), roster)
+        self.assertEqual(roster[date(2026, 3, 2)], self.night.id)
+        self.assertFalse(RosterEntry.objects.filter(date=date(2026, 3, 2), assignment__isnull=False).exists())
+
+
+class LeaveLedgerTests(TestCase):
+    """Ledger balances must follow accruals, usage, rejections and cancellations"""
+
+    def setUp(self):
+        self.year = timezone.now().year
+        self.manager = Employee.objects.create(username='manager', employee_id='EMP0000', is_staff=True)
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+        self.annual = LeaveType.objects.create(
+            name='Annual Leave', max_days_per_year=21, advance_notice_days=0,
+            employee_balance_field='annual_leave_balance'
+        )
+
+    def apply(self, start_date, end_date, leave_type=None):
+        return LeaveApplication.objects.create(
+            employee=self.employee, leave_type=leave_type or self.annual,
+            start_date=start_date, end_date=end_date, reason='Holiday'
+        )
+
+    def assertBalance(self, days, leave_type=None, year=None):
+        balance = LeaveBalance.objects.get(
+            employee=self.employee, leave_type=leave_type or self.annual, year=year or self.year
+        )
+        entries = LeaveLedgerEntry.objects.filter(
+            employee=self.employee, leave_type=leave_type or self.annual, year=year or self.year
+        )
+
+        self.assertEqual(balance.balance, Decimal(days))
+        self.assertEqual(balance.accrued - balance.used + balance.adjusted, balance.balance)
+        # The balance is always the sum of its ledger and the last running balance
+        self.assertEqual(sum(entry.days for entry in entries), balance.balance)
+        self.assertEqual(entries.order_by('created_at', 'id').last().balance_after, balance.balance)
+
+    def test_usage_reject_and_cancel(self):
+        application = self.apply(date(self.year, 3, 2), date(self.year, 3, 4))
+        application.approve(self.manager)
+        self.assertBalance(18)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.annual_leave_balance, 18)
+
+        application.reject(self.manager, 'Needed on site')
+        self.assertBalance(21)
+
+        application = self.apply(date(self.year, 4, 6), date(self.year, 4, 10))
+        application.approve(self.manager)
+        self.assertBalance(16)
+
+        application.cancel(self.manager)
+        self.assertBalance(21)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.annual_leave_balance, 21)
+
+        with self.assertRaises(ValueError):
+            application.cancel(self.manager)
+        self.assertBalance(21)
+
+    def test_cancel_keeps_hand_made_leave(self):
+        AttendanceRecord.objects.create(employee=self.employee, date=date(self.year, 3, 3), status='ABSENT')
+        AttendanceRecord.objects.create(
+            employee=self.employee, date=date(self.year, 3, 4), status='LEAVE', notes='Entered by HR'
+        )
+        application = self.apply(date(self.year, 3, 2), date(self.year, 3, 6))
+        application.approve(self.manager)
+        self.assertEqual(application.attendance_records.count(), 4)
+
+        application.cancel(self.manager)
+
+        records = AttendanceRecord.objects.filter(employee=self.employee)
+        self.assertFalse(records.filter(leave_application__isnull=False).exists())
+        self.assertEqual(list(records.filter(status='LEAVE').values_list('notes', flat=True)), ['Entered by HR'])
+        self.assertEqual(records.get(date=date(self.year, 3, 3)).status, 'ABSENT')
+
+    def test_approve_twice(self):
+        application = self.apply(date(self.year, 3, 2), date(self.year, 3, 4))
+        application.approve(self.manager)
+
+        with self.assertRaises(ValueError):
+            application.approve(self.manager)
+        self.assertBalance(18)
+
+    def test_insufficient_balance(self):
+        application = self.apply(date(self.year, 1, 1), date(self.year, 1, 22))
+
+        with self.assertRaises(ValueError):
+            application.approve(self.manager)
+        application.refresh_from_db()
+        self.assertEqual(application.status, 'PENDING')
+
+    def test_accrual(self):
+        LeaveAccrualRule.objects.create(
+            leave_type=self.annual, employment_type='FULL_TIME', days_per_month=Decimal('1.75')
+        )
+
+        result = LeaveAccrualJob(self.year, 1).run()
+        self.assertEqual(result['employees_accrued'], 2)
+        self.assertTrue(LeaveAccrualJob(self.year, 1).run()['already_run'])
+        LeaveAccrualJob(self.year, 2).run()
+        self.assertBalance('3.50')
+
+        post_leave_entry(self.employee, self.annual, self.year, 'USAGE', -1, created_by=self.manager)
+        self.assertBalance('2.50')
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.annual_leave_balance, 2)
+
+        with self.assertRaises(ValueError):
+            post_leave_entry(self.employee, self.annual, self.year, 'USAGE', -3)
+        self.assertBalance('2.50')
+
+        # Accrual stops at the yearly entitlement
+        for month in range(3, 13):
+            LeaveAccrualJob(self.year, month).run()
+        self.assertBalance('20.00')
+
+    def test_year_boundary(self):
+        self.apply(date(self.year, 11, 2), date(self.year, 11, 6)).approve(self.manager)
+        self.assertBalance(16)
+
+        # A new year opens from the leave type, the old year's usage does not carry over
+        next_year = get_leave_balance(self.employee, self.annual, self.year + 1)
+        self.assertEqual(next_year.balance, Decimal('21.00'))
+
+        self.apply(date(self.year + 1, 1, 5), date(self.year + 1, 1, 6)).approve(self.manager)
+        self.assertBalance(19, year=self.year + 1)
+        self.assertBalance(16)
+
+        # The employee counter follows the current year only
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.annual_leave_balance, 16)
+
+
+class ArchivedYearTests(TestCase):
+    """Archived years keep their rollups and bitmaps and accept no new records"""
+
+    def setUp(self):
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+        for day in range(2, 7):
+            make_record(self.employee, date(2024, 12, day))
+        PayrollPeriod.objects.create(
+            name='2024', start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+            pay_date=date(2025, 1, 5), is_finalized=True
+        )
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = mock.patch.object(utils, 'ATTENDANCE_ARCHIVE_DIR', directory.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        AttendanceArchive().archive_year(2024)
+
+    def test_summaries_survive_refresh_and_rebuild(self):
+        refresh_attendance_rollups({(self.employee.id, 2024, 12)})
+        rebuild_attendance_rollups()
+
+        rollup = AttendanceMonthlyRollup.objects.get(employee=self.employee, year=2024, month=12)
+        self.assertEqual((rollup.total_records, rollup.present_days), (5, 5))
+        bitmap = AttendanceBitmap.objects.get(employee=self.employee, year=2024)
+        self.assertEqual(bitmap.get_bits('present').bit_count(), 5)
+        with self.assertRaises(ValueError):
+            rebuild_attendance_rollups(year=2024)
+
+    def test_records_rejected(self):
+        with self.assertRaises(ValueError):
+            AttendanceRecord.objects.create(employee=self.employee, date=date(2024, 12, 9), status='ABSENT')
+
+        admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.post('/api/attendance/attendance/', {
+            'employee': self.employee.id, 'date': '2024-12-09', 'status': 'ABSENT'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.data)
+
+    def test_bulk_punches_skipped(self):
+        result = PunchLogImporter('CSV').run([
+            'employee_id,timestamp', 'EMP0001,2024-12-09T09:00:00', 'EMP0001,2025-01-06T09:00:00'
+        ])
+        self.assertEqual((result['records_upserted'], result['archived_days']), (1, 1))
+
+        result = PunchSyncer().run([
+            {'client_key': 'k1', 'employee_id': 'EMP0001', 'timestamp': '2024-12-10T09:00:00Z'}
+        ])
+        self.assertEqual(result['results'][0]['status'], 'archived')
+        self.assertFalse(AttendanceEvent.objects.exists())
+
+        AttendanceEvent.objects.create(
+            employee=self.employee, timestamp=timezone.make_aware(datetime(2024, 12, 11, 9))
+        )
+        self.assertEqual(AttendanceEventCompactor().run()['records_upserted'], 0)
+        self.assertFalse(AttendanceRecord.objects.filter(date__year=2024).exists())
+
+    def test_history_streams_the_range(self):
+        loads = mock.Mock(side_effect=utils.json.loads)
+
+        with mock.patch.object(utils.json, 'loads', loads):
+            records = list(utils.attendance_history(date(2024, 12, 3), date(2024, 12, 4), [self.employee.id]))
 
-# Create your tests here.
+        self.assertEqual([record.date.day for record in records], [3, 4])
+        # Reading stops at the first row after the range
+        self.assertEqual(loads.call_count, 4)
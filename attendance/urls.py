@@ -1,16 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    ShiftViewSet, AttendanceRecordViewSet, LeaveTypeViewSet,
-    LeaveApplicationViewSet, OvertimeRequestViewSet
+    ShiftViewSet, ShiftRotationViewSet, ShiftAssignmentViewSet, RosterEntryViewSet,
+    AttendanceRecordViewSet, LeaveTypeViewSet, LeaveAccrualRuleViewSet, LeaveApplicationViewSet,
+    LeaveBalanceViewSet, OvertimeRequestViewSet
 )
 
 # Create router and register viewsets
 router = DefaultRouter()
 router.register(r'shifts', ShiftViewSet, basename='shift')
+router.register(r'shift-rotations', ShiftRotationViewSet, basename='shift-rotation')
+router.register(r'shift-assignments', ShiftAssignmentViewSet, basename='shift-assignment')
+router.register(r'roster', RosterEntryViewSet, basename='roster-entry')
 router.register(r'attendance', AttendanceRecordViewSet, basename='attendance')
 router.register(r'leave-types', LeaveTypeViewSet, basename='leave-type')
+router.register(r'leave-accrual-rules', LeaveAccrualRuleViewSet, basename='leave-accrual-rule')
 router.register(r'leave-applications', LeaveApplicationViewSet, basename='leave-application')
+router.register(r'leave-balances', LeaveBalanceViewSet, basename='leave-balance')
 router.register(r'overtime-requests', OvertimeRequestViewSet, basename='overtime-request')
 
 # URL patterns
@@ -0,0 +1,2417 @@
+import base64
+import calendar
+import csv
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_FLOOR
+from itertools import groupby, islice
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, connections, transaction
+from django.db.models import (
+    Count, Sum, Avg, Max, Q, F, Value, BooleanField, DecimalField, Exists, ExpressionWrapper, OuterRef,
+    Subquery, Case, When
+)
+from django.db.models.functions import Coalesce, ExtractYear, ExtractMonth, Least, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# Fields rewritten when punches are folded into an existing attendance record
+PUNCH_UPDATE_FIELDS = [
+    'time_in', 'time_out', 'status', 'total_hours', 'regular_hours',
+    'overtime_hours', 'break_duration', 'is_late', 'late_minutes', 'updated_at'
+]
+
+
+class ShiftCache:
+    """In-process cache of shifts used by the attendance hot paths"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._shifts = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load every shift in a single query"""
+        from .models import Shift
+        
+        shifts = {shift.id: shift for shift in Shift.objects.all()}
+        with self._lock:
+            self._shifts = shifts
+            self._loaded_at = time.monotonic()
+
+    def get(self, shift_id):
+        """Get a shift by ID, reloading when the cache has expired"""
+        if shift_id is None:
+            return None
+        
+        # Other processes cannot invalidate this cache, so entries also expire
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load()
+        
+        shift = self._shifts.get(shift_id)
+        if shift is None:
+            # Shift created since the last load
+            self.load()
+            shift = self._shifts.get(shift_id)
+        
+        return shift
+
+    def clear(self):
+        """Drop the cached shifts so the next lookup reloads them"""
+        with self._lock:
+            self._shifts = {}
+            self._loaded_at = None
+
+
+shift_cache = ShiftCache(ttl=getattr(settings, 'SHIFT_CACHE_TTL', 300))
+
+
+class RosterCache:
+    """In-process cache of each day's roster, employee ID to shift ID, for check-ins"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def load(self, day):
+        """Load a day's roster in a single indexed query"""
+        from .models import RosterEntry
+        
+        shifts = dict(RosterEntry.objects.filter(date=day).values_list('employee_id', 'shift_id'))
+        with self._lock:
+            # Only the current days are worth keeping
+            self._days = {
+                cached_day: entry for cached_day, entry in self._days.items() if cached_day >= day
+            }
+            self._days[day] = (shifts, time.monotonic())
+        return shifts
+
+    def get_shift_id(self, employee_id, day):
+        """Get the shift an employee is rostered on for a day, or None"""
+        entry = self._days.get(day)
+        
+        # Other processes cannot invalidate this cache, so days also expire
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            shifts = self.load(day)
+        else:
+            shifts = entry[0]
+        
+        return shifts.get(employee_id)
+
+    def clear(self):
+        """Drop the cached rosters so the next lookup reloads them"""
+        with self._lock:
+            self._days = {}
+
+
+roster_cache = RosterCache(ttl=getattr(settings, 'ROSTER_CACHE_TTL', 300))
+
+
+class RosterGenerator:
+    """Utility class for expanding shift assignments into a month of roster entries in bulk"""
+
+    def __init__(self, year, month, employee_ids=None, batch_size=5000):
+        self.year = year
+        self.month = month
+        self.employee_ids = employee_ids
+        self.batch_size = batch_size
+        
+        if not 1 <= self.month <= 12:
+            raise ValueError("Month must be between 1 and 12.")
+
+    def get_assignments(self, first_day, last_day):
+        """Get the assignments overlapping the month with their rotation slots"""
+        from .models import ShiftAssignment
+        
+        assignments = ShiftAssignment.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=first_day),
+            start_date__lte=last_day,
+            employee__is_active=True
+        ).select_related('rotation').prefetch_related('rotation__slots')
+        if self.employee_ids is not None:
+            assignments = assignments.filter(employee_id__in=self.employee_ids)
+        
+        # Later assignments replace earlier ones on the days they overlap
+        return assignments.order_by('start_date', 'id')
+
+    def expand(self, assignment, first_day, last_day, working_days):
+        """Yield (date, shift_id) for the days an assignment covers in the month"""
+        start = max(assignment.start_date, first_day)
+        end = min(assignment.end_date or last_day, last_day)
+        
+        if assignment.shift_id:
+            # Fixed shifts are worked on working days
+            for day in working_days:
+                if start <= day <= end:
+                    yield day, assignment.shift_id
+            return
+        
+        slots = [slot.shift_id for slot in assignment.rotation.slots.all()]
+        if not slots:
+            return
+        
+        current_date = start
+        while current_date <= end:
+            position = ((current_date - assignment.start_date).days + assignment.rotation_offset) % len(slots)
+            if slots[position]:
+                yield current_date, slots[position]
+            current_date += timedelta(days=1)
+
+    def run(self):
+        """Replace the month's generated roster entries, keeping manual overrides"""
+        from .models import RosterEntry
+        
+        first_day, last_day = month_bounds(self.year, self.month)
+        working_days = get_working_days(first_day, last_day)
+        
+        roster = {}
+        assignment_count = 0
+        for assignment in self.get_assignments(first_day, last_day):
+            assignment_count += 1
+            for day, shift_id in self.expand(assignment, first_day, last_day, working_days):
+                roster[(assignment.employee_id, day)] = (shift_id, assignment.id)
+        
+        entries = [
+            RosterEntry(employee_id=employee_id, date=day, shift_id=shift_id, assignment_id=assignment_id)
+            for (employee_id, day), (shift_id, assignment_id) in roster.items()
+        ]
+        
+        with transaction.atomic():
+            generated = RosterEntry.objects.filter(
+                date__range=[first_day, last_day], assignment__isnull=False
+            )
+            if self.employee_ids is not None:
+                generated = generated.filter(employee_id__in=self.employee_ids)
+            deleted, _ = generated.delete()
+            
+            # Manual overrides hold their (employee, date) slot
+            RosterEntry.objects.bulk_create(entries, batch_size=self.batch_size, ignore_conflicts=True)
+            transaction.on_commit(roster_cache.clear)
+        
+        return {
+            'assignments': assignment_count,
+            'entries_deleted': deleted,
+            'entries_generated': len(entries),
+        }
+
+
+# Re-read window covering punches committed after later ones or stamped by a skewed clock
+PRESENCE_FEED_LAG = timedelta(seconds=getattr(settings, 'PRESENCE_FEED_LAG', 5))
+PRESENCE_STREAM_TICKET_TTL = getattr(settings, 'PRESENCE_STREAM_TICKET_TTL', 30)
+PRESENCE_STREAM_TICKET_KEY = 'attendance:presence:ticket:{}'
+
+
+class PresenceFeed:
+    """Who is checked in today and what changed since, read from the database
+    
+    Every process sees every punch because the feed polls records by updated_at
+    instead of listening to writes. Each poll re-reads a short lag window and diffs
+    it against the presence already reported, so repeated rows are not re-sent.
+    Streams share one feed of all departments per process, see PresenceHub.
+    """
+
+    def __init__(self, department_id=None, lag=PRESENCE_FEED_LAG):
+        self.department_id = department_id
+        self.lag = lag
+        self.date = None
+        self.cursor = None
+        self.present = {}
+
+    @staticmethod
+    def make_entry(employee_id, employee_code, first_name, last_name, department_id, time_in):
+        """Get the snapshot entry of an employee"""
+        return {
+            'employee': employee_id,
+            'employee_code': employee_code,
+            'employee_name': f"{first_name} {last_name}".strip(),
+            'department': department_id,
+            'time_in': time_in.isoformat() if time_in else None,
+        }
+
+    @staticmethod
+    def encode_cursor(cursor):
+        """Get the stream event ID of a cursor, in microseconds since the epoch"""
+        return int(cursor.timestamp() * 1000000)
+
+    @staticmethod
+    def decode_cursor(event_id):
+        """Get the cursor of a stream event ID"""
+        return datetime.fromtimestamp(int(event_id) / 1000000, tz=dt_timezone.utc)
+
+    def get_rows(self, **filters):
+        """Get today's records as entry fields followed by time_out"""
+        from .models import AttendanceRecord
+        
+        records = AttendanceRecord.objects.filter(date=self.date, **filters)
+        if self.department_id is not None:
+            records = records.filter(employee__department_id=self.department_id)
+        
+        return records.values_list(
+            'employee_id', 'employee__employee_id', 'employee__first_name',
+            'employee__last_name', 'employee__department_id', 'time_in', 'time_out'
+        )
+
+    def get_change(self, row):
+        """Get the (event, entry) pair a record stands for"""
+        entry = self.make_entry(*row[:-1])
+        is_in = entry['time_in'] is not None and row[-1] is None
+        return ('check_in' if is_in else 'check_out'), entry
+
+    def load(self, since=None):
+        """Load who is in now, getting the changes after an earlier cursor of today
+        
+        Returns None when the client has no usable cursor and needs a snapshot.
+        """
+        started = timezone.now()
+        self.date = started.date()
+        self.present = {
+            row[0]: self.make_entry(*row[:-1])
+            for row in self.get_rows(time_in__isnull=False, time_out__isnull=True)
+        }
+        self.cursor = started
+        
+        if since is None or since.date() != self.date:
+            return None
+        
+        return self.replay(since)
+
+    def replay(self, since):
+        """Get every change of the feed's day after an earlier cursor"""
+        # The client keeps its own state, replay everything in the window
+        return [
+            self.get_change(row)
+            for row in self.get_rows(updated_at__gt=since - self.lag).order_by('updated_at')
+        ]
+
+    def poll(self):
+        """Get the changes since the last poll, or None once the day has changed"""
+        started = timezone.now()
+        if started.date() != self.date:
+            return None
+        
+        rows = self.get_rows(updated_at__gt=self.cursor - self.lag).order_by('updated_at')
+        self.cursor = started
+        
+        changes = []
+        for row in rows:
+            event, entry = self.get_change(row)
+            previous = self.present.get(entry['employee'])
+            if event == 'check_in' and entry != previous:
+                self.present[entry['employee']] = entry
+                changes.append((event, entry))
+            elif event == 'check_out' and previous:
+                del self.present[entry['employee']]
+                changes.append((event, previous))
+        
+        return changes
+
+    def snapshot(self, department_id=None):
+        """Get who is in now, grouped by department"""
+        departments = {}
+        count = 0
+        for entry in self.present.values():
+            if department_id is None or entry['department'] == department_id:
+                departments.setdefault(entry['department'], []).append(entry)
+                count += 1
+        
+        return {
+            'date': self.date,
+            'cursor': self.encode_cursor(self.cursor),
+            'count': count,
+            'departments': [
+                {
+                    'department': department,
+                    'count': len(employees),
+                    'employees': sorted(employees, key=lambda entry: entry['time_in']),
+                }
+                for department, employees in departments.items()
+            ],
+        }
+
+
+def issue_stream_ticket(user):
+    """Get a single-use ticket authenticating one presence stream connection"""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(PRESENCE_STREAM_TICKET_KEY.format(ticket), user.id, PRESENCE_STREAM_TICKET_TTL)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """Get the user ID of a ticket and burn it, or None when it is unknown or used"""
+    key = PRESENCE_STREAM_TICKET_KEY.format(ticket)
+    user_id = cache.get(key)
+    
+    # Only the request that manages to delete the ticket may use it
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
+
+
+class PunchLogImporter:
+    """Utility class for streaming raw door-access punch logs into attendance records"""
+    
+    FORMATS = ['CSV', 'JSONL']
+    SAMPLE_SIZE = 20
+
+    def __init__(self, file_format='CSV', batch_size=5000):
+        if file_format not in self.FORMATS:
+            raise ValueError(f"Unsupported punch log format: {file_format}")
+        
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.employee_ids = {}
+        self.stats = {
+            'rows': 0,
+            'invalid_rows': 0,
+            'invalid_lines': [],
+            'unknown_employees': set(),
+            'records_upserted': 0,
+            'archived_days': 0,
+        }
+
+    def read_jsonl(self, lines):
+        """Yield (line number, row) pairs, with an empty row for lines that are not valid JSON"""
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, {}
+
+    def parse(self, lines):
+        """Yield (employee code, punch time) pairs from an iterable of text lines"""
+        if self.file_format == 'CSV':
+            reader = csv.DictReader(lines)
+            rows = ((reader.line_num, row) for row in reader)
+        else:
+            rows = self.read_jsonl(lines)
+        
+        tz = timezone.get_current_timezone()
+        for line_number, row in rows:
+            self.stats['rows'] += 1
+            employee_code = None
+            try:
+                employee_code = str(row['employee_id']).strip()
+                punched_at = parse_datetime(str(row['timestamp']).strip())
+            except (KeyError, TypeError, ValueError):
+                punched_at = None
+            
+            if not employee_code or punched_at is None:
+                self.stats['invalid_rows'] += 1
+                if len(self.stats['invalid_lines']) < self.SAMPLE_SIZE:
+                    self.stats['invalid_lines'].append(line_number)
+                continue
+            
+            if timezone.is_naive(punched_at):
+                punched_at = timezone.make_aware(punched_at, tz)
+            yield employee_code, punched_at
+
+    def run(self, lines):
+        """Import punches, flushing a batch of employee-days at a time"""
+        started = time.perf_counter()
+        buffer = {}
+        
+        for employee_code, punched_at in self.parse(lines):
+            add_punch(buffer, employee_code, punched_at)
+            
+            if len(buffer) >= self.batch_size:
+                self.flush(buffer)
+                buffer = {}
+        
+        if buffer:
+            self.flush(buffer)
+        
+        elapsed = time.perf_counter() - started
+        
+        return {
+            'rows': self.stats['rows'],
+            'invalid_rows': self.stats['invalid_rows'],
+            'invalid_lines': self.stats['invalid_lines'],
+            'records_upserted': self.stats['records_upserted'],
+            'archived_days': self.stats['archived_days'],
+            # Codes are resolved once, unknown ones are cached as None
+            'unknown_employee_count': sum(
+                1 for employee_id in self.employee_ids.values() if employee_id is None
+            ),
+            'unknown_employees': sorted(self.stats['unknown_employees']),
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.stats['rows'] / elapsed, 1) if elapsed else None,
+        }
+
+    def resolve_employees(self, codes):
+        """Map employee codes to primary keys, querying only codes not seen before"""
+        from employees.models import Employee
+        
+        missing = [code for code in codes if code not in self.employee_ids]
+        if missing:
+            found = dict(
+                Employee.objects.filter(employee_id__in=missing).values_list('employee_id', 'id')
+            )
+            for code in missing:
+                self.employee_ids[code] = found.get(code)
+
+    def flush(self, buffer):
+        """Merge a batch of punch bounds with existing records and upsert them"""
+        from .models import AttendanceRecord
+        
+        self.resolve_employees({code for code, _ in buffer})
+        
+        bounds = {}
+        for (code, day), (first_punch, last_punch) in buffer.items():
+            employee_id = self.employee_ids[code]
+            if employee_id is None:
+                if len(self.stats['unknown_employees']) < self.SAMPLE_SIZE:
+                    self.stats['unknown_employees'].add(code)
+                continue
+            bounds[(employee_id, day)] = (first_punch, last_punch)
+        
+        if not bounds:
+            return
+        
+        upserted = upsert_punch_bounds(bounds)
+        self.stats['records_upserted'] += upserted
+        self.stats['archived_days'] += len(bounds) - upserted
+
+
+def add_punch(buffer, employee, punched_at):
+    """Widen the first/last punch bounds of an employee-day with a punch"""
+    key = (employee, timezone.localtime(punched_at).date())
+    bounds = buffer.get(key)
+    if bounds is None:
+        buffer[key] = [punched_at, punched_at]
+    elif punched_at < bounds[0]:
+        bounds[0] = punched_at
+    elif punched_at > bounds[1]:
+        bounds[1] = punched_at
+
+
+def upsert_punch_bounds(bounds):
+    """Upsert attendance records from {(employee_id, date): (first punch, last punch)}"""
+    from .models import AttendanceRecord
+    
+    # Archived years live in their files, skip them here as save() refuses them
+    archived = get_archived_years()
+    if archived:
+        bounds = {key: value for key, value in bounds.items() if key[1].year not in archived}
+        if not bounds:
+            return 0
+    
+    # Punches extend, never shrink, what is already recorded for the day
+    days = {day for _, day in bounds}
+    existing = {
+        (record.employee_id, record.date): record
+        for record in AttendanceRecord.objects.filter(
+            employee_id__in={employee_id for employee_id, _ in bounds},
+            date__in=days
+        ).only('id', 'employee_id', 'date', 'shift_id', 'time_in', 'time_out',
+               'break_start', 'break_end', 'status')
+    }
+    
+    records = []
+    for (employee_id, day), (first_punch, last_punch) in bounds.items():
+        record = existing.get((employee_id, day))
+        punches = [first_punch, last_punch]
+        if record:
+            punches += [punch for punch in (record.time_in, record.time_out) if punch]
+        
+        time_in, time_out = min(punches), max(punches)
+        upserted = AttendanceRecord(
+            employee_id=employee_id,
+            date=day,
+            shift_id=record.shift_id if record else None,
+            time_in=time_in,
+            time_out=time_out if time_out > time_in else None,
+            break_start=record.break_start if record else None,
+            break_end=record.break_end if record else None,
+            status=record.status if record and record.status != 'ABSENT' else 'PRESENT',
+        )
+        upserted.calculate_hours()
+        records.append(upserted)
+    
+    AttendanceRecord.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['employee', 'date'],
+        update_fields=PUNCH_UPDATE_FIELDS
+    )
+    
+    # The upsert bypasses save(), so recount the touched months
+    refresh_attendance_rollups({
+        (employee_id, day.year, day.month) for employee_id, day in bounds
+    })
+    attendance_changed()
+    
+    return len(records)
+
+
+class PunchSyncer:
+    """Utility class for applying a batch of punches replayed by an offline kiosk"""
+
+    def __init__(self, ip_address=None):
+        self.ip_address = ip_address
+
+    def run(self, items):
+        """Apply new punches once per client key and get a result per item"""
+        from employees.models import Employee
+        from .models import AttendanceEvent
+        from .serializers import PunchSyncItemSerializer
+        
+        results = []
+        valid = []
+        for item in items:
+            serializer = PunchSyncItemSerializer(data=item)
+            if serializer.is_valid():
+                result = {'client_key': serializer.validated_data['client_key'], 'status': 'applied'}
+                valid.append((serializer.validated_data, result))
+            else:
+                result = {'client_key': item.get('client_key'), 'status': 'invalid', 'errors': serializer.errors}
+            results.append(result)
+        
+        # One query finds keys already synced, by an earlier replay or the same batch
+        keys = {data['client_key'] for data, _ in valid}
+        seen = set(AttendanceEvent.objects.filter(client_key__in=keys).values_list('client_key', flat=True))
+        employee_ids = dict(Employee.objects.filter(
+            employee_id__in={data['employee_id'] for data, _ in valid}
+        ).values_list('employee_id', 'id'))
+        
+        archived = get_archived_years()
+        
+        events = []
+        for data, result in valid:
+            employee_id = employee_ids.get(data['employee_id'])
+            if data['client_key'] in seen:
+                result['status'] = 'duplicate'
+                continue
+            if employee_id is None:
+                result['status'] = 'unknown_employee'
+                continue
+            
+            result['date'] = timezone.localtime(data['timestamp']).date()
+            if result['date'].year in archived:
+                result['status'] = 'archived'
+                continue
+            
+            seen.add(data['client_key'])
+            events.append((AttendanceEvent(
+                employee_id=employee_id,
+                timestamp=data['timestamp'],
+                event_type=data['event_type'],
+                source='DEVICE',
+                location=data['location'],
+                ip_address=self.ip_address,
+                client_key=data['client_key'],
+                is_compacted=True
+            ), result))
+        
+        records_upserted = 0
+        if events:
+            with transaction.atomic():
+                # A concurrent replay of the same keys is dropped by the insert
+                AttendanceEvent.objects.bulk_create([event for event, _ in events], ignore_conflicts=True)
+                
+                # Only rows stamped by this insert are ours, the rest were written by the other replay
+                persisted = dict(AttendanceEvent.objects.filter(
+                    client_key__in=[event.client_key for event, _ in events]
+                ).values_list('client_key', 'created_at'))
+                
+                buffer = {}
+                for event, result in events:
+                    created_at = persisted.get(event.client_key)
+                    if created_at is None:
+                        # Not written at all, the client must send it again
+                        result['status'] = 'failed'
+                    elif created_at != event.created_at:
+                        result['status'] = 'duplicate'
+                    else:
+                        add_punch(buffer, event.employee_id, event.timestamp)
+                
+                if buffer:
+                    records_upserted = upsert_punch_bounds(buffer)
+        
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        
+        return {
+            'received': len(results),
+            'applied': counts.get('applied', 0),
+            'duplicates': counts.get('duplicate', 0),
+            'invalid': counts.get('invalid', 0),
+            'unknown_employees': counts.get('unknown_employee', 0),
+            'archived': counts.get('archived', 0),
+            'failed': counts.get('failed', 0),
+            'records_upserted': records_upserted,
+            'results': results,
+        }
+
+
+class AttendanceEventCompactor:
+    """Utility class for folding the append-only punch log into attendance records"""
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+
+    def run(self):
+        """Compact every event logged before the run started"""
+        from .models import AttendanceEvent
+        
+        started = time.perf_counter()
+        
+        # Events appended while compacting are left for the next run
+        high_water_mark = AttendanceEvent.objects.filter(
+            is_compacted=False
+        ).aggregate(last_id=Max('id'))['last_id']
+        if high_water_mark is None:
+            return {'events': 0, 'records_upserted': 0, 'elapsed_seconds': 0.0}
+        
+        pending = AttendanceEvent.objects.filter(
+            is_compacted=False, id__lte=high_water_mark
+        ).order_by('id').values_list('employee_id', 'timestamp')
+        
+        event_count = 0
+        records_upserted = 0
+        buffer = {}
+        with transaction.atomic():
+            for employee_id, timestamp in pending.iterator(chunk_size=self.batch_size):
+                event_count += 1
+                add_punch(buffer, employee_id, timestamp)
+                
+                if len(buffer) >= self.batch_size:
+                    records_upserted += upsert_punch_bounds(buffer)
+                    buffer = {}
+            
+            if buffer:
+                records_upserted += upsert_punch_bounds(buffer)
+            
+            AttendanceEvent.objects.filter(
+                is_compacted=False, id__lte=high_water_mark
+            ).update(is_compacted=True)
+        
+        return {
+            'events': event_count,
+            'records_upserted': records_upserted,
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+        }
+
+
+# Counters kept per employee and month by AttendanceMonthlyRollup
+ROLLUP_COUNTERS = [
+    'total_records', 'present_days', 'absent_days', 'leave_days', 'late_days',
+    'total_hours', 'regular_hours', 'overtime_hours', 'payable_overtime_hours'
+]
+ROLLUP_HOUR_COUNTERS = ['total_hours', 'regular_hours', 'overtime_hours', 'payable_overtime_hours']
+
+
+def rollup_aggregates():
+    """Get the aggregate expressions that compute rollup counters from attendance records"""
+    return {
+        'total_records': Count('id'),
+        'present_days': Count('id', filter=Q(status='PRESENT')),
+        'absent_days': Count('id', filter=Q(status='ABSENT')),
+        'leave_days': Count('id', filter=Q(status='LEAVE')),
+        'late_days': Count('id', filter=Q(is_late=True)),
+        'total_hours': Sum('total_hours'),
+        'regular_hours': Sum('regular_hours'),
+        'overtime_hours': Sum('overtime_hours'),
+        'payable_overtime_hours': Sum('payable_overtime_hours'),
+    }
+
+
+def empty_attendance_summary():
+    """Get an attendance summary with every counter at zero"""
+    summary = dict.fromkeys(ROLLUP_COUNTERS, 0)
+    for field in ROLLUP_HOUR_COUNTERS:
+        summary[field] = Decimal('0.00')
+    return summary
+
+
+def build_rollups(records):
+    """Get unsaved rollups aggregated from an AttendanceRecord queryset in one query"""
+    from .models import AttendanceMonthlyRollup
+    
+    rows = records.order_by().annotate(
+        year=ExtractYear('date'), month=ExtractMonth('date')
+    ).values('employee_id', 'year', 'month').annotate(**rollup_aggregates())
+    
+    for row in rows.iterator():
+        for field in ROLLUP_HOUR_COUNTERS:
+            row[field] = row[field] or Decimal('0.00')
+        yield AttendanceMonthlyRollup(**row)
+
+
+def month_bounds(year, month):
+    """Get the first and last day of a month"""
+    _, last_day = calendar.monthrange(year, month)
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def refresh_attendance_rollups(keys):
+    """Recount the rollups of a set of (employee_id, year, month) keys from their records"""
+    from .models import AttendanceRecord, AttendanceMonthlyRollup
+    
+    # Archived years have no records left, a recount would wipe their rollups
+    archived = get_archived_years() if keys else set()
+    keys = {key for key in keys if key[1] not in archived}
+    
+    employees_by_month = {}
+    for employee_id, year, month in keys:
+        employees_by_month.setdefault((year, month), set()).add(employee_id)
+    
+    with transaction.atomic():
+        for (year, month), employee_ids in employees_by_month.items():
+            start_date, end_date = month_bounds(year, month)
+            AttendanceMonthlyRollup.objects.filter(
+                employee_id__in=employee_ids, year=year, month=month
+            ).delete()
+            AttendanceMonthlyRollup.objects.bulk_create(build_rollups(
+                AttendanceRecord.objects.filter(
+                    employee_id__in=employee_ids, date__range=[start_date, end_date]
+                )
+            ))
+        refresh_attendance_bitmaps(keys)
+
+
+def defer_attendance_refresh(keys):
+    """Queue (employee_id, year, month) keys for a rollup and bitmap recount by the next reader
+    
+    The queue is append-only, so concurrent punches never wait on each other
+    for the month's rollup or the year's bitmap row.
+    """
+    from .models import PendingAttendanceRefresh
+    
+    PendingAttendanceRefresh.objects.bulk_create([
+        PendingAttendanceRefresh(employee_id=employee_id, year=year, month=month)
+        for employee_id, year, month in keys
+    ])
+
+
+def flush_attendance_refreshes(batch_size=5000):
+    """Recount the rollups and bitmaps of every queued month, returning how many entries were flushed
+    
+    Readers of rollups, bitmaps and cached stats call this first. An entry is
+    only visible once the punch that queued it committed, so the recount always
+    sees its record; entries queued meanwhile wait for the next flush.
+    """
+    from .models import PendingAttendanceRefresh
+    
+    if not PendingAttendanceRefresh.objects.exists():
+        return 0
+    
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            pending = PendingAttendanceRefresh.objects.order_by('id')
+            # Concurrent readers split the queue instead of recounting the same months
+            if connections[pending.db].features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            rows = list(pending.values_list('id', 'employee_id', 'year', 'month')[:batch_size])
+            if not rows:
+                break
+            
+            refresh_attendance_rollups({row[1:] for row in rows})
+            PendingAttendanceRefresh.objects.filter(id__in=[row[0] for row in rows]).delete()
+        flushed += len(rows)
+    
+    # Punches leave invalidating cached stats to the flush
+    bump_attendance_stats_version()
+    return flushed
+
+
+def rebuild_attendance_rollups(year=None, employee_ids=None, batch_size=5000):
+    """Rebuild rollups and bitmaps from scratch for backfills, optionally limited to a year or employees"""
+    from .models import AttendanceRecord, AttendanceMonthlyRollup
+    
+    # Archived years have no records left, their rollups are all that remains
+    archived = get_archived_years()
+    if year in archived:
+        raise ValueError(f"Attendance of {year} is archived, its rollups cannot be rebuilt.")
+    
+    rollups = AttendanceMonthlyRollup.objects.exclude(year__in=archived)
+    records = AttendanceRecord.objects.exclude(date__year__in=archived)
+    if year:
+        rollups = rollups.filter(year=year)
+        records = records.filter(date__year=year)
+    if employee_ids:
+        rollups = rollups.filter(employee_id__in=employee_ids)
+        records = records.filter(employee_id__in=employee_ids)
+    
+    created = 0
+    with transaction.atomic():
+        rollups.delete()
+        pending = build_rollups(records)
+        while True:
+            batch = list(islice(pending, batch_size))
+            if not batch:
+                break
+            AttendanceMonthlyRollup.objects.bulk_create(batch)
+            created += len(batch)
+        rebuild_attendance_bitmaps(year, employee_ids, batch_size)
+        attendance_changed()
+    
+    return created
+
+
+def apply_rollup_change(old, new):
+    """Move a record's rollup contribution from its old to its new value with F() updates"""
+    from .models import AttendanceMonthlyRollup
+    
+    changes = {}
+    for contribution, sign in ((old, -1), (new, 1)):
+        if not contribution:
+            continue
+        employee_id, year, month, counters = contribution
+        delta = changes.setdefault((employee_id, year, month), dict.fromkeys(counters, 0))
+        for field, value in counters.items():
+            delta[field] += sign * value
+    
+    for key, delta in changes.items():
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            continue
+        
+        employee_id, year, month = key
+        rollups = AttendanceMonthlyRollup.objects.filter(
+            employee_id=employee_id, year=year, month=month
+        )
+        updates = {field: F(field) + value for field, value in delta.items()}
+        if rollups.update(updated_at=timezone.now(), **updates):
+            continue
+        
+        # A missing rollup only needs a recount when something is taken away from it
+        if any(value < 0 for value in delta.values()):
+            refresh_attendance_rollups({key})
+            continue
+        
+        try:
+            with transaction.atomic():
+                AttendanceMonthlyRollup.objects.create(
+                    employee_id=employee_id, year=year, month=month, **delta
+                )
+        except IntegrityError:
+            # Created concurrently by the month's first record in another request
+            rollups.update(updated_at=timezone.now(), **updates)
+
+
+def summarize_attendance(start_date, end_date, employee_ids=None):
+    """Get attendance counters per employee for a date range
+    
+    Whole months inside the range are read from the monthly rollups and only
+    partial months at the edges are aggregated from raw records, each in a
+    single grouped query.
+    """
+    from .models import AttendanceRecord, AttendanceMonthlyRollup
+    
+    flush_attendance_refreshes()
+    archived = get_archived_years()
+    full_months = Q(pk__in=[])
+    partial_ranges = Q(pk__in=[])
+    archived_ranges = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        first_day, last_day = month_bounds(year, month)
+        if first_day >= start_date and last_day <= end_date:
+            full_months |= Q(year=year, month=month)
+        elif year in archived:
+            archived_ranges.append((max(first_day, start_date), min(last_day, end_date)))
+        else:
+            partial_ranges |= Q(date__range=[max(first_day, start_date), min(last_day, end_date)])
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    
+    rollups = AttendanceMonthlyRollup.objects.filter(full_months)
+    records = AttendanceRecord.objects.filter(partial_ranges)
+    if employee_ids is not None:
+        rollups = rollups.filter(employee_id__in=employee_ids)
+        records = records.filter(employee_id__in=employee_ids)
+    
+    summaries = {}
+    sources = [
+        rollups.order_by().values('employee_id').annotate(
+            **{field: Sum(field) for field in ROLLUP_COUNTERS}
+        ),
+        records.order_by().values('employee_id').annotate(**rollup_aggregates()),
+    ]
+    for rows in sources:
+        for row in rows:
+            summary = summaries.get(row['employee_id'])
+            if summary is None:
+                summary = summaries[row['employee_id']] = empty_attendance_summary()
+            for field in ROLLUP_COUNTERS:
+                summary[field] += row[field] or 0
+    
+    # Archived years keep only their rollups, partial months are counted from the archive files
+    if archived_ranges and employee_ids is not None and hasattr(employee_ids, 'values_list'):
+        employee_ids = employee_ids.values_list('pk', flat=True)
+    for first_day, last_day in archived_ranges:
+        for record in attendance_history(first_day, last_day, employee_ids):
+            summary = summaries.get(record.employee_id)
+            if summary is None:
+                summary = summaries[record.employee_id] = empty_attendance_summary()
+            counters = record.get_rollup_contribution()[3]
+            for field in ROLLUP_COUNTERS:
+                summary[field] += counters[field]
+    
+    return summaries
+
+
+def day_bit(day):
+    """Get the bit of a date in its year's attendance bitmaps"""
+    return 1 << (day.timetuple().tm_yday - 1)
+
+
+def date_range_bits(start_date, end_date):
+    """Get the bits of every day from start_date to end_date, both in the same year"""
+    first = start_date.timetuple().tm_yday - 1
+    last = end_date.timetuple().tm_yday - 1
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def get_working_days(start_date, end_date):
+    """Get the weekdays in a range that are not active holidays"""
+    from payroll.models import Holiday
+    
+    holidays = set(Holiday.objects.filter(
+        date__range=[start_date, end_date], is_active=True
+    ).values_list('date', flat=True))
+    
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() < 5 and current_date not in holidays:
+            days.append(current_date)
+        current_date += timedelta(days=1)
+    
+    return days
+
+
+def working_day_bits(start_date, end_date):
+    """Get the bits of the weekdays in a same-year range that are not active holidays"""
+    from payroll.models import Holiday
+    
+    holidays = set(Holiday.objects.filter(
+        date__range=[start_date, end_date], is_active=True
+    ).values_list('date', flat=True))
+    
+    bits = 0
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date.weekday() < 5 and current_date not in holidays:
+            bits |= day_bit(current_date)
+        current_date += timedelta(days=1)
+    
+    return bits
+
+
+def bitmap_flags(status, is_late):
+    """Get the bitmap kinds a record with this status and lateness sets"""
+    from .models import AttendanceBitmap
+    
+    return {
+        'present': status in AttendanceBitmap.PRESENT_STATUSES,
+        'late': bool(is_late),
+        'leave': status == 'LEAVE',
+    }
+
+
+def set_day_flags(bitmap, day, flags):
+    """Set or clear a day's bit in every bitmap kind"""
+    bit = day_bit(day)
+    for kind in bitmap.KINDS:
+        bits = bitmap.get_bits(kind)
+        bitmap.set_bits(kind, bits | bit if flags.get(kind) else bits & ~bit)
+
+
+def apply_bitmap_change(old, new):
+    """Move a record's day flags from their old to their new value, one read-modify-write per bitmap"""
+    from .models import AttendanceBitmap
+    
+    if old == new:
+        return
+    
+    # Clear the old day before setting the new one, they can share a bitmap
+    changes = {}
+    for contribution, keep in ((old, False), (new, True)):
+        if not contribution:
+            continue
+        employee_id, day, flags = contribution
+        changes.setdefault((employee_id, day.year), []).append((day, flags if keep else {}))
+    
+    for (employee_id, year), days in changes.items():
+        bitmaps = AttendanceBitmap.objects.select_for_update().filter(employee_id=employee_id, year=year)
+        bitmap = bitmaps.first()
+        if bitmap is not None:
+            for day, flags in days:
+                set_day_flags(bitmap, day, flags)
+            bitmap.save(update_fields=AttendanceBitmap.KINDS + ['updated_at'])
+            continue
+        
+        bitmap = AttendanceBitmap(employee_id=employee_id, year=year)
+        for day, flags in days:
+            set_day_flags(bitmap, day, flags)
+        if not any(bitmap.get_bits(kind) for kind in bitmap.KINDS):
+            continue
+        
+        try:
+            with transaction.atomic():
+                bitmap.save()
+        except IntegrityError:
+            # Created concurrently by the year's first record in another request
+            bitmap = bitmaps.get()
+            for day, flags in days:
+                set_day_flags(bitmap, day, flags)
+            bitmap.save(update_fields=AttendanceBitmap.KINDS + ['updated_at'])
+
+
+def refresh_attendance_bitmaps(keys):
+    """Rewrite the bits of a set of (employee_id, year, month) keys from their records"""
+    from .models import AttendanceRecord, AttendanceBitmap
+    
+    archived = get_archived_years() if keys else set()
+    
+    months_by_year = {}
+    for employee_id, year, month in keys:
+        if year in archived:
+            continue
+        months_by_year.setdefault(year, {}).setdefault(employee_id, set()).add(month)
+    
+    with transaction.atomic():
+        for year, months_by_employee in months_by_year.items():
+            bitmaps = {
+                bitmap.employee_id: bitmap
+                for bitmap in AttendanceBitmap.objects.select_for_update().filter(
+                    year=year, employee_id__in=list(months_by_employee)
+                )
+            }
+            
+            # Clear the refreshed months, then set the bits of their records
+            for employee_id, months in months_by_employee.items():
+                bitmap = bitmaps.get(employee_id)
+                if bitmap is None:
+                    bitmap = bitmaps[employee_id] = AttendanceBitmap(employee_id=employee_id, year=year)
+                mask = 0
+                for month in months:
+                    mask |= date_range_bits(*month_bounds(year, month))
+                for kind in bitmap.KINDS:
+                    bitmap.set_bits(kind, bitmap.get_bits(kind) & ~mask)
+            
+            first_month = min(min(months) for months in months_by_employee.values())
+            last_month = max(max(months) for months in months_by_employee.values())
+            records = AttendanceRecord.objects.filter(
+                employee_id__in=list(months_by_employee),
+                date__range=[month_bounds(year, first_month)[0], month_bounds(year, last_month)[1]]
+            ).values_list('employee_id', 'date', 'status', 'is_late')
+            
+            for employee_id, day, status, is_late in records.iterator():
+                if day.month not in months_by_employee[employee_id]:
+                    continue
+                set_day_flags(bitmaps[employee_id], day, bitmap_flags(status, is_late))
+            
+            now = timezone.now()
+            existing = []
+            for bitmap in bitmaps.values():
+                bitmap.updated_at = now
+                if bitmap.pk:
+                    existing.append(bitmap)
+            AttendanceBitmap.objects.bulk_update(existing, AttendanceBitmap.KINDS + ['updated_at'])
+            AttendanceBitmap.objects.bulk_create([bitmap for bitmap in bitmaps.values() if not bitmap.pk])
+
+
+def rebuild_attendance_bitmaps(year=None, employee_ids=None, batch_size=5000):
+    """Rebuild bitmaps from scratch for backfills, optionally limited to a year or employees"""
+    from .models import AttendanceRecord, AttendanceBitmap
+    
+    archived = get_archived_years()
+    if year in archived:
+        raise ValueError(f"Attendance of {year} is archived, its bitmaps cannot be rebuilt.")
+    
+    bitmaps = AttendanceBitmap.objects.exclude(year__in=archived)
+    records = AttendanceRecord.objects.exclude(date__year__in=archived)
+    if year:
+        bitmaps = bitmaps.filter(year=year)
+        records = records.filter(date__year=year)
+    if employee_ids:
+        bitmaps = bitmaps.filter(employee_id__in=employee_ids)
+        records = records.filter(employee_id__in=employee_ids)
+    
+    rows = records.order_by('employee_id', 'date').values_list('employee_id', 'date', 'status', 'is_late')
+    
+    created = 0
+    batch = []
+    with transaction.atomic():
+        bitmaps.delete()
+        for (employee_id, bitmap_year), days in groupby(
+            rows.iterator(chunk_size=batch_size), key=lambda row: (row[0], row[1].year)
+        ):
+            bitmap = AttendanceBitmap(employee_id=employee_id, year=bitmap_year)
+            for _, day, status, is_late in days:
+                set_day_flags(bitmap, day, bitmap_flags(status, is_late))
+            batch.append(bitmap)
+            
+            if len(batch) >= batch_size:
+                AttendanceBitmap.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        
+        AttendanceBitmap.objects.bulk_create(batch)
+        created += len(batch)
+    
+    return created
+
+
+def combine_bitmaps(bitmaps, kind, operator='and'):
+    """AND or OR one kind of bits across bitmaps, e.g. days everyone or anyone was present"""
+    combined = None
+    for bitmap in bitmaps:
+        bits = bitmap.get_bits(kind)
+        if combined is None:
+            combined = bits
+        elif operator == 'and':
+            combined &= bits
+        else:
+            combined |= bits
+    
+    return combined or 0
+
+
+def encode_bitmap(bits):
+    """Get a bitmap integer as base64 of its little-endian bytes"""
+    from .models import AttendanceBitmap
+    
+    return base64.b64encode(bits.to_bytes(AttendanceBitmap.BITMAP_BYTES, 'little')).decode('ascii')
+
+
+def employees_with_full_attendance(start_date, end_date, employee_ids=None):
+    """Get ids of employees present on every working day of a same-year range"""
+    from .models import AttendanceBitmap
+    
+    flush_attendance_refreshes()
+    mask = working_day_bits(start_date, end_date)
+    bitmaps = AttendanceBitmap.objects.filter(year=start_date.year).only('employee_id', 'present')
+    if employee_ids is not None:
+        bitmaps = bitmaps.filter(employee_id__in=employee_ids)
+    
+    return [
+        bitmap.employee_id for bitmap in bitmaps.iterator()
+        if bitmap.get_bits('present') & mask == mask
+    ]
+
+
+def overlapping_leaves(start_date, end_date, statuses=None):
+    """Get leave applications overlapping a date range, served by the leave interval indexes"""
+    from .models import LeaveApplication
+    
+    return LeaveApplication.objects.filter(
+        status__in=statuses or LeaveApplication.ACTIVE_STATUSES,
+        start_date__lte=end_date,
+        end_date__gte=start_date
+    )
+
+
+def build_leave_calendar(start_date, end_date, department_id=None, statuses=None):
+    """Get who is on leave in a date range, grouped by employee with a daily headcount, in one query"""
+    leaves = overlapping_leaves(start_date, end_date, statuses)
+    if department_id is not None:
+        leaves = leaves.filter(employee__department_id=department_id)
+    
+    rows = leaves.order_by('employee__employee_id', 'start_date').values(
+        'id', 'employee_id', 'employee__employee_id', 'employee__first_name',
+        'employee__last_name', 'leave_type__name', 'start_date', 'end_date', 'total_days', 'status'
+    )
+    
+    employees = {}
+    daily_counts = {}
+    for row in rows:
+        entry = employees.get(row['employee_id'])
+        if entry is None:
+            entry = employees[row['employee_id']] = {
+                'employee': row['employee_id'],
+                'employee_code': row['employee__employee_id'],
+                'employee_name': f"{row['employee__first_name']} {row['employee__last_name']}".strip(),
+                'leaves': [],
+            }
+        entry['leaves'].append({
+            'id': row['id'],
+            'leave_type': row['leave_type__name'],
+            'start_date': row['start_date'],
+            'end_date': row['end_date'],
+            'total_days': row['total_days'],
+            'status': row['status'],
+        })
+        
+        # Count each employee once per day even if their applications touch
+        current_date = max(row['start_date'], start_date)
+        while current_date <= min(row['end_date'], end_date):
+            daily_counts.setdefault(current_date, set()).add(row['employee_id'])
+            current_date += timedelta(days=1)
+    
+    return {
+        'date_from': start_date,
+        'date_to': end_date,
+        'department': department_id,
+        'employee_count': len(employees),
+        'employees': list(employees.values()),
+        'daily_counts': {day.isoformat(): len(ids) for day, ids in sorted(daily_counts.items())},
+    }
+
+
+def leave_ranges(applications):
+    """Get a filter matching the attendance days covered by leave applications"""
+    ranges = Q(pk__in=[])
+    for application in applications:
+        ranges |= Q(employee_id=application.employee_id, date__range=[application.start_date, application.end_date])
+    return ranges
+
+
+def leave_affected_days(applications, working_days=None):
+    """Get the days of each employee covered by leave applications, optionally only working days"""
+    affected_days = {}
+    for application in applications:
+        current_date = application.start_date
+        while current_date <= application.end_date:
+            if working_days is None or current_date in working_days:
+                affected_days.setdefault(application.employee_id, set()).add(current_date)
+            current_date += timedelta(days=1)
+    return affected_days
+
+
+def leave_days_changed(affected_days):
+    """Refresh rollups, stale payrolls and cached stats after leave days were written in bulk"""
+    refresh_attendance_rollups({
+        (employee_id, day.year, day.month)
+        for employee_id, days in affected_days.items()
+        for day in days
+    })
+    mark_payrolls_stale(affected_days)
+    attendance_changed()
+
+
+def materialize_leave_days(applications, batch_size=2000):
+    """Create LEAVE records for the working days of approved leave applications"""
+    from .models import AttendanceRecord
+    
+    applications = list(applications)
+    if not applications:
+        return 0
+    
+    working_days = set(get_working_days(
+        min(application.start_date for application in applications),
+        max(application.end_date for application in applications)
+    ))
+    affected_days = leave_affected_days(applications, working_days)
+    records = [
+        AttendanceRecord(
+            employee_id=application.employee_id, date=day, status='LEAVE',
+            notes='Approved leave', leave_application=application
+        )
+        for application in applications
+        for day in sorted(working_days)
+        if application.start_date <= day <= application.end_date
+    ]
+    
+    # Days already punched keep their record, days the sweep marked absent turn into leave
+    AttendanceRecord.objects.bulk_create(records, batch_size=batch_size, ignore_conflicts=True)
+    AttendanceRecord.objects.filter(
+        leave_ranges(applications), status='ABSENT', time_in__isnull=True
+    ).update(
+        status='LEAVE',
+        leave_application_id=Case(*[
+            When(
+                employee_id=application.employee_id,
+                date__range=[application.start_date, application.end_date],
+                then=Value(application.pk)
+            )
+            for application in applications
+        ]),
+        updated_at=timezone.now()
+    )
+    
+    leave_days_changed(affected_days)
+    return len(records)
+
+
+def clear_leave_days(applications):
+    """Remove the LEAVE records materialized for leave applications that no longer apply"""
+    from .models import AttendanceRecord, AttendanceDeletion
+    
+    applications = list(applications)
+    if not applications:
+        return 0
+    
+    # LEAVE records HR entered by hand are not linked to an application and stay
+    records = AttendanceRecord.objects.filter(
+        leave_application__in=applications, status='LEAVE', time_in__isnull=True
+    )
+    today = timezone.localdate()
+    
+    # Past days were already swept, without the leave they count as absences
+    records.filter(date__lt=today).update(status='ABSENT', leave_application=None, updated_at=timezone.now())
+    upcoming = records.filter(date__gte=today)
+    AttendanceDeletion.objects.bulk_create([
+        AttendanceDeletion(employee_id=employee_id, date=record_date)
+        for employee_id, record_date in upcoming.values_list('employee_id', 'date')
+    ])
+    deleted, _ = upcoming.delete()
+    
+    leave_days_changed(leave_affected_days(applications))
+    return deleted
+
+
+def bulk_approve_leave_applications(application_ids, approved_by):
+    """Approve many leave applications in one transaction, returning an outcome per ID"""
+    from .models import LeaveApplication
+    
+    results = {}
+    with transaction.atomic():
+        applications = LeaveApplication.objects.select_related(
+            'employee', 'leave_type'
+        ).filter(pk__in=application_ids).order_by('pk')
+        
+        # Lock the applications only, not the employees and leave types joined in
+        if connections[applications.db].features.has_select_for_update_of:
+            applications = applications.select_for_update(of=('self',))
+        else:
+            applications = applications.select_for_update()
+        
+        approved = []
+        for application in applications:
+            if application.status == 'APPROVED':
+                results[application.pk] = {'id': application.pk, 'status': 'failed', 'error': 'Leave application is already approved.'}
+                continue
+            
+            # One application short of balance must not undo the others
+            try:
+                with transaction.atomic():
+                    post_leave_entry(
+                        application.employee, application.leave_type, application.start_date.year,
+                        'USAGE', -application.total_days, application=application, created_by=approved_by,
+                        description=f"Leave {application.start_date} to {application.end_date}"
+                    )
+            except ValueError as e:
+                results[application.pk] = {'id': application.pk, 'status': 'failed', 'error': str(e)}
+                continue
+            
+            approved.append(application)
+            results[application.pk] = {'id': application.pk, 'status': 'approved'}
+        
+        now = timezone.now()
+        LeaveApplication.objects.filter(pk__in=[application.pk for application in approved]).update(
+            status='APPROVED', approved_by=approved_by, approved_at=now, updated_at=now
+        )
+        materialize_leave_days(approved)
+    
+    return [
+        results.get(application_id, {'id': application_id, 'status': 'failed', 'error': 'Leave application not found.'})
+        for application_id in application_ids
+    ]
+
+
+LEAVE_ALLOW_NEGATIVE_BALANCE = getattr(settings, 'LEAVE_ALLOW_NEGATIVE_BALANCE', False)
+
+
+def sync_employee_leave_counter(employee, leave_type, balance):
+    """Copy the current year's ledger balance onto the employee counter the leave type is linked to"""
+    from employees.models import Employee
+    
+    if not leave_type.employee_balance_field or balance.year != timezone.now().year:
+        return
+    
+    days = int(balance.balance.to_integral_value(rounding=ROUND_FLOOR))
+    Employee.objects.filter(pk=employee.pk).update(**{leave_type.employee_balance_field: days})
+    setattr(employee, leave_type.employee_balance_field, days)
+
+
+def opening_entitlement(leave_type, accrues=False):
+    """Get the days a year's balance opens with
+    
+    Only the year the ledger arrived opened from the Employee counters, seeded by
+    migration 0013. Every other year opens from the leave type.
+    """
+    # Accruing types build up month by month instead
+    if accrues:
+        return Decimal('0.00')
+    return Decimal(leave_type.max_days_per_year)
+
+
+def opening_ledger_entries(balance):
+    """Build the entries explaining a newly opened balance"""
+    from .models import LeaveLedgerEntry
+    
+    entries = []
+    if balance.accrued:
+        entries.append(LeaveLedgerEntry(
+            employee_id=balance.employee_id, leave_type_id=balance.leave_type_id, year=balance.year,
+            entry_type='ACCRUAL', days=balance.accrued, balance_after=balance.accrued,
+            description='Opening entitlement'
+        ))
+    if balance.used:
+        entries.append(LeaveLedgerEntry(
+            employee_id=balance.employee_id, leave_type_id=balance.leave_type_id, year=balance.year,
+            entry_type='USAGE', days=-balance.used, balance_after=balance.accrued - balance.used,
+            description='Leave approved before the ledger'
+        ))
+    return entries
+
+
+def open_leave_balance(employee, leave_type, year):
+    """Create a year's balance from its entitlement and the leave approved before the ledger existed"""
+    from .models import LeaveAccrualRule, LeaveApplication, LeaveBalance, LeaveLedgerEntry
+    
+    accrues = LeaveAccrualRule.objects.filter(
+        leave_type=leave_type, employment_type=employee.employment_type, is_active=True
+    ).exists()
+    entitlement = opening_entitlement(leave_type, accrues)
+    
+    used = Decimal(LeaveApplication.objects.filter(
+        employee=employee, leave_type=leave_type, status='APPROVED', start_date__year=year
+    ).aggregate(total_days=Sum('total_days'))['total_days'] or 0)
+    
+    balance = LeaveBalance(
+        employee=employee, leave_type=leave_type, year=year,
+        accrued=entitlement, used=used, balance=entitlement - used
+    )
+    try:
+        with transaction.atomic():
+            balance.save()
+    except IntegrityError:
+        # Opened concurrently by another request
+        return
+    
+    LeaveLedgerEntry.objects.bulk_create(opening_ledger_entries(balance))
+    sync_employee_leave_counter(employee, leave_type, balance)
+
+
+def get_leave_balance(employee, leave_type, year, lock=False):
+    """Get the balance row of an employee, leave type and year, opening it on first use"""
+    from .models import LeaveBalance
+    
+    balances = LeaveBalance.objects.filter(employee=employee, leave_type=leave_type, year=year)
+    if lock:
+        balances = balances.select_for_update()
+    
+    balance = balances.first()
+    if balance is None:
+        open_leave_balance(employee, leave_type, year)
+        balance = balances.get()
+    
+    return balance
+
+
+def get_leave_balances(employee, year):
+    """Get an employee's balances of every active leave type for a year"""
+    from .models import LeaveBalance, LeaveType
+    
+    balances = {
+        balance.leave_type_id: balance
+        for balance in LeaveBalance.objects.filter(employee=employee, year=year).select_related('leave_type')
+    }
+    for leave_type in LeaveType.objects.filter(is_active=True).exclude(id__in=list(balances)):
+        balances[leave_type.id] = get_leave_balance(employee, leave_type, year)
+    
+    return sorted(balances.values(), key=lambda balance: balance.leave_type.name)
+
+
+def post_leave_entry(employee, leave_type, year, entry_type, days, application=None, created_by=None, description=''):
+    """Append a ledger entry and move the running balance under a row lock"""
+    from .models import LeaveLedgerEntry
+    
+    days = Decimal(days)
+    with transaction.atomic():
+        balance = get_leave_balance(employee, leave_type, year, lock=True)
+        
+        if entry_type == 'ACCRUAL':
+            balance.accrued += days
+        elif entry_type == 'USAGE':
+            balance.used -= days
+        else:
+            balance.adjusted += days
+        balance.balance += days
+        
+        if entry_type == 'USAGE' and days < 0 and balance.balance < 0 and not LEAVE_ALLOW_NEGATIVE_BALANCE:
+            raise ValueError(
+                f"Insufficient {leave_type.name} balance: {balance.balance - days} days left, {-days} requested."
+            )
+        
+        balance.save(update_fields=['accrued', 'used', 'adjusted', 'balance', 'updated_at'])
+        entry = LeaveLedgerEntry.objects.create(
+            employee=employee,
+            leave_type=leave_type,
+            year=year,
+            entry_type=entry_type,
+            days=days,
+            balance_after=balance.balance,
+            leave_application=application,
+            description=description[:200],
+            created_by=created_by
+        )
+        sync_employee_leave_counter(employee, leave_type, balance)
+    
+    return entry
+
+
+class LeaveAccrualJob:
+    """Utility class for accruing a month of leave for every active employee in bulk"""
+    
+    COUNTER_FIELDS = ['annual_leave_balance', 'sick_leave_balance', 'casual_leave_balance']
+
+    def __init__(self, year, month, batch_size=2000):
+        self.year = year
+        self.month = month
+        self.batch_size = batch_size
+        
+        if not 1 <= self.month <= 12:
+            raise ValueError("Month must be between 1 and 12.")
+
+    def get_rules(self):
+        """Get the active accrual rules grouped by employment type"""
+        from .models import LeaveAccrualRule
+        
+        rules = {}
+        for rule in LeaveAccrualRule.objects.filter(
+            is_active=True, leave_type__is_active=True
+        ).select_related('leave_type'):
+            rules.setdefault(rule.employment_type, []).append(rule)
+        return rules
+
+    def get_employees(self, employment_types):
+        """Get the active employees employed during the month"""
+        from employees.models import Employee
+        
+        first_day, last_day = month_bounds(self.year, self.month)
+        return list(Employee.objects.filter(
+            Q(hire_date__isnull=True) | Q(hire_date__lte=last_day),
+            Q(termination_date__isnull=True) | Q(termination_date__gte=first_day),
+            is_active=True,
+            employment_type__in=employment_types
+        ).only('id', 'employment_type', *self.COUNTER_FIELDS))
+
+    def get_pre_ledger_usage(self, leave_type_ids):
+        """Get the leave approved before the ledger existed, per employee and leave type"""
+        from .models import LeaveApplication
+        
+        return {
+            (row['employee_id'], row['leave_type_id']): row['total_days']
+            for row in LeaveApplication.objects.filter(
+                status='APPROVED', start_date__year=self.year, leave_type_id__in=leave_type_ids
+            ).values('employee_id', 'leave_type_id').annotate(total_days=Sum('total_days'))
+        }
+
+    def run(self):
+        """Accrue the month once, with one ledger insert and one counter update for everyone"""
+        from employees.models import Employee
+        from .models import LeaveAccrualRun, LeaveBalance, LeaveLedgerEntry
+        
+        result = {
+            'already_run': False,
+            'employees_accrued': 0,
+            'balances_opened': 0,
+            'entries_created': 0,
+            'days_accrued': Decimal('0.00'),
+        }
+        with transaction.atomic():
+            # The run row is claimed first, so a rerun or a concurrent run stops here
+            try:
+                with transaction.atomic():
+                    run = LeaveAccrualRun.objects.create(year=self.year, month=self.month)
+            except IntegrityError:
+                result['already_run'] = True
+                return result
+            
+            rules = self.get_rules()
+            leave_type_ids = {rule.leave_type_id for type_rules in rules.values() for rule in type_rules}
+            balances = {
+                (balance.employee_id, balance.leave_type_id): balance
+                for balance in LeaveBalance.objects.select_for_update().filter(
+                    year=self.year, leave_type_id__in=leave_type_ids
+                )
+            }
+            employees = self.get_employees(list(rules))
+            
+            pre_ledger_usage = None
+            opened, updated, entries, counters = [], [], [], {}
+            description = f'Monthly accrual {self.year}-{self.month:02d}'
+            for employee in employees:
+                accrued_any = False
+                for rule in rules[employee.employment_type]:
+                    leave_type = rule.leave_type
+                    balance = balances.get((employee.id, leave_type.id))
+                    if balance is None:
+                        if pre_ledger_usage is None:
+                            pre_ledger_usage = self.get_pre_ledger_usage(leave_type_ids)
+                        accrued = opening_entitlement(leave_type, accrues=True)
+                        used = Decimal(pre_ledger_usage.get((employee.id, leave_type.id), 0))
+                        balance = LeaveBalance(
+                            employee_id=employee.id, leave_type=leave_type, year=self.year,
+                            accrued=accrued, used=used, balance=accrued - used
+                        )
+                        entries.extend(opening_ledger_entries(balance))
+                        opened.append(balance)
+                    
+                    # Accrual stops at the yearly entitlement of the leave type
+                    days = min(rule.days_per_month, Decimal(leave_type.max_days_per_year) - balance.accrued)
+                    if days <= 0:
+                        continue
+                    
+                    balance.accrued += days
+                    balance.balance += days
+                    if balance.pk:
+                        updated.append(balance)
+                    entries.append(LeaveLedgerEntry(
+                        employee_id=employee.id, leave_type=leave_type, year=self.year, entry_type='ACCRUAL',
+                        days=days, balance_after=balance.balance, description=description
+                    ))
+                    if leave_type.employee_balance_field and self.year == timezone.now().year:
+                        counters.setdefault(employee.id, {})[leave_type.employee_balance_field] = int(
+                            balance.balance.to_integral_value(rounding=ROUND_FLOOR)
+                        )
+                    accrued_any = True
+                    result['days_accrued'] += days
+                
+                if accrued_any:
+                    result['employees_accrued'] += 1
+            
+            # A balance opened concurrently by an approval fails the whole run, which can then be repeated
+            LeaveBalance.objects.bulk_create(opened, batch_size=self.batch_size)
+            now = timezone.now()
+            for balance in updated:
+                balance.updated_at = now
+            LeaveBalance.objects.bulk_update(updated, ['accrued', 'balance', 'updated_at'], batch_size=self.batch_size)
+            LeaveLedgerEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+            
+            changed_employees = []
+            for employee in employees:
+                if employee.id in counters:
+                    for field, days in counters[employee.id].items():
+                        setattr(employee, field, days)
+                    changed_employees.append(employee)
+            if changed_employees:
+                Employee.objects.bulk_update(changed_employees, self.COUNTER_FIELDS, batch_size=self.batch_size)
+            
+            result['balances_opened'] = len(opened)
+            result['entries_created'] = len(entries)
+            run.employees_accrued = result['employees_accrued']
+            run.entries_created = result['entries_created']
+            run.days_accrued = result['days_accrued']
+            run.save(update_fields=['employees_accrued', 'entries_created', 'days_accrued'])
+        
+        return result
+
+
+# The version key is bumped by writers in any process, the cache must be a shared backend.
+# Each bump is one cache set, which the database backend runs as 3 queries plus a
+# transaction; ATTENDANCE_STATS_CACHE can point stats at a cheaper alias such as Redis.
+ATTENDANCE_STATS_CACHE = getattr(settings, 'ATTENDANCE_STATS_CACHE', 'default')
+ATTENDANCE_STATS_CACHE_TIMEOUT = getattr(settings, 'ATTENDANCE_STATS_CACHE_TIMEOUT', 300)
+ATTENDANCE_STATS_VERSION_KEY = 'attendance:stats:version'
+
+
+def get_stats_cache():
+    """Get the cache holding attendance stats and their version"""
+    return caches[ATTENDANCE_STATS_CACHE]
+
+
+def new_attendance_stats_version():
+    """Get a random version, a culled version key never brings back an old one"""
+    return secrets.token_hex(8)
+
+
+def get_attendance_stats_version():
+    """Get the version stamped into cached attendance stats"""
+    return get_stats_cache().get_or_set(ATTENDANCE_STATS_VERSION_KEY, new_attendance_stats_version, None)
+
+
+def bump_attendance_stats_version():
+    """Invalidate every cached attendance stats payload at once"""
+    # Not incr(), the database backend runs it as a get and a set that restores the default timeout
+    get_stats_cache().set(ATTENDANCE_STATS_VERSION_KEY, new_attendance_stats_version(), None)
+
+
+def attendance_changed():
+    """Invalidate cached attendance stats once the current transaction commits"""
+    transaction.on_commit(bump_attendance_stats_version)
+
+
+def attendance_stats_cache_key(scope, employee_id=None, date_from=None, date_to=None):
+    """Get the cache key of a stats payload for a user scope and date range"""
+    return 'attendance:stats:{}:{}:{}:{}:{}'.format(
+        get_attendance_stats_version(), scope, employee_id or '', date_from or '', date_to or ''
+    )
+
+
+def calculate_attendance_stats(queryset):
+    """Get attendance statistics with one conditional aggregation and one grouped query"""
+    from .models import AttendanceRecord
+    
+    queryset = queryset.order_by()
+    zero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=8, decimal_places=2))
+    
+    totals = queryset.aggregate(
+        total_records=Count('id'),
+        late_days=Count('id', filter=Q(is_late=True)),
+        total_hours_sum=Coalesce(Sum('total_hours'), zero),
+        regular_hours_sum=Coalesce(Sum('regular_hours'), zero),
+        overtime_hours_sum=Coalesce(Sum('overtime_hours'), zero),
+        avg_daily_hours=Coalesce(Avg('total_hours'), zero),
+        **{
+            f'status_{status}': Count('id', filter=Q(status=status))
+            for status, _ in AttendanceRecord.STATUS_CHOICES
+        }
+    )
+    
+    monthly_breakdown = [
+        {
+            'month': row['month'].strftime('%Y-%m'),
+            'total_days': row['total_days'],
+            'present_days': row['present_days'],
+            'total_hours': row['total_hours_sum'],
+            'overtime_hours': row['overtime_hours_sum'],
+        }
+        for row in queryset.annotate(month=TruncMonth('date')).values('month').annotate(
+            total_days=Count('id'),
+            present_days=Count('id', filter=Q(status='PRESENT')),
+            total_hours_sum=Sum('total_hours'),
+            overtime_hours_sum=Sum('overtime_hours')
+        ).order_by('month')
+    ]
+    
+    status_breakdown = sorted(
+        [
+            {'status': status, 'count': totals[f'status_{status}']}
+            for status, _ in AttendanceRecord.STATUS_CHOICES
+            if totals[f'status_{status}']
+        ],
+        key=lambda row: row['count'],
+        reverse=True
+    )
+    
+    total_records = totals['total_records']
+    present_days = totals['status_PRESENT']
+    late_days = totals['late_days']
+    
+    # Calculate rates
+    attendance_rate = (present_days / total_records * 100) if total_records > 0 else 0
+    punctuality_rate = ((present_days - late_days) / present_days * 100) if present_days > 0 else 0
+    
+    return {
+        'total_records': total_records,
+        'present_days': present_days,
+        'absent_days': totals['status_ABSENT'],
+        'late_days': late_days,
+        'leave_days': totals['status_LEAVE'],
+        'attendance_rate': round(attendance_rate, 2),
+        'punctuality_rate': round(punctuality_rate, 2),
+        'total_hours': totals['total_hours_sum'],
+        'regular_hours': totals['regular_hours_sum'],
+        'overtime_hours': totals['overtime_hours_sum'],
+        'average_daily_hours': round(totals['avg_daily_hours'], 2),
+        'monthly_breakdown': monthly_breakdown,
+        'status_breakdown': status_breakdown,
+    }
+
+
+class ShiftHoursRecalculator:
+    """Utility class for recomputing hours and lateness of a shift's records in bulk"""
+    
+    FIELDS = ['regular_hours', 'overtime_hours', 'is_late', 'late_minutes', 'updated_at']
+
+    def __init__(self, shift, date_from=None, date_to=None, batch_size=2000):
+        self.shift = shift
+        self.date_from = date_from
+        self.date_to = date_to
+        self.batch_size = batch_size
+
+    def get_queryset(self):
+        """Get the shift's records in the date range with only the fields the math needs"""
+        from .models import AttendanceRecord
+        
+        records = AttendanceRecord.objects.filter(shift=self.shift)
+        if self.date_from:
+            records = records.filter(date__gte=self.date_from)
+        if self.date_to:
+            records = records.filter(date__lte=self.date_to)
+        
+        return records.order_by('id').only(
+            'id', 'employee_id', 'date', 'time_in', 'time_out', 'total_hours',
+            'regular_hours', 'overtime_hours', 'is_late', 'late_minutes'
+        )
+
+    def run(self):
+        """Recompute the records, refresh their rollups and mark dependent payrolls stale"""
+        from .models import AttendanceRecord
+        
+        expected_hours = self.shift.working_hours
+        shift_start = self.shift.start_time
+        now = timezone.now()
+        
+        # The shift start is the same for every record of a day, make it aware once per date
+        expected_starts = {}
+        
+        updated = []
+        checked = 0
+        affected_days = {}
+        with transaction.atomic():
+            for record in self.get_queryset().iterator(chunk_size=self.batch_size):
+                checked += 1
+                values = (record.regular_hours, record.overtime_hours, record.is_late, record.late_minutes)
+                
+                if record.time_in and record.time_out:
+                    if record.total_hours <= expected_hours:
+                        record.regular_hours = record.total_hours
+                        record.overtime_hours = Decimal('0.00')
+                    else:
+                        record.regular_hours = expected_hours
+                        record.overtime_hours = record.total_hours - expected_hours
+                
+                if record.time_in:
+                    expected_start = expected_starts.get(record.date)
+                    if expected_start is None:
+                        expected_start = expected_starts[record.date] = timezone.make_aware(
+                            datetime.combine(record.date, shift_start)
+                        )
+                    late_seconds = (record.time_in - expected_start).total_seconds()
+                    record.is_late = late_seconds > 0
+                    record.late_minutes = int(late_seconds / 60) if late_seconds > 0 else 0
+                
+                if values == (record.regular_hours, record.overtime_hours, record.is_late, record.late_minutes):
+                    continue
+                
+                record.updated_at = now
+                updated.append(record)
+                affected_days.setdefault(record.employee_id, set()).add(record.date)
+                
+                if len(updated) >= self.batch_size:
+                    AttendanceRecord.objects.bulk_update(updated, self.FIELDS)
+                    updated = []
+            
+            if updated:
+                AttendanceRecord.objects.bulk_update(updated, self.FIELDS)
+            
+            refresh_attendance_rollups({
+                (employee_id, day.year, day.month)
+                for employee_id, days in affected_days.items()
+                for day in days
+            })
+            stale_payrolls = mark_payrolls_stale(affected_days)
+            attendance_changed()
+        
+        return {
+            'records_checked': checked,
+            'records_updated': sum(len(days) for days in affected_days.values()),
+            'employees_affected': len(affected_days),
+            'payrolls_marked_stale': stale_payrolls,
+        }
+
+
+def mark_payrolls_stale(affected_days):
+    """Flag unapproved payrolls of affected employees overlapping the changed dates"""
+    from payroll.models import Payroll
+    
+    if not affected_days:
+        return 0
+    
+    first_day = min(min(days) for days in affected_days.values())
+    last_day = max(max(days) for days in affected_days.values())
+    
+    # Approved and paid payrolls are frozen, retroactive adjustments cover those
+    return Payroll.objects.filter(
+        employee_id__in=list(affected_days),
+        payroll_period__start_date__lte=last_day,
+        payroll_period__end_date__gte=first_day,
+        status__in=['DRAFT', 'CALCULATED']
+    ).update(is_stale=True)
+
+
+class OvertimeReconciler:
+    """Utility class for capping punched overtime at the approved overtime requests in bulk"""
+
+    def __init__(self, date_from, date_to, employee_ids=None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.employee_ids = employee_ids
+        
+        if self.date_from > self.date_to:
+            raise ValueError("Start date cannot be after end date.")
+
+    def get_queryset(self):
+        """Get the records in range annotated with the hours approved for their day"""
+        from .models import AttendanceRecord, OvertimeRequest
+        
+        records = AttendanceRecord.objects.filter(date__range=[self.date_from, self.date_to])
+        if self.employee_ids is not None:
+            records = records.filter(employee_id__in=self.employee_ids)
+        
+        # Requests are unique per employee and day, so the subquery yields at most one row
+        approved_hours = OvertimeRequest.objects.filter(
+            employee_id=OuterRef('employee_id'), date=OuterRef('date'), status='APPROVED'
+        ).values('hours_requested')[:1]
+        
+        return records.alias(
+            approved_overtime_hours=Coalesce(
+                Subquery(approved_hours), Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=5, decimal_places=2)
+            )
+        ).alias(
+            reconciled_payable=Least('overtime_hours', 'approved_overtime_hours'),
+            reconciled_status=Case(
+                When(overtime_hours=0, approved_overtime_hours=0, then=Value('NONE')),
+                When(approved_overtime_hours=0, then=Value('UNAPPROVED')),
+                When(overtime_hours__gt=F('approved_overtime_hours'), then=Value('CAPPED')),
+                When(overtime_hours__lt=F('approved_overtime_hours'), then=Value('UNDER')),
+                default=Value('MATCHED')
+            )
+        )
+
+    def run(self):
+        """Reconcile the range with one UPDATE and refresh the rollups it changed"""
+        records = self.get_queryset()
+        changed = records.exclude(
+            payable_overtime_hours=F('reconciled_payable'),
+            overtime_status=F('reconciled_status')
+        )
+        
+        with transaction.atomic():
+            keys = set(changed.order_by().annotate(
+                year=ExtractYear('date'), month=ExtractMonth('date')
+            ).values_list('employee_id', 'year', 'month').distinct())
+            
+            updated = changed.update(
+                payable_overtime_hours=F('reconciled_payable'),
+                overtime_status=F('reconciled_status'),
+                updated_at=timezone.now()
+            )
+            if updated:
+                refresh_attendance_rollups(keys)
+                attendance_changed()
+        
+        totals = records.aggregate(
+            recorded_hours=Coalesce(Sum('overtime_hours'), Value(Decimal('0.00'))),
+            payable_hours=Coalesce(Sum('payable_overtime_hours'), Value(Decimal('0.00'))),
+            **{
+                status.lower(): Count('id', filter=Q(overtime_status=status))
+                for status in ['MATCHED', 'CAPPED', 'UNAPPROVED', 'UNDER']
+            }
+        )
+        return {'records_updated': updated, **totals}
+
+    def get_payable_changes(self):
+        """Get how much a run would change each employee's payable overtime, without writing"""
+        return dict(self.get_queryset().exclude(
+            payable_overtime_hours=F('reconciled_payable')
+        ).order_by().values('employee_id').annotate(
+            change=Sum(
+                F('reconciled_payable') - F('payable_overtime_hours'),
+                output_field=DecimalField(max_digits=8, decimal_places=2)
+            )
+        ).values_list('employee_id', 'change'))
+
+
+BULK_REVIEW_MAX_BATCH = getattr(settings, 'BULK_REVIEW_MAX_BATCH', 1000)
+
+
+def bulk_review(queryset, ids, pending, values, outcome, skipped_error):
+    """Apply an approval decision to the pending rows of a selection with one UPDATE, reporting each ID"""
+    selected = queryset.filter(pk__in=ids) if ids else queryset
+    
+    # Lock the reviewed rows only, without OF drop the joins so outer joins are not locked
+    if connections[selected.db].features.has_select_for_update_of:
+        selected = selected.select_for_update(of=('self',))
+    else:
+        selected = selected.select_related(None).select_for_update()
+    
+    with transaction.atomic():
+        rows = dict(selected.annotate(
+            is_pending=ExpressionWrapper(pending, output_field=BooleanField())
+        ).order_by('pk').values_list('pk', 'is_pending')[:BULK_REVIEW_MAX_BATCH + 1])
+        if len(rows) > BULK_REVIEW_MAX_BATCH:
+            raise ValueError(f"More than {BULK_REVIEW_MAX_BATCH} records selected, narrow the filters.")
+        
+        # Only the approval columns are written, so hours are not recalculated row by row
+        queryset.model.objects.filter(
+            pk__in=[pk for pk, is_pending in rows.items() if is_pending]
+        ).update(**values)
+    
+    results = []
+    for pk in ids or rows:
+        if pk not in rows:
+            results.append({'id': pk, 'status': 'failed', 'error': 'Not found.'})
+        elif rows[pk]:
+            results.append({'id': pk, 'status': outcome})
+        else:
+            results.append({'id': pk, 'status': 'skipped', 'error': skipped_error})
+    return results
+
+
+ATTENDANCE_AUTO_CLOSE_POLICY = getattr(settings, 'ATTENDANCE_AUTO_CLOSE_POLICY', 'SHIFT_END')
+ATTENDANCE_AUTO_CLOSE_HOURS = getattr(settings, 'ATTENDANCE_AUTO_CLOSE_HOURS', 8)
+
+
+class AttendanceSweeper:
+    """Utility class for filling missing attendance days and closing dangling check-ins"""
+    
+    CLOSE_POLICIES = ['SHIFT_END', 'FIXED_HOURS', 'NONE']
+    CLOSE_FIELDS = [
+        'time_out', 'total_hours', 'regular_hours', 'overtime_hours', 'break_duration',
+        'is_late', 'late_minutes', 'notes', 'updated_at'
+    ]
+    SWEEP_NOTE = 'Created by attendance sweep'
+
+    def __init__(self, date_from, date_to, close_policy=None, close_hours=None, batch_size=2000):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.close_policy = close_policy or ATTENDANCE_AUTO_CLOSE_POLICY
+        self.close_hours = close_hours or ATTENDANCE_AUTO_CLOSE_HOURS
+        self.batch_size = batch_size
+        
+        if self.close_policy not in self.CLOSE_POLICIES:
+            raise ValueError(f"Unknown auto-close policy: {self.close_policy}")
+        if self.date_from > self.date_to:
+            raise ValueError("Start date cannot be after end date.")
+        if self.date_to >= timezone.localdate():
+            raise ValueError("Only past days can be swept.")
+
+    def get_working_days(self):
+        """Get the weekdays in the range that are not active holidays"""
+        return get_working_days(self.date_from, self.date_to)
+
+    def get_employees(self):
+        """Get (employee_id, hire_date, termination_date) of staff employed during the range"""
+        from employees.models import Employee
+        
+        return Employee.objects.filter(
+            Q(hire_date__isnull=True) | Q(hire_date__lte=self.date_to),
+            Q(termination_date__isnull=True) | Q(termination_date__gte=self.date_from),
+            is_active=True
+        ).order_by('id').values_list('id', 'hire_date', 'termination_date')
+
+    def get_existing(self):
+        """Get the (employee_id, date) pairs of the range that already have a record"""
+        from .models import AttendanceRecord
+        
+        return set(AttendanceRecord.objects.filter(
+            date__range=[self.date_from, self.date_to]
+        ).values_list('employee_id', 'date').iterator(chunk_size=self.batch_size))
+
+    def get_leaves(self):
+        """Get the approved leave ranges overlapping the range by employee"""
+        from .models import LeaveApplication
+        
+        leaves = {}
+        for application_id, employee_id, start_date, end_date in LeaveApplication.objects.filter(
+            status='APPROVED', start_date__lte=self.date_to, end_date__gte=self.date_from
+        ).values_list('id', 'employee_id', 'start_date', 'end_date'):
+            leaves.setdefault(employee_id, []).append((start_date, end_date, application_id))
+        return leaves
+
+    def get_missing(self):
+        """Yield (employee_id, day, leave_application_id) of employed staff without a record"""
+        days = self.get_working_days()
+        existing = self.get_existing()
+        leaves = self.get_leaves()
+        
+        for employee_id, hire_date, termination_date in self.get_employees().iterator(chunk_size=self.batch_size):
+            for day in days:
+                if (hire_date and day < hire_date) or (termination_date and day > termination_date):
+                    continue
+                if (employee_id, day) in existing:
+                    continue
+                leave_application_id = next((
+                    application_id
+                    for start_date, end_date, application_id in leaves.get(employee_id, ())
+                    if start_date <= day <= end_date
+                ), None)
+                yield employee_id, day, leave_application_id
+
+    def fill_missing_days(self, affected_days):
+        """Create ABSENT or LEAVE records for every missing employee-day"""
+        from .models import AttendanceRecord
+        
+        started = timezone.now()
+        records = []
+        for employee_id, day, leave_application_id in self.get_missing():
+            records.append(AttendanceRecord(
+                employee_id=employee_id,
+                date=day,
+                status='LEAVE' if leave_application_id else 'ABSENT',
+                leave_application_id=leave_application_id,
+                notes=self.SWEEP_NOTE
+            ))
+            if len(records) >= self.batch_size:
+                # A punch landing between the select and the insert wins over the sweep
+                AttendanceRecord.objects.bulk_create(records, ignore_conflicts=True)
+                records = []
+        
+        if records:
+            AttendanceRecord.objects.bulk_create(records, ignore_conflicts=True)
+        
+        # Ignored conflicts are not reported back, count the rows this sweep actually wrote
+        counts = {'absent_created': 0, 'leave_created': 0}
+        for employee_id, day, status in AttendanceRecord.objects.filter(
+            date__range=[self.date_from, self.date_to],
+            notes=self.SWEEP_NOTE,
+            created_at__gte=started
+        ).values_list('employee_id', 'date', 'status').iterator(chunk_size=self.batch_size):
+            counts['leave_created' if status == 'LEAVE' else 'absent_created'] += 1
+            affected_days.setdefault(employee_id, set()).add(day)
+        
+        return counts
+
+    def get_close_time(self, record):
+        """Get the check-out time the policy assigns to a dangling check-in"""
+        fixed_close = record.time_in + timedelta(hours=self.close_hours)
+        if self.close_policy == 'FIXED_HOURS':
+            return fixed_close
+        
+        shift = shift_cache.get(record.shift_id)
+        if not shift:
+            return fixed_close
+        
+        shift_end = timezone.make_aware(datetime.combine(record.date, shift.end_time))
+        if shift.end_time < shift.start_time:
+            shift_end += timedelta(days=1)
+        
+        # Checked in after the shift ended, fall back to a fixed length day
+        if shift_end <= record.time_in:
+            return fixed_close
+        
+        # Overtime needs a real check-out, credit at most the shift's working hours
+        return min(shift_end, record.time_in + timedelta(hours=float(shift.working_hours)))
+
+    def close_dangling_check_ins(self, affected_days):
+        """Set a check-out on records left open and compute their hours"""
+        from .models import AttendanceRecord
+        
+        if self.close_policy == 'NONE':
+            return 0
+        
+        now = timezone.now()
+        records = AttendanceRecord.objects.filter(
+            date__range=[self.date_from, self.date_to],
+            time_in__isnull=False,
+            time_out__isnull=True
+        ).order_by('id')
+        
+        closed = []
+        for record in records.iterator(chunk_size=self.batch_size):
+            record.time_out = self.get_close_time(record)
+            record.calculate_hours()
+            record.notes = f"{record.notes}\nAuto-closed: missing check-out".strip()
+            record.updated_at = now
+            closed.append(record)
+            affected_days.setdefault(record.employee_id, set()).add(record.date)
+        
+        AttendanceRecord.objects.bulk_update(closed, self.CLOSE_FIELDS, batch_size=self.batch_size)
+        return len(closed)
+
+    def run(self):
+        """Sweep the range, refresh affected rollups and mark dependent payrolls stale"""
+        affected_days = {}
+        with transaction.atomic():
+            result = self.fill_missing_days(affected_days)
+            result['check_ins_closed'] = self.close_dangling_check_ins(affected_days)
+            
+            refresh_attendance_rollups({
+                (employee_id, day.year, day.month)
+                for employee_id, days in affected_days.items()
+                for day in days
+            })
+            result['payrolls_marked_stale'] = mark_payrolls_stale(affected_days)
+            if affected_days:
+                attendance_changed()
+        
+        return result
+
+
+ATTENDANCE_ARCHIVE_DIR = getattr(
+    settings, 'ATTENDANCE_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive', 'attendance')
+)
+
+# Columns written to archive files, FKs by ID so rows load without joins
+ARCHIVE_FIELDS = [
+    'id', 'employee_id', 'date', 'shift_id', 'time_in', 'time_out', 'break_start', 'break_end',
+    'total_hours', 'regular_hours', 'overtime_hours', 'payable_overtime_hours', 'overtime_status',
+    'break_duration', 'status', 'is_late', 'late_minutes', 'notes', 'check_in_location',
+    'check_out_location', 'ip_address', 'approved_by_id', 'approved_at', 'leave_application_id',
+    'created_at', 'updated_at'
+]
+
+
+def encode_archive_value(value):
+    """Encode the values JSON has no type for without losing precision"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot archive {type(value).__name__} values")
+
+
+ARCHIVED_YEARS_CACHE_KEY = 'attendance:archived_years'
+
+
+def get_archived_years():
+    """Get the years whose attendance records live in archive files, cached until the next archive"""
+    from .models import ArchivedAttendanceYear
+    
+    years = cache.get(ARCHIVED_YEARS_CACHE_KEY)
+    if years is None:
+        years = set(ArchivedAttendanceYear.objects.values_list('year', flat=True))
+        cache.add(ARCHIVED_YEARS_CACHE_KEY, years, None)
+    return years
+
+
+def archived_years_changed():
+    """Drop the cached archived years now and again once the current transaction commits"""
+    cache.delete(ARCHIVED_YEARS_CACHE_KEY)
+    # A worker may cache the old set while the archive is still uncommitted
+    transaction.on_commit(lambda: cache.delete(ARCHIVED_YEARS_CACHE_KEY))
+
+
+class AttendanceArchive:
+    """Utility class for moving closed years of attendance records into gzip JSON Lines files"""
+
+    def __init__(self, directory=None, batch_size=5000):
+        self.directory = directory or ATTENDANCE_ARCHIVE_DIR
+        self.batch_size = batch_size
+
+    def get_path(self, year):
+        """Get the archive file of a year"""
+        return os.path.join(self.directory, f'attendance-{year}.jsonl.gz')
+
+    def get_closed_years(self):
+        """Get past years with records whose payroll periods are all finalized"""
+        from payroll.models import PayrollPeriod
+        from .models import AttendanceRecord
+        
+        archived = get_archived_years()
+        years = set(
+            AttendanceRecord.objects.filter(date__year__lt=timezone.localdate().year)
+            .annotate(year=ExtractYear('date')).order_by().values_list('year', flat=True).distinct()
+        ) - archived
+        
+        open_years, covered_years = set(), set()
+        for start_date, end_date, is_finalized in PayrollPeriod.objects.values_list(
+            'start_date', 'end_date', 'is_finalized'
+        ):
+            period_years = range(start_date.year, end_date.year + 1)
+            (covered_years if is_finalized else open_years).update(period_years)
+        
+        return sorted(years & covered_years - open_years)
+
+    def write_year(self, year):
+        """Stream a year's records into its archive file, returning the count and checksum"""
+        from .models import AttendanceRecord
+        
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(year)
+        temporary_path = f'{path}.tmp'
+        
+        count = 0
+        records = AttendanceRecord.objects.filter(
+            date__range=[date(year, 1, 1), date(year, 12, 31)]
+        ).order_by('date', 'employee_id').values(*ARCHIVE_FIELDS)
+        with gzip.open(temporary_path, 'wt', encoding='utf-8') as archive_file:
+            for row in records.iterator(chunk_size=self.batch_size):
+                archive_file.write(json.dumps(row, default=encode_archive_value) + '\n')
+                count += 1
+        
+        digest = hashlib.sha256()
+        with open(temporary_path, 'rb') as archive_file:
+            for chunk in iter(lambda: archive_file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        
+        # Only a complete file takes the final name
+        os.replace(temporary_path, path)
+        return count, os.path.getsize(path), digest.hexdigest()
+
+    def archive_year(self, year):
+        """Archive a closed year and delete its records, keeping rollups and bitmaps"""
+        from .models import AttendanceRecord, ArchivedAttendanceYear
+        
+        if year not in self.get_closed_years():
+            raise ValueError(f"{year} is not a closed year: it has open payroll periods, no records or is archived.")
+        
+        # Rollups and bitmaps outlive the records, make sure they match them first
+        rebuild_attendance_rollups(year=year, batch_size=self.batch_size)
+        count, size_bytes, sha256 = self.write_year(year)
+        
+        with transaction.atomic():
+            archived = ArchivedAttendanceYear.objects.create(
+                year=year,
+                file_name=os.path.basename(self.get_path(year)),
+                record_count=count,
+                size_bytes=size_bytes,
+                sha256=sha256
+            )
+            archived_years_changed()
+            deleted = 0
+            for month in range(1, 13):
+                deleted += AttendanceRecord.objects.filter(
+                    date__range=month_bounds(year, month)
+                ).delete()[0]
+            
+            # A record written after the export would be lost with the delete
+            if deleted != count:
+                raise ValueError(f"{year} changed while archiving: {count} records exported, {deleted} deleted.")
+        
+        return archived
+
+    def read_year(self, year, first_day=None, last_day=None, employee_ids=None):
+        """Yield a year's archived records in a range as unsaved AttendanceRecord instances"""
+        from .models import AttendanceRecord
+        
+        fields = [AttendanceRecord._meta.get_field(name) for name in ARCHIVE_FIELDS]
+        first_day = (first_day or date(year, 1, 1)).isoformat()
+        last_day = (last_day or date(year, 12, 31)).isoformat()
+        with gzip.open(self.get_path(year), 'rt', encoding='utf-8') as archive_file:
+            for line in archive_file:
+                row = json.loads(line)
+                
+                # Files are written in date order, filter on the raw row before building a record
+                if row['date'] < first_day:
+                    continue
+                if row['date'] > last_day:
+                    break
+                if employee_ids is not None and row['employee_id'] not in employee_ids:
+                    continue
+                
+                yield AttendanceRecord(**{
+                    field.attname: field.to_python(row[field.attname]) for field in fields
+                })
+
+
+def split_archived_range(start_date, end_date):
+    """Get (first_day, last_day, is_archived) of each year a range covers"""
+    archived = get_archived_years()
+    return [
+        (max(start_date, date(year, 1, 1)), min(end_date, date(year, 12, 31)), year in archived)
+        for year in range(start_date.year, end_date.year + 1)
+    ]
+
+
+def attendance_history(start_date, end_date, employee_ids=None, batch_size=2000):
+    """Yield the records of a range ordered by date, streaming archived years from their files"""
+    from .models import AttendanceRecord
+    
+    wanted = None
+    for is_archived, spans in groupby(split_archived_range(start_date, end_date), key=lambda span: span[2]):
+        spans = list(spans)
+        if is_archived:
+            if employee_ids is not None and wanted is None:
+                wanted = set(employee_ids)
+            for first_day, last_day, _ in spans:
+                yield from AttendanceArchive().read_year(first_day.year, first_day, last_day, wanted)
+            continue
+        
+        # Consecutive live years are read with one query
+        live_records = AttendanceRecord.objects.filter(date__range=[spans[0][0], spans[-1][1]])
+        if employee_ids is not None:
+            live_records = live_records.filter(employee_id__in=employee_ids)
+        yield from live_records.order_by('date', 'employee_id').iterator(chunk_size=batch_size)
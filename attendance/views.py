@@ -1,22 +1,60 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from django_filters.rest_framework import DjangoFilterBackend
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Sum, Avg, Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import asyncio
+import io
+import json
+import logging
 from .models import (
-    Shift, AttendanceRecord, LeaveType, LeaveApplication, OvertimeRequest
+    Shift, ShiftRotation, ShiftAssignment, RosterEntry, AttendanceRecord, AttendanceEvent,
+    AttendanceBitmap, LeaveType, LeaveAccrualRule, LeaveApplication, LeaveBalance, LeaveLedgerEntry,
+    OvertimeRequest
 )
 from .serializers import (
-    ShiftSerializer, AttendanceRecordListSerializer, AttendanceRecordDetailSerializer,
+    ShiftSerializer, ShiftRotationSerializer, ShiftAssignmentSerializer, RosterEntrySerializer,
+    RosterGenerateSerializer, AttendanceRecordListSerializer, AttendanceRecordDetailSerializer,
     AttendanceRecordCreateSerializer, CheckInSerializer, CheckOutSerializer,
-    LeaveTypeSerializer, LeaveApplicationListSerializer, LeaveApplicationDetailSerializer,
-    LeaveApplicationCreateSerializer, LeaveApprovalSerializer,
+    LeaveTypeSerializer, LeaveAccrualRuleSerializer, LeaveApplicationListSerializer,
+    LeaveApplicationDetailSerializer, LeaveApplicationCreateSerializer, LeaveApprovalSerializer,
+    LeaveBulkApprovalSerializer, LeaveCalendarSerializer, LeaveBalanceSerializer,
+    LeaveLedgerEntrySerializer, LeaveAdjustmentSerializer, BulkReviewSerializer,
     OvertimeRequestListSerializer, OvertimeRequestDetailSerializer,
-    OvertimeRequestCreateSerializer, AttendanceStatsSerializer
+    OvertimeRequestCreateSerializer, AttendanceStatsSerializer, PunchSerializer,
+    PunchImportSerializer, PunchSyncSerializer, ShiftRecomputeSerializer
 )
+from .utils import (
+    PunchLogImporter, PunchSyncer, ShiftHoursRecalculator, RosterGenerator, ATTENDANCE_STATS_CACHE_TIMEOUT,
+    attendance_stats_cache_key, get_stats_cache, calculate_attendance_stats, combine_bitmaps, encode_bitmap,
+    employees_with_full_attendance, working_day_bits, roster_cache, build_leave_calendar, PresenceFeed,
+    get_leave_balances, post_leave_entry, bulk_approve_leave_applications, bulk_review,
+    defer_attendance_refresh, flush_attendance_refreshes, issue_stream_ticket, redeem_stream_ticket,
+    PRESENCE_STREAM_TICKET_TTL
+)
+from employees.models import Employee
+from employees.permissions import IsHROrManager
+
+
+# Presence stream timing, in seconds unless noted, each poll is one indexed query per process
+PRESENCE_STREAM_POLL_INTERVAL = getattr(settings, 'PRESENCE_STREAM_POLL_INTERVAL', 2)
+PRESENCE_STREAM_HEARTBEAT = 15
+PRESENCE_STREAM_MAX_SECONDS = getattr(settings, 'PRESENCE_STREAM_MAX_SECONDS', 300)
+PRESENCE_STREAM_RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
 
 
 class ShiftViewSet(viewsets.ModelViewSet):
@@ -31,12 +69,135 @@ class ShiftViewSet(viewsets.ModelViewSet):
     ordering = ['start_time']
     filterset_fields = ['shift_type', 'is_active']
     
+    def get_queryset(self):
+        """Count the employees rostered on each shift today in the same query"""
+        return super().get_queryset().annotate(
+            employee_count=Count('roster_entries', filter=Q(roster_entries__date=timezone.localdate()))
+        )
+    
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Get all active shifts"""
-        shifts = Shift.objects.filter(is_active=True)
+        shifts = self.get_queryset().filter(is_active=True)
         serializer = ShiftSerializer(shifts, many=True)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsHROrManager])
+    def recompute(self, request, pk=None):
+        """Recompute hours and lateness of this shift's records after an edit"""
+        shift = self.get_object()
+        serializer = ShiftRecomputeSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            result = ShiftHoursRecalculator(
+                shift,
+                serializer.validated_data.get('date_from'),
+                serializer.validated_data.get('date_to')
+            ).run()
+            
+            return Response({
+                'message': f"Recomputed {result['records_updated']} attendance records.",
+                **result
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ShiftRotationViewSet(viewsets.ModelViewSet):
+    """ViewSet for ShiftRotation CRUD operations"""
+    
+    queryset = ShiftRotation.objects.prefetch_related('slots')
+    serializer_class = ShiftRotationSerializer
+    permission_classes = [IsHROrManager]
+    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    search_fields = ['name', 'description']
+    ordering_fields = ['name', 'created_at']
+    ordering = ['name']
+    filterset_fields = ['is_active']
+
+
+class ShiftAssignmentViewSet(viewsets.ModelViewSet):
+    """ViewSet for ShiftAssignment CRUD operations"""
+    
+    queryset = ShiftAssignment.objects.select_related('employee', 'shift', 'rotation')
+    serializer_class = ShiftAssignmentSerializer
+    permission_classes = [IsHROrManager]
+    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    search_fields = ['employee__first_name', 'employee__last_name', 'employee__employee_id']
+    ordering_fields = ['start_date', 'end_date', 'created_at']
+    ordering = ['employee', '-start_date']
+    filterset_fields = ['employee', 'shift', 'rotation']
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class RosterEntryViewSet(viewsets.ModelViewSet):
+    """ViewSet for the roster, entries written here are manual overrides"""
+    
+    queryset = RosterEntry.objects.select_related('employee', 'shift')
+    serializer_class = RosterEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [OrderingFilter, DjangoFilterBackend]
+    ordering_fields = ['date', 'employee']
+    ordering = ['date', 'employee']
+    filterset_fields = ['employee', 'shift', 'date']
+    
+    def get_permissions(self):
+        """Everyone reads their roster, only HR and managers change it"""
+        if self.action in ['list', 'retrieve']:
+            return super().get_permissions()
+        return [IsHROrManager()]
+    
+    def get_queryset(self):
+        """Filter queryset based on user permissions and query parameters"""
+        queryset = super().get_queryset()
+        
+        date_from = self.request.query_params.get('date_from')
+        date_to = self.request.query_params.get('date_to')
+        
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        
+        # Non-admin users can only see their own roster
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(employee=self.request.user)
+        
+        return queryset
+    
+    def perform_create(self, serializer):
+        serializer.save()
+        transaction.on_commit(roster_cache.clear)
+    
+    def perform_update(self, serializer):
+        # Edited entries become manual overrides that regeneration keeps
+        serializer.save(assignment=None)
+        transaction.on_commit(roster_cache.clear)
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        transaction.on_commit(roster_cache.clear)
+    
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Expand shift assignments into the roster of a month"""
+        serializer = RosterGenerateSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            result = RosterGenerator(
+                serializer.validated_data['year'],
+                serializer.validated_data['month'],
+                serializer.validated_data.get('employee_ids')
+            ).run()
+            
+            return Response({
+                'message': f"Generated {result['entries_generated']} roster entries.",
+                **result
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class AttendanceRecordViewSet(viewsets.ModelViewSet):
@@ -87,30 +248,58 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             today = timezone.now().date()
             now = timezone.now()
             
-            # Get or create attendance record
-            attendance, created = AttendanceRecord.objects.get_or_create(
+            # Resolve the rostered shift from the in-process roster, lateness follows from it
+            attendance = AttendanceRecord(
                 employee=request.user,
                 date=today,
-                defaults={
-                    'time_in': now,
-                    'status': 'PRESENT',
-                    'check_in_location': serializer.validated_data.get('location', ''),
-                    'notes': serializer.validated_data.get('notes', ''),
-                    'ip_address': self.get_client_ip(request)
-                }
+                shift_id=roster_cache.get_shift_id(request.user.id, today),
+                time_in=now
             )
+            attendance.calculate_lateness()
+            punch = {
+                'shift_id': attendance.shift_id,
+                'time_in': now,
+                'is_late': attendance.is_late,
+                'late_minutes': attendance.late_minutes,
+                'check_in_location': serializer.validated_data.get('location', ''),
+                'notes': serializer.validated_data.get('notes', ''),
+                'ip_address': self.get_client_ip(request)
+            }
             
-            if not created:
-                attendance.time_in = now
-                attendance.check_in_location = serializer.validated_data.get('location', '')
-                attendance.notes = serializer.validated_data.get('notes', '')
-                attendance.ip_address = self.get_client_ip(request)
-                attendance.save()
+            # Insert first, the unique (employee, date) constraint rejects duplicate punches
+            try:
+                with transaction.atomic():
+                    attendance = AttendanceRecord(
+                        employee=request.user,
+                        date=today,
+                        status='PRESENT',
+                        **punch
+                    )
+                    attendance.save(force_insert=True, defer_rollups=True)
+                attendance_id = attendance.id
+            except IntegrityError:
+                # A record without a check-in already exists for today
+                attendance_id = AttendanceRecord.objects.filter(
+                    employee=request.user, date=today, time_in__isnull=True
+                ).values_list('id', flat=True).first()
+                
+                if attendance_id is None:
+                    return Response(
+                        {'non_field_errors': ['You have already checked in today.']},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                with transaction.atomic():
+                    AttendanceRecord.objects.filter(
+                        id=attendance_id, time_in__isnull=True
+                    ).update(updated_at=now, **punch)
+                    # Lateness feeds the rollup and bitmap, which update() bypasses
+                    defer_attendance_refresh({(request.user.id, today.year, today.month)})
             
             return Response({
                 'message': 'Checked in successfully.',
-                'time_in': attendance.time_in,
-                'attendance_id': attendance.id
+                'time_in': now,
+                'attendance_id': attendance_id
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -126,24 +315,107 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
             
             try:
                 attendance = AttendanceRecord.objects.get(employee=request.user, date=today)
-                attendance.time_out = now
-                attendance.check_out_location = serializer.validated_data.get('location', '')
-                if serializer.validated_data.get('notes'):
-                    attendance.notes += f" | Check-out: {serializer.validated_data['notes']}"
-                attendance.save()
-                
-                return Response({
-                    'message': 'Checked out successfully.',
-                    'time_out': attendance.time_out,
-                    'total_hours': attendance.total_hours,
-                    'overtime_hours': attendance.overtime_hours
-                })
-            
             except AttendanceRecord.DoesNotExist:
                 return Response(
                     {'error': 'No check-in record found for today.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            
+            if not attendance.time_in:
+                return Response(
+                    {'non_field_errors': ['You must check in before checking out.']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if attendance.time_out:
+                return Response(
+                    {'non_field_errors': ['You have already checked out today.']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            attendance.time_out = now
+            attendance.check_out_location = serializer.validated_data.get('location', '')
+            if serializer.validated_data.get('notes'):
+                attendance.notes += f" | Check-out: {serializer.validated_data['notes']}"
+            
+            # Only write the punch and the fields calculate_hours derives from it
+            attendance.save(update_fields=[
+                'time_out', 'check_out_location', 'notes', 'total_hours',
+                'regular_hours', 'overtime_hours', 'break_duration', 'is_late',
+                'late_minutes', 'updated_at'
+            ], defer_rollups=True)
+            
+            return Response({
+                'message': 'Checked out successfully.',
+                'time_out': attendance.time_out,
+                'total_hours': attendance.total_hours,
+                'overtime_hours': attendance.overtime_hours
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def punch(self, request):
+        """Append a raw punch event, folded into the day's record by compaction"""
+        serializer = PunchSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            event = AttendanceEvent.objects.create(
+                employee=request.user,
+                event_type=serializer.validated_data['event_type'],
+                location=serializer.validated_data.get('location', ''),
+                ip_address=self.get_client_ip(request)
+            )
+            
+            return Response({
+                'message': 'Punch recorded successfully.',
+                'event_id': event.id,
+                'event_type': event.event_type,
+                'timestamp': event.timestamp
+            }, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager], url_path='sync')
+    def sync_punches(self, request):
+        """Apply a batch of punches replayed by an offline kiosk, once per client key"""
+        serializer = PunchSyncSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            result = PunchSyncer(self.get_client_ip(request)).run(serializer.validated_data['punches'])
+            
+            return Response({
+                'message': f"Applied {result['applied']} of {result['received']} punches.",
+                **result
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def import_punches(self, request):
+        """Import a door-access punch log export"""
+        serializer = PunchImportSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            importer = PunchLogImporter(
+                serializer.validated_data['file_format'],
+                serializer.validated_data['batch_size']
+            )
+            
+            # Read the upload line by line so memory stays flat for large exports
+            lines = io.TextIOWrapper(serializer.validated_data['file'], encoding='utf-8-sig')
+            
+            try:
+                result = importer.run(lines)
+            except (ValueError, UnicodeDecodeError) as e:
+                return Response(
+                    {'error': f'Invalid punch log: {str(e)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            return Response({
+                'message': f"Imported {result['rows']} punches into {result['records_upserted']} attendance records.",
+                **result
+            })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -187,6 +459,29 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'Attendance record approved successfully.'})
     
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def bulk_approve(self, request):
+        """Approve many attendance records selected by ID or by filters"""
+        serializer = BulkReviewSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            now = timezone.now()
+            try:
+                results = bulk_review(
+                    serializer.filter_queryset(self.get_queryset()),
+                    serializer.validated_data.get('ids'),
+                    Q(approved_at__isnull=True),
+                    {'approved_by': request.user, 'approved_at': now, 'updated_at': now},
+                    'approved',
+                    'Attendance record is already approved.'
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response(bulk_review_response(results, 'approved', 'attendance records'))
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get attendance statistics"""
@@ -208,63 +503,127 @@ class AttendanceRecordViewSet(viewsets.ModelViewSet):
         if date_to:
             queryset = queryset.filter(date__lte=date_to)
         
-        # Calculate statistics
-        total_records = queryset.count()
-        present_days = queryset.filter(status='PRESENT').count()
-        absent_days = queryset.filter(status='ABSENT').count()
-        late_days = queryset.filter(is_late=True).count()
-        leave_days = queryset.filter(status='LEAVE').count()
-        
-        # Calculate rates
-        attendance_rate = (present_days / total_records * 100) if total_records > 0 else 0
-        punctuality_rate = ((present_days - late_days) / present_days * 100) if present_days > 0 else 0
-        
-        # Calculate hours
-        hours_data = queryset.aggregate(
-            total_hours=Sum('total_hours') or 0,
-            regular_hours=Sum('regular_hours') or 0,
-            overtime_hours=Sum('overtime_hours') or 0,
-            avg_daily_hours=Avg('total_hours') or 0
-        )
-        
-        # Monthly breakdown
-        monthly_breakdown = list(
-            queryset.extra(
-                select={'month': "strftime('%%Y-%%m', date)"}
-            ).values('month').annotate(
-                total_days=Count('id'),
-                present_days=Count('id', filter=Q(status='PRESENT')),
-                total_hours=Sum('total_hours'),
-                overtime_hours=Sum('overtime_hours')
-            ).order_by('month')
-        )
-        
-        # Status breakdown
-        status_breakdown = list(
-            queryset.values('status').annotate(
-                count=Count('id')
-            ).order_by('-count')
-        )
+        # Serve from cache until the next attendance write bumps the version
+        flush_attendance_refreshes()
+        scope = 'all' if request.user.is_staff else f'user-{request.user.id}'
+        cache_key = attendance_stats_cache_key(scope, employee_id, date_from, date_to)
+        cached = get_stats_cache().get(cache_key)
+        if cached is not None:
+            return Response(cached)
         
-        stats_data = {
-            'total_records': total_records,
-            'present_days': present_days,
-            'absent_days': absent_days,
-            'late_days': late_days,
-            'leave_days': leave_days,
-            'attendance_rate': round(attendance_rate, 2),
-            'punctuality_rate': round(punctuality_rate, 2),
-            'total_hours': hours_data['total_hours'],
-            'regular_hours': hours_data['regular_hours'],
-            'overtime_hours': hours_data['overtime_hours'],
-            'average_daily_hours': round(hours_data['avg_daily_hours'], 2),
-            'monthly_breakdown': monthly_breakdown,
-            'status_breakdown': status_breakdown,
-        }
+        stats_data = calculate_attendance_stats(queryset)
         
         serializer = AttendanceStatsSerializer(stats_data)
+        get_stats_cache().set(cache_key, serializer.data, ATTENDANCE_STATS_CACHE_TIMEOUT)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], permission_classes=[IsHROrManager])
+    def presence(self, request):
+        """Get who is checked in now, with the cursor a presence stream can resume from"""
+        department = request.query_params.get('department')
+        
+        try:
+            department = int(department) if department else None
+        except ValueError:
+            return Response(
+                {'error': 'department must be a number.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        feed = PresenceFeed(department)
+        feed.load()
+        return Response(feed.snapshot())
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def presence_ticket(self, request):
+        """Issue a short-lived, single-use ticket for opening a presence stream"""
+        return Response({
+            'ticket': issue_stream_ticket(request.user),
+            'expires_in': PRESENCE_STREAM_TICKET_TTL,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """Get a year of attendance bitmaps in base64 for calendar views"""
+        try:
+            year = int(request.query_params.get('year', timezone.now().year))
+        except ValueError:
+            return Response(
+                {'error': 'year must be a number.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        flush_attendance_refreshes()
+        bitmaps = AttendanceBitmap.objects.filter(year=year).select_related('employee')
+        
+        # Non-admin users can only see their own calendar
+        if not request.user.is_staff:
+            bitmaps = bitmaps.filter(employee=request.user)
+        else:
+            employee_ids = request.query_params.get('employee_ids')
+            department = request.query_params.get('department')
+            if employee_ids:
+                bitmaps = bitmaps.filter(employee_id__in=[pk for pk in employee_ids.split(',') if pk.strip()])
+            if department:
+                bitmaps = bitmaps.filter(employee__department_id=department)
+        
+        bitmaps = list(bitmaps.order_by('employee__employee_id'))
+        
+        employees = []
+        for bitmap in bitmaps:
+            entry = {
+                'employee': bitmap.employee_id,
+                'employee_code': bitmap.employee.employee_id,
+                'employee_name': bitmap.employee.get_full_name(),
+            }
+            for kind in AttendanceBitmap.KINDS:
+                bits = bitmap.get_bits(kind)
+                entry[kind] = encode_bitmap(bits)
+                entry[f'{kind}_days'] = bits.bit_count()
+            employees.append(entry)
+        
+        return Response({
+            'year': year,
+            'days_in_year': date(year, 12, 31).timetuple().tm_yday,
+            'encoding': 'base64, little-endian, bit i is day i + 1 of the year',
+            'employees': employees,
+            'all_present': encode_bitmap(combine_bitmaps(bitmaps, 'present', 'and')),
+            'any_present': encode_bitmap(combine_bitmaps(bitmaps, 'present', 'or')),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def full_attendance(self, request):
+        """Get employees present on every working day of a date range"""
+        try:
+            date_from = datetime.strptime(request.query_params['date_from'], '%Y-%m-%d').date()
+            date_to = datetime.strptime(request.query_params['date_to'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'date_from and date_to are required in YYYY-MM-DD format.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if date_from > date_to or date_from.year != date_to.year:
+            return Response(
+                {'error': 'date_from and date_to must be an ordered range within one year.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        employee_ids = None if request.user.is_staff else [request.user.id]
+        matching = employees_with_full_attendance(date_from, date_to, employee_ids)
+        employees = Employee.objects.filter(id__in=matching).order_by('employee_id')
+        
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'working_days': working_day_bits(date_from, date_to).bit_count(),
+            'count': len(matching),
+            'employees': [
+                {'employee': employee.id, 'employee_code': employee.employee_id, 'employee_name': employee.get_full_name()}
+                for employee in employees
+            ],
+        })
+    
     def get_client_ip(self, request):
         """Get client IP address"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -295,6 +654,18 @@ class LeaveTypeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+class LeaveAccrualRuleViewSet(viewsets.ModelViewSet):
+    """ViewSet for LeaveAccrualRule CRUD operations"""
+    
+    queryset = LeaveAccrualRule.objects.select_related('leave_type')
+    serializer_class = LeaveAccrualRuleSerializer
+    permission_classes = [IsHROrManager]
+    filter_backends = [OrderingFilter, DjangoFilterBackend]
+    ordering_fields = ['leave_type__name', 'employment_type', 'days_per_month']
+    ordering = ['leave_type__name', 'employment_type']
+    filterset_fields = ['leave_type', 'employment_type', 'is_active']
+
+
 class LeaveApplicationViewSet(viewsets.ModelViewSet):
     """ViewSet for LeaveApplication CRUD operations"""
     
@@ -363,43 +734,170 @@ class LeaveApplicationViewSet(viewsets.ModelViewSet):
             action = serializer.validated_data['action']
             reason = serializer.validated_data.get('reason', '')
             
-            if action == 'approve':
-                application.approve(request.user)
-                message = 'Leave application approved successfully.'
-            else:
-                application.reject(request.user, reason)
-                message = 'Leave application rejected successfully.'
+            try:
+                if action == 'approve':
+                    application.approve(request.user)
+                    message = 'Leave application approved successfully.'
+                else:
+                    application.reject(request.user, reason)
+                    message = 'Leave application rejected successfully.'
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
             return Response({'message': message})
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def bulk_approve(self, request):
+        """Approve many leave applications in one transaction"""
+        serializer = LeaveBulkApprovalSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            results = bulk_approve_leave_applications(serializer.validated_data['ids'], request.user)
+            approved = sum(1 for result in results if result['status'] == 'approved')
+            
+            return Response({
+                'message': f"Approved {approved} of {len(results)} leave applications.",
+                'approved': approved,
+                'failed': len(results) - approved,
+                'results': results
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a leave application"""
+        application = self.get_object()
+        
+        try:
+            application.cancel(request.user)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({'message': 'Leave application cancelled successfully.'})
+    
+    @action(detail=False, methods=['get'])
+    def team_calendar(self, request):
+        """Get who is on leave across a department for a quarter or date range"""
+        serializer = LeaveCalendarSerializer(data=request.query_params)
+        
+        if serializer.is_valid():
+            department = serializer.validated_data.get('department')
+            
+            # Non-admin users can only see their own department's calendar
+            if not request.user.is_staff:
+                if department is not None and department != request.user.department_id:
+                    return Response(
+                        {'error': 'You can only view your own department\'s leave calendar.'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+                department = request.user.department_id
+                if department is None:
+                    return Response(
+                        {'error': 'You are not assigned to a department.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            
+            return Response(build_leave_calendar(
+                serializer.validated_data['date_from'],
+                serializer.validated_data['date_to'],
+                department,
+                serializer.validated_data.get('status')
+            ))
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def balance(self, request):
         """Get leave balance for current user"""
         user = request.user
         
-        # Calculate used leave days for current year
+        # Read the maintained ledger balances, the linked counters are kept in step
         current_year = timezone.now().year
-        used_leaves = LeaveApplication.objects.filter(
-            employee=user,
-            status='APPROVED',
-            start_date__year=current_year
-        ).aggregate(
-            total_days=Sum('total_days')
-        )['total_days'] or 0
+        balances = get_leave_balances(user, current_year)
+        used_leaves = sum((balance.used for balance in balances), Decimal('0.00'))
         
         balance = {
             'annual_leave_balance': user.annual_leave_balance,
             'sick_leave_balance': user.sick_leave_balance,
             'casual_leave_balance': user.casual_leave_balance,
             'used_leaves_this_year': used_leaves,
-            'remaining_annual_leave': max(0, user.annual_leave_balance - used_leaves)
+            'remaining_annual_leave': max(0, user.annual_leave_balance),
+            'year': current_year,
+            'balances': LeaveBalanceSerializer(balances, many=True).data
         }
         
         return Response(balance)
 
 
+class LeaveBalanceViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for reading leave balances and their ledger"""
+    
+    queryset = LeaveBalance.objects.select_related('employee', 'leave_type').all()
+    serializer_class = LeaveBalanceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [OrderingFilter, DjangoFilterBackend]
+    ordering_fields = ['year', 'balance']
+    ordering = ['-year', 'leave_type__name']
+    filterset_fields = ['employee', 'leave_type', 'year']
+    
+    def get_queryset(self):
+        """Filter queryset based on user permissions"""
+        queryset = super().get_queryset()
+        
+        # Non-admin users can only see their own balances
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(employee=self.request.user)
+        
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def ledger(self, request):
+        """Get leave ledger entries, newest first"""
+        entries = LeaveLedgerEntry.objects.select_related('leave_type', 'created_by')
+        
+        if request.user.is_staff:
+            if request.query_params.get('employee'):
+                entries = entries.filter(employee_id=request.query_params['employee'])
+        else:
+            entries = entries.filter(employee=request.user)
+        
+        for field in ['leave_type', 'year', 'entry_type']:
+            if request.query_params.get(field):
+                entries = entries.filter(**{field: request.query_params[field]})
+        
+        page = self.paginate_queryset(entries)
+        if page is not None:
+            serializer = LeaveLedgerEntrySerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = LeaveLedgerEntrySerializer(entries, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def adjust(self, request):
+        """Adjust an employee's leave balance with a ledger entry"""
+        serializer = LeaveAdjustmentSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            data = serializer.validated_data
+            entry = post_leave_entry(
+                data['employee'],
+                data['leave_type'],
+                data.get('year') or timezone.now().year,
+                'ADJUSTMENT',
+                data['days'],
+                created_by=request.user,
+                description=data['description']
+            )
+            
+            return Response(LeaveLedgerEntrySerializer(entry).data, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class OvertimeRequestViewSet(viewsets.ModelViewSet):
     """ViewSet for OvertimeRequest CRUD operations"""
     
@@ -482,4 +980,213 @@ class OvertimeRequestViewSet(viewsets.ModelViewSet):
         overtime_request.save()
         
         return Response({'message': 'Overtime request rejected successfully.'})
+    
+    def review_in_bulk(self, request, values, outcome):
+        """Apply an approval decision to many pending overtime requests"""
+        serializer = BulkReviewSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            now = timezone.now()
+            try:
+                results = bulk_review(
+                    serializer.filter_queryset(self.get_queryset()),
+                    serializer.validated_data.get('ids'),
+                    Q(status='PENDING'),
+                    {'approved_by': request.user, 'approved_at': now, **values(serializer.validated_data)},
+                    outcome,
+                    'Only pending overtime requests can be reviewed.'
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response(bulk_review_response(results, outcome, 'overtime requests'))
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def bulk_approve(self, request):
+        """Approve many pending overtime requests selected by ID or by filters"""
+        return self.review_in_bulk(request, lambda data: {'status': 'APPROVED'}, 'approved')
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsHROrManager])
+    def bulk_reject(self, request):
+        """Reject many pending overtime requests selected by ID or by filters"""
+        return self.review_in_bulk(
+            request,
+            lambda data: {'status': 'REJECTED', 'rejection_reason': data.get('reason', '')},
+            'rejected'
+        )
+
+
+def bulk_review_response(results, outcome, noun):
+    """Build the response of a bulk approval from its per-ID outcomes"""
+    counts = {outcome: 0, 'skipped': 0, 'failed': 0}
+    for result in results:
+        counts[result['status']] += 1
+    
+    return {
+        'message': f"{outcome.capitalize()} {counts[outcome]} of {len(results)} {noun}.",
+        **counts,
+        'results': results
+    }
+
 
+def authenticate_stream_request(request):
+    """Get the user of a stream request from its bearer header or stream ticket"""
+    # EventSource cannot send headers, browsers pass a single-use ticket instead of the token
+    if request.GET.get('ticket'):
+        user_id = redeem_stream_ticket(request.GET['ticket'])
+        request.user = Employee.objects.filter(id=user_id, is_active=True).first() if user_id else None
+        return request.user
+    
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    
+    try:
+        request.user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    
+    return request.user
+
+
+def format_stream_event(event, data, cursor):
+    """Get a Server-Sent Events message"""
+    return f"id: {cursor}\nevent: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class PresenceHub:
+    """One presence poller per process fanning its changes out to every open stream
+    
+    Streams subscribe with their department and read events from a queue, so the
+    database sees one poll per interval however many dashboards are open.
+    """
+
+    def __init__(self, interval=PRESENCE_STREAM_POLL_INTERVAL):
+        self.interval = interval
+        self.feed = PresenceFeed()
+        self.subscribers = {}
+        self.loop = None
+        self.lock = None
+        self.task = None
+
+    def bind(self):
+        """Start over when used from another event loop than the last one"""
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.lock = asyncio.Lock()
+            self.task = None
+            self.subscribers = {}
+
+    async def subscribe(self, department_id=None, since=None):
+        """Get a queue of (event, data, cursor), starting with a snapshot or the changes after a cursor"""
+        self.bind()
+        queue = asyncio.Queue()
+        
+        async with self.lock:
+            if self.task is None or self.task.done():
+                await sync_to_async(self.feed.load)()
+                self.task = asyncio.create_task(self.run())
+            
+            cursor = self.feed.encode_cursor(self.feed.cursor)
+            if since is None or since.date() != self.feed.date:
+                queue.put_nowait(('snapshot', self.feed.snapshot(department_id), cursor))
+            else:
+                # Read under the lock so no poll lands between the replay and the subscription
+                feed = PresenceFeed(department_id, self.feed.lag)
+                feed.date = self.feed.date
+                for event, entry in await sync_to_async(feed.replay)(since):
+                    queue.put_nowait((event, entry, cursor))
+            
+            self.subscribers[queue] = department_id
+        
+        return queue
+
+    def unsubscribe(self, queue):
+        """Stop publishing to a queue, the poller stops with its last subscriber"""
+        self.subscribers.pop(queue, None)
+
+    def publish(self, changes):
+        """Put the changes of a poll, or a fresh snapshot, on every matching queue"""
+        cursor = self.feed.encode_cursor(self.feed.cursor)
+        for queue, department_id in self.subscribers.items():
+            if changes is None:
+                queue.put_nowait(('snapshot', self.feed.snapshot(department_id), cursor))
+                continue
+            
+            for event, entry in changes:
+                if department_id is None or entry['department'] == department_id:
+                    queue.put_nowait((event, entry, cursor))
+
+    async def run(self):
+        """Poll while anyone is subscribed"""
+        while True:
+            await asyncio.sleep(self.interval)
+            
+            async with self.lock:
+                if not self.subscribers:
+                    self.task = None
+                    return
+                
+                try:
+                    changes = await sync_to_async(self.feed.poll)()
+                    
+                    # A new day starts from a fresh snapshot
+                    if changes is None:
+                        await sync_to_async(self.feed.load)()
+                except Exception:
+                    # Keep the streams open, the next poll re-reads the lag window
+                    logger.exception('Presence poll failed')
+                    continue
+                
+                self.publish(changes)
+
+
+presence_hub = PresenceHub()
+
+
+async def presence_stream(request):
+    """Stream presence changes as Server-Sent Events, routed only by the ASGI application"""
+    user = await sync_to_async(authenticate_stream_request)(request)
+    if user is None:
+        return JsonResponse({'error': 'A valid stream ticket or access token is required.'}, status=401)
+    if not await sync_to_async(IsHROrManager().has_permission)(request, None):
+        return JsonResponse({'error': 'Only HR and managers can follow presence.'}, status=403)
+    
+    try:
+        department = int(request.GET['department']) if request.GET.get('department') else None
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        since = PresenceFeed.decode_cursor(last_event_id) if last_event_id else None
+    except (ValueError, OverflowError, OSError):
+        return JsonResponse({'error': 'department and last_event_id must be numbers.'}, status=400)
+    
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PRESENCE_STREAM_MAX_SECONDS
+        
+        yield f"retry: {PRESENCE_STREAM_RETRY_MS}\n\n"
+        
+        queue = await presence_hub.subscribe(department, since)
+        try:
+            # Close after a while so clients reconnect with a fresh ticket and their last event ID
+            while loop.time() < deadline:
+                try:
+                    event, data, cursor = await asyncio.wait_for(
+                        queue.get(), min(PRESENCE_STREAM_HEARTBEAT, deadline - loop.time())
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                yield format_stream_event(event, data, cursor)
+        finally:
+            presence_hub.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -183,7 +183,8 @@ class Command(BaseCommand):
                 'max_days_per_year': 21,
                 'is_paid': True,
                 'requires_approval': True,
-                'advance_notice_days': 7
+                'advance_notice_days': 7,
+                'employee_balance_field': 'annual_leave_balance'
             },
             {
                 'name': 'Sick Leave',
@@ -191,7 +192,8 @@ class Command(BaseCommand):
                 'max_days_per_year': 10,
                 'is_paid': True,
                 'requires_approval': False,
-                'advance_notice_days': 0
+                'advance_notice_days': 0,
+                'employee_balance_field': 'sick_leave_balance'
             },
             {
                 'name': 'Casual Leave',
@@ -199,7 +201,8 @@ class Command(BaseCommand):
                 'max_days_per_year': 5,
                 'is_paid': True,
                 'requires_approval': True,
-                'advance_notice_days': 1
+                'advance_notice_days': 1,
+                'employee_balance_field': 'casual_leave_balance'
             },
             {
                 'name': 'Maternity Leave',
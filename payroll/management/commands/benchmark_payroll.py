@@ -0,0 +1,218 @@
+import io
+import json
+import time
+import tracemalloc
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+from employees.models import Employee
+from payroll.models import Payroll, PayrollPeriod
+from payroll.utils import QueryCounter, PayrollAnomalyDetector
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the payroll hot paths against synthetic organizations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='1000,10000,50000',
+            help='Comma separated organization sizes (default: 1000,10000,50000)',
+        )
+        parser.add_argument(
+            '--attendance-months',
+            type=int,
+            default=1,
+            help='Months of attendance generated per organization (default: 1)',
+        )
+        parser.add_argument(
+            '--salary-sample',
+            type=int,
+            default=100,
+            help='Number of individual calculate_salary calls to time (default: 100)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the JSON results to this file',
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            help='Compare against a previous JSON result and fail on regressions',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed relative regression against the baseline (default: 0.2)',
+        )
+        parser.add_argument(
+            '--keep-data',
+            action='store_true',
+            help='Keep the generated data instead of rolling it back',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        year = timezone.now().year - 1
+        
+        results = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'year': year,
+            'results': {},
+        }
+        
+        for size in sizes:
+            self.stdout.write(f'Benchmarking {size} employees...')
+            results['results'][str(size)] = self.run_size(size, year, options)
+        
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+            self.stdout.write(f'Results written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+        
+        if options['baseline']:
+            self.compare_baseline(results, options['baseline'], options['tolerance'])
+
+    def run_size(self, size, year, options):
+        """Generate an organization of the given size and time every hot path"""
+        prefix = f'BM{size}'
+        size_results = {}
+        
+        with transaction.atomic():
+            call_command(
+                'generate_synthetic_org',
+                employees=size,
+                year=year,
+                months=options['attendance_months'],
+                prefix=prefix,
+                stdout=io.StringIO(),
+            )
+            
+            admin = Employee.objects.create(
+                username=f'{prefix.lower()}_admin',
+                employee_id=f'{prefix}ADMIN',
+                is_staff=True,
+                is_superuser=True,
+                is_active=False,
+            )
+            client = APIClient()
+            client.force_authenticate(admin)
+            
+            period = PayrollPeriod.objects.get(
+                start_date__year=year, start_date__month=1, period_type='MONTHLY'
+            )
+            employee_ids = list(
+                Employee.objects.filter(employee_id__startswith=prefix, is_active=True)
+                .exclude(id=admin.id).values_list('id', flat=True)
+            )
+            
+            sample = Employee.objects.filter(id__in=employee_ids[:options['salary_sample']])
+            size_results['calculate_salary'] = self.measure(
+                lambda: [
+                    Payroll(employee=employee, payroll_period=period).calculate_salary()
+                    for employee in sample.all()
+                ],
+                items=len(employee_ids[:options['salary_sample']])
+            )
+            
+            size_results['calculate_bulk'] = self.measure(
+                lambda: self.post(client, '/api/payroll/payrolls/calculate_bulk/', {
+                    'payroll_period_id': period.id,
+                    'employee_ids': employee_ids,
+                    'recalculate': True,
+                }),
+                items=len(employee_ids)
+            )
+            
+            size_results['detect_anomalies'] = self.measure(
+                lambda: PayrollAnomalyDetector(period).detect(),
+                items=len(employee_ids)
+            )
+            
+            payroll_ids = list(
+                Payroll.objects.filter(payroll_period=period, employee_id__in=employee_ids)
+                .values_list('id', flat=True)
+            )
+            size_results['approve_bulk'] = self.measure(
+                lambda: self.post(client, '/api/payroll/payrolls/approve_bulk/', {
+                    'payroll_ids': payroll_ids,
+                }),
+                items=len(payroll_ids)
+            )
+            
+            payrolls = Payroll.objects.filter(id__in=payroll_ids).select_related('payroll_period')
+            size_results['generate_payslip'] = self.measure(
+                lambda: [payroll.generate_payslip(admin) for payroll in payrolls.all()],
+                items=len(payroll_ids)
+            )
+            
+            if not options['keep_data']:
+                transaction.set_rollback(True)
+        
+        return size_results
+
+    def post(self, client, url, data):
+        """Post to an API endpoint and fail loudly on errors"""
+        response = client.post(url, data, format='json')
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}: {response.data}')
+        return response
+
+    def measure(self, func, items):
+        """Measure wall time, query count and peak memory of a callable
+        
+        Tracing allocations slows the callable down, so peak memory comes from a
+        separate pass that is rolled back before the timed pass runs.
+        """
+        tracemalloc.start()
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            func()
+            wall_time = time.perf_counter() - started
+        
+        return {
+            'items': items,
+            'wall_time': round(wall_time, 4),
+            'queries': counter.count,
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    def compare_baseline(self, results, baseline_path, tolerance):
+        """Fail when wall time or query count regressed beyond the tolerance"""
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        
+        regressions = []
+        for size, benchmarks in results['results'].items():
+            for name, current in benchmarks.items():
+                previous = baseline.get('results', {}).get(size, {}).get(name)
+                if not previous:
+                    continue
+                
+                for metric in ['wall_time', 'queries']:
+                    if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                        regressions.append(
+                            f'{name} @ {size}: {metric} {previous[metric]} -> {current[metric]}'
+                        )
+        
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(f'  Regression: {regression}')
+            raise CommandError(f'{len(regressions)} benchmark regressions found.')
+        
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
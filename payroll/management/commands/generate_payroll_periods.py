@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.models import PayrollPeriod
+from payroll.utils import PayrollCalendarGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate all payroll periods of a year in a single bulk insert'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'year',
+            type=int,
+            help='Calendar year to generate periods for',
+        )
+        parser.add_argument(
+            '--period-type',
+            type=str,
+            default='MONTHLY',
+            choices=[choice for choice, _ in PayrollPeriod.PERIOD_TYPES],
+            help='Type of payroll period (default: MONTHLY)',
+        )
+        parser.add_argument(
+            '--pay-date-offset',
+            type=int,
+            default=0,
+            help='Days after the period end date on which salaries are paid (default: 0)',
+        )
+        parser.add_argument(
+            '--week-start',
+            type=int,
+            default=None,
+            choices=range(7),
+            help='Weekday weekly and bi-weekly periods start on, Monday = 0 (default: PAYROLL_WEEK_START)',
+        )
+        parser.add_argument(
+            '--skip-existing',
+            action='store_true',
+            help='Skip periods that already exist instead of failing',
+        )
+
+    def handle(self, *args, **options):
+        generator = PayrollCalendarGenerator(
+            options['year'],
+            options['period_type'],
+            options['pay_date_offset'],
+            options['week_start']
+        )
+        
+        try:
+            created, skipped = generator.generate(skip_existing=options['skip_existing'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        for period in skipped:
+            self.stdout.write(f'  Period already exists: {period.name}')
+        
+        for period in created:
+            self.stdout.write(
+                f'  Created period: {period.name} '
+                f'({period.start_date} - {period.end_date}, {period.working_days} working days)'
+            )
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated {len(created)} payroll periods.')
+        )
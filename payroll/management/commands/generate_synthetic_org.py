@@ -0,0 +1,253 @@
+import calendar
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from employees.models import Employee, Department, Role
+from attendance.models import AttendanceRecord, LeaveType, LeaveApplication
+from attendance.utils import rebuild_attendance_rollups
+from payroll.models import TaxSlab, DeductionType
+from payroll.utils import PayrollCalendarGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic organization with a year of attendance using bulk inserts'
+    
+    BATCH_SIZE = 5000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employees',
+            type=int,
+            default=1000,
+            help='Number of employees to generate (default: 1000)',
+        )
+        parser.add_argument(
+            '--departments',
+            type=int,
+            default=10,
+            help='Number of departments to generate (default: 10)',
+        )
+        parser.add_argument(
+            '--roles-per-department',
+            type=int,
+            default=5,
+            help='Number of roles per department (default: 5)',
+        )
+        parser.add_argument(
+            '--year',
+            type=int,
+            default=timezone.now().year - 1,
+            help='Year of attendance to generate (default: last year)',
+        )
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=12,
+            help='Number of months of attendance from January (default: 12)',
+        )
+        parser.add_argument(
+            '--prefix',
+            type=str,
+            default='SYN',
+            help='Prefix for generated employee IDs and names (default: SYN)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for reproducible data (default: 42)',
+        )
+
+    def handle(self, *args, **options):
+        if options['employees'] < 1 or not 1 <= options['months'] <= 12:
+            raise CommandError('Employees must be positive and months between 1 and 12.')
+        
+        summary = self.generate(**options)
+        
+        for key, value in summary.items():
+            self.stdout.write(f'  {key}: {value}')
+        
+        self.stdout.write(self.style.SUCCESS('Synthetic organization generated successfully!'))
+
+    def generate(self, employees, departments, roles_per_department, year, months,
+                 prefix, seed, **kwargs):
+        """Generate the organization and return a summary of created rows"""
+        self.random = random.Random(seed)
+        self.year = year
+        _, last_day = calendar.monthrange(year, months)
+        self.end_date = date(year, months, last_day)
+        
+        with transaction.atomic():
+            created_roles = self.create_departments_and_roles(
+                prefix, departments, roles_per_department
+            )
+            created_employees = self.create_employees(prefix, employees, created_roles)
+            leaves = self.create_leaves(created_employees)
+            attendance_count = self.create_attendance(created_employees, leaves)
+            rebuild_attendance_rollups(
+                year=year, employee_ids=[employee.id for employee in created_employees]
+            )
+            self.create_payroll_configuration()
+            PayrollCalendarGenerator(year, 'MONTHLY').generate(skip_existing=True)
+        
+        return {
+            'departments': departments,
+            'roles': len(created_roles),
+            'employees': len(created_employees),
+            'leave_applications': len(leaves),
+            'attendance_records': attendance_count,
+        }
+
+    def create_departments_and_roles(self, prefix, departments, roles_per_department):
+        """Create departments and roles in two bulk inserts"""
+        created_departments = Department.objects.bulk_create([
+            Department(name=f'{prefix} Department {number}', description='Synthetic department')
+            for number in range(1, departments + 1)
+        ])
+        
+        return Role.objects.bulk_create([
+            Role(
+                title=f'{prefix} Role {number}',
+                department=department,
+                base_salary=Decimal(self.random.randrange(30000, 120000, 500)),
+                hourly_rate=Decimal(self.random.randrange(15, 80)),
+            )
+            for department in created_departments
+            for number in range(1, roles_per_department + 1)
+        ])
+
+    def create_employees(self, prefix, count, roles):
+        """Create employees in batched bulk inserts"""
+        # Hashing is deliberately slow, so every synthetic employee shares one hash
+        password = make_password('synthetic123')
+        hire_date = date(self.year - 1, 1, 1)
+        employees = []
+        
+        for number in range(1, count + 1):
+            role = self.random.choice(roles)
+            salary_type = 'HOURLY' if self.random.random() < 0.2 else 'FIXED'
+            employee_id = f'{prefix}{number:06d}'
+            
+            employees.append(Employee(
+                username=employee_id.lower(),
+                employee_id=employee_id,
+                password=password,
+                first_name=f'{prefix} First {number}',
+                last_name=f'Last {number}',
+                email=f'{employee_id.lower()}@example.com',
+                department_id=role.department_id,
+                role=role,
+                salary_type=salary_type,
+                base_salary=(role.base_salary / 12).quantize(Decimal('0.01')) if salary_type == 'FIXED' else None,
+                hourly_rate=role.hourly_rate if salary_type == 'HOURLY' else None,
+                hire_date=hire_date,
+            ))
+        
+        return Employee.objects.bulk_create(employees, batch_size=self.BATCH_SIZE)
+
+    def create_leaves(self, employees):
+        """Create one approved three-day leave per employee"""
+        leave_type, _ = LeaveType.objects.get_or_create(
+            name='Annual Leave',
+            defaults={'description': 'Annual vacation leave', 'max_days_per_year': 21}
+        )
+        leaves = []
+        
+        for employee in employees:
+            start_date = date(self.year, 1, 1) + timedelta(
+                days=self.random.randrange((self.end_date - date(self.year, 1, 1)).days + 1)
+            )
+            end_date = min(start_date + timedelta(days=2), self.end_date)
+            leaves.append(LeaveApplication(
+                employee=employee,
+                leave_type=leave_type,
+                start_date=start_date,
+                end_date=end_date,
+                total_days=(end_date - start_date).days + 1,
+                reason='Synthetic leave',
+                status='APPROVED',
+                approved_at=timezone.now(),
+            ))
+        
+        return LeaveApplication.objects.bulk_create(leaves, batch_size=self.BATCH_SIZE)
+
+    def create_attendance(self, employees, leaves):
+        """Create attendance for every working day in batched bulk inserts"""
+        leave_days = {}
+        for leave in leaves:
+            leave_days[leave.employee_id] = (leave.start_date, leave.end_date)
+        
+        working_days = []
+        current_date = date(self.year, 1, 1)
+        while current_date <= self.end_date:
+            if current_date.weekday() < 5:
+                working_days.append(current_date)
+            current_date += timedelta(days=1)
+        
+        records = self.generate_attendance(employees, working_days, leave_days)
+        created = 0
+        
+        while True:
+            batch = list(islice(records, self.BATCH_SIZE))
+            if not batch:
+                break
+            AttendanceRecord.objects.bulk_create(batch)
+            created += len(batch)
+        
+        return created
+
+    def generate_attendance(self, employees, working_days, leave_days):
+        """Yield unsaved attendance records with calculated hours"""
+        tz = timezone.get_current_timezone()
+        
+        for employee in employees:
+            leave_start, leave_end = leave_days.get(employee.id, (None, None))
+            
+            for day in working_days:
+                if leave_start and leave_start <= day <= leave_end:
+                    yield AttendanceRecord(employee=employee, date=day, status='LEAVE')
+                    continue
+                
+                if self.random.random() < 0.03:
+                    yield AttendanceRecord(employee=employee, date=day, status='ABSENT')
+                    continue
+                
+                time_in = datetime.combine(day, time(9), tzinfo=tz) + timedelta(
+                    minutes=self.random.randint(-20, 30)
+                )
+                time_out = time_in + timedelta(minutes=self.random.randint(420, 600))
+                record = AttendanceRecord(
+                    employee=employee,
+                    date=day,
+                    time_in=time_in,
+                    time_out=time_out,
+                    status='PRESENT',
+                )
+                record.calculate_hours()
+                yield record
+
+    def create_payroll_configuration(self):
+        """Create tax slabs and deduction types when none are configured"""
+        if not TaxSlab.objects.filter(is_active=True).exists():
+            TaxSlab.objects.bulk_create([
+                TaxSlab(name='Tax Free', min_amount=Decimal('0'), max_amount=Decimal('1000'),
+                        tax_rate=Decimal('0'), effective_from=date(self.year, 1, 1)),
+                TaxSlab(name='Basic Rate', min_amount=Decimal('1000'), max_amount=Decimal('5000'),
+                        tax_rate=Decimal('10'), effective_from=date(self.year, 1, 1)),
+                TaxSlab(name='Higher Rate', min_amount=Decimal('5000'), max_amount=None,
+                        tax_rate=Decimal('25'), effective_from=date(self.year, 1, 1)),
+            ])
+        
+        if not DeductionType.objects.filter(is_active=True).exists():
+            DeductionType.objects.bulk_create([
+                DeductionType(name='Health Insurance', calculation_type='FIXED',
+                              default_amount=Decimal('50.00'), is_mandatory=True),
+                DeductionType(name='Pension', calculation_type='PERCENTAGE',
+                              default_amount=Decimal('5.00'), is_mandatory=True,
+                              is_taxable=False),
+            ])
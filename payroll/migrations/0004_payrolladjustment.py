@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0003_holiday_payrollperiod_working_days'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='adjustment_amount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Retroactive adjustments from earlier periods paid in this payroll', max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='PayrollAdjustment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gross_delta', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('overtime_delta', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('deduction_delta', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('tax_delta', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('net_delta', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_payroll_adjustments', to=settings.AUTH_USER_MODEL)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_adjustments', to=settings.AUTH_USER_MODEL)),
+                ('source_payroll', models.ForeignKey(help_text='Finalized payroll that was recomputed', on_delete=django.db.models.deletion.CASCADE, related_name='retro_adjustments', to='payroll.payroll')),
+                ('target_period', models.ForeignKey(help_text='Open period in which the adjustment is paid', on_delete=django.db.models.deletion.CASCADE, related_name='adjustments', to='payroll.payrollperiod')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'unique_together': {('source_payroll', 'target_period')},
+            },
+        ),
+    ]
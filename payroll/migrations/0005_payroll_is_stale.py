@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0004_payrolladjustment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='is_stale',
+            field=models.BooleanField(default=False, help_text='Attendance changed after calculation, recalculate before approving'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0005_payroll_is_stale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='payment_batch',
+            field=models.CharField(blank=True, db_index=True, help_text='Bank transfer run that paid this payroll', max_length=32),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:40
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def clear_unset_working_days(apps, schema_editor):
+    """Clear the default 0 of periods that were never given their working days"""
+    PayrollPeriod = apps.get_model('payroll', 'PayrollPeriod')
+    Holiday = apps.get_model('payroll', 'Holiday')
+    
+    holidays = set(Holiday.objects.filter(is_active=True).values_list('date', flat=True))
+    unset = []
+    for period in PayrollPeriod.objects.filter(working_days=0).only('id', 'start_date', 'end_date'):
+        current_date = period.start_date
+        while current_date <= period.end_date:
+            # A period that really has no working days keeps its 0
+            if current_date.weekday() < 5 and current_date not in holidays:
+                unset.append(period.id)
+                break
+            current_date += timedelta(days=1)
+    
+    PayrollPeriod.objects.filter(id__in=unset).update(working_days=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0006_payroll_payment_batch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payrollperiod',
+            name='working_days',
+            field=models.IntegerField(blank=True, help_text='Working days in the period excluding weekends and holidays, empty when not precomputed', null=True),
+        ),
+        migrations.RunPython(clear_unset_working_days, migrations.RunPython.noop),
+    ]
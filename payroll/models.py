@@ -20,6 +20,10 @@ class PayrollPeriod(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     pay_date = models.DateField(help_text="Date when salaries will be paid")
+    working_days = models.IntegerField(
+        null=True, blank=True,
+        help_text="Working days in the period excluding weekends and holidays, empty when not precomputed"
+    )
     is_processed = models.BooleanField(default=False)
     is_finalized = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -38,6 +42,21 @@ class PayrollPeriod(models.Model):
         return (self.end_date - self.start_date).days + 1
 
 
+class Holiday(models.Model):
+    """Model for public holidays excluded from working days"""
+    
+    name = models.CharField(max_length=100)
+    date = models.DateField(unique=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['date']
+    
+    def __str__(self):
+        return f"{self.name} ({self.date})"
+
+
 class TaxSlab(models.Model):
     """Model for income tax slabs"""
     
@@ -150,17 +169,29 @@ class Payroll(models.Model):
     total_bonuses = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_deductions = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    adjustment_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0,
+        help_text="Retroactive adjustments from earlier periods paid in this payroll"
+    )
     net_salary = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     # Status and approval
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='DRAFT')
     calculated_at = models.DateTimeField(null=True, blank=True)
+    is_stale = models.BooleanField(
+        default=False,
+        help_text="Attendance changed after calculation, recalculate before approving"
+    )
     approved_by = models.ForeignKey(
         Employee, on_delete=models.SET_NULL, null=True, blank=True,
         related_name='approved_payrolls'
     )
     approved_at = models.DateTimeField(null=True, blank=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    payment_batch = models.CharField(
+        max_length=32, blank=True, db_index=True,
+        help_text="Bank transfer run that paid this payroll"
+    )
     
     # Additional fields
     notes = models.TextField(blank=True)
@@ -171,17 +202,22 @@ class Payroll(models.Model):
         ordering = ['-payroll_period__start_date', 'employee__employee_id']
         unique_together = ['employee', 'payroll_period']
 
-    def calculate_salary(self):
-        """Calculate salary for this payroll record"""
-        from .utils import PayrollCalculator
+    def calculate_salary(self, instrumentation=None, preview=False):
+        """Calculate salary for this payroll record, previews leave attendance untouched"""
+        from .utils import PayrollCalculator, NULL_INSTRUMENTATION
+        
+        # Optional per-stage timing, a shared no-op when disabled
+        stage = (instrumentation or NULL_INSTRUMENTATION).stage
         
         calculator = PayrollCalculator(self.employee, self.payroll_period)
         
         # Get attendance data
-        attendance_data = calculator.get_attendance_data()
+        with stage('attendance'):
+            attendance_data = calculator.get_attendance_data(preview)
         
         # Update attendance fields
-        self.total_working_days = calculator.calculate_working_days()
+        with stage('working_days'):
+            self.total_working_days = calculator.calculate_working_days()
         self.days_worked = attendance_data['days_worked']
         self.days_absent = attendance_data['days_absent']
         self.days_on_leave = attendance_data['days_on_leave']
@@ -195,32 +231,41 @@ class Payroll(models.Model):
             self.hourly_rate = self.employee.hourly_rate or Decimal('0.00')
         
         # Calculate salary components
-        self.gross_salary = calculator.calculate_base_salary(attendance_data)
-        self.overtime_amount = calculator.calculate_overtime_amount(attendance_data)
+        with stage('base_salary'):
+            self.gross_salary = calculator.calculate_base_salary(attendance_data)
+            self.overtime_amount = calculator.calculate_overtime_amount(attendance_data)
         
         # Save the record first so we can add deductions and bonuses
         if not self.pk:
-            self.save()
+            with stage('save'):
+                self.save()
         
         # Calculate bonuses and deductions
-        self.total_bonuses = calculator.calculate_bonuses(self)
-        self.total_deductions = calculator.calculate_deductions(self, self.gross_salary)
-        
-        # Calculate taxable income (gross + overtime + taxable bonuses - non-taxable deductions)
-        taxable_income = self.gross_salary + self.overtime_amount
+        with stage('bonuses'):
+            self.total_bonuses = calculator.calculate_bonuses(self)
+        with stage('deductions'):
+            self.total_deductions = calculator.calculate_deductions(self, self.gross_salary)
         
-        # Add taxable bonuses
-        for bonus in self.bonuses.all():
-            if bonus.bonus_type.is_taxable:
-                taxable_income += bonus.amount
+        with stage('tax'):
+            # Calculate taxable income (gross + overtime + taxable bonuses - non-taxable deductions)
+            taxable_income = self.gross_salary + self.overtime_amount
+            
+            # Add taxable bonuses
+            for bonus in self.bonuses.all():
+                if bonus.bonus_type.is_taxable:
+                    taxable_income += bonus.amount
+            
+            # Subtract non-taxable deductions
+            for deduction in self.deductions.all():
+                if not deduction.deduction_type.is_taxable:
+                    taxable_income -= deduction.amount
+            
+            # Calculate tax
+            self.tax_amount = calculator.calculate_tax(taxable_income)
         
-        # Subtract non-taxable deductions
-        for deduction in self.deductions.all():
-            if not deduction.deduction_type.is_taxable:
-                taxable_income -= deduction.amount
-        
-        # Calculate tax
-        self.tax_amount = calculator.calculate_tax(taxable_income)
+        # Add retroactive adjustments raised against earlier periods
+        with stage('adjustments'):
+            self.adjustment_amount = calculator.calculate_adjustments()
         
         # Calculate net salary
         self.net_salary = calculator.calculate_net_salary(
@@ -228,15 +273,18 @@ class Payroll(models.Model):
             self.overtime_amount,
             self.total_bonuses,
             self.total_deductions,
-            self.tax_amount
+            self.tax_amount,
+            self.adjustment_amount
         )
         
         # Update status and calculation timestamp
         self.status = 'CALCULATED'
         self.calculated_at = timezone.now()
+        self.is_stale = False
         
         # Save the updated record
-        self.save()
+        with stage('save'):
+            self.save()
         
         return self
     
@@ -244,6 +292,8 @@ class Payroll(models.Model):
         """Approve the payroll"""
         if self.status != 'CALCULATED':
             raise ValueError("Only calculated payrolls can be approved")
+        if self.is_stale:
+            raise ValueError("Stale payrolls must be recalculated before approval")
         
         self.status = 'APPROVED'
         self.approved_by = approved_by
@@ -324,6 +374,42 @@ class PayrollBonus(models.Model):
         return f"{self.payroll.employee.get_full_name()} - {self.bonus_type.name}: ${self.amount}"
 
 
+class PayrollAdjustment(models.Model):
+    """Model for retroactive pay adjustments (arrears) of finalized payrolls"""
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='payroll_adjustments')
+    source_payroll = models.ForeignKey(
+        Payroll, on_delete=models.CASCADE, related_name='retro_adjustments',
+        help_text="Finalized payroll that was recomputed"
+    )
+    target_period = models.ForeignKey(
+        PayrollPeriod, on_delete=models.CASCADE, related_name='adjustments',
+        help_text="Open period in which the adjustment is paid"
+    )
+    
+    # Differences between the recomputed and the frozen payroll values
+    gross_delta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    overtime_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    deduction_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tax_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    net_delta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    reason = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(
+        Employee, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='created_payroll_adjustments'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['source_payroll', 'target_period']
+    
+    def __str__(self):
+        return f"{self.employee.get_full_name()} - {self.source_payroll.payroll_period.name}: ${self.net_delta}"
+
+
 class PayrollHistory(models.Model):
     """Model for tracking payroll changes and actions"""
     
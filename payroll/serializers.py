@@ -3,9 +3,10 @@ from django.utils import timezone
 from decimal import Decimal
 from datetime import datetime, date
 from .models import (
-    PayrollPeriod, TaxSlab, DeductionType, BonusType, Payroll,
-    PayrollDeduction, PayrollBonus, PayrollHistory, PaySlip
+    PayrollPeriod, Holiday, TaxSlab, DeductionType, BonusType, Payroll,
+    PayrollDeduction, PayrollBonus, PayrollAdjustment, PayrollHistory, PaySlip
 )
+from .utils import reconcile_period_overtime
 from employees.models import Employee
 
 
@@ -20,7 +21,7 @@ class PayrollPeriodSerializer(serializers.ModelSerializer):
         model = PayrollPeriod
         fields = [
             'id', 'name', 'period_type', 'start_date', 'end_date', 'pay_date',
-            'total_days', 'is_processed', 'is_finalized', 'payroll_count',
+            'total_days', 'working_days', 'is_processed', 'is_finalized', 'payroll_count',
             'total_amount', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
@@ -36,6 +37,38 @@ class PayrollPeriodSerializer(serializers.ModelSerializer):
         )['total'] or Decimal('0.00')
 
 
+class PayrollCalendarSerializer(serializers.Serializer):
+    """Serializer for generating a year of payroll periods"""
+    
+    year = serializers.IntegerField(min_value=2000, max_value=2100)
+    period_type = serializers.ChoiceField(choices=PayrollPeriod.PERIOD_TYPES)
+    pay_date_offset = serializers.IntegerField(
+        default=0,
+        min_value=0,
+        max_value=31,
+        help_text="Days after the period end date on which salaries are paid"
+    )
+    week_start = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=6,
+        help_text="Weekday weekly and bi-weekly periods start on, Monday = 0"
+    )
+    skip_existing = serializers.BooleanField(
+        default=False,
+        help_text="Skip periods that already exist instead of failing"
+    )
+
+
+class HolidaySerializer(serializers.ModelSerializer):
+    """Serializer for Holiday model"""
+    
+    class Meta:
+        model = Holiday
+        fields = ['id', 'name', 'date', 'is_active', 'created_at']
+        read_only_fields = ['created_at']
+
+
 class TaxSlabSerializer(serializers.ModelSerializer):
     """Serializer for TaxSlab model"""
     
@@ -113,7 +146,7 @@ class PayrollListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'employee', 'employee_name', 'employee_id',
             'payroll_period', 'period_name', 'gross_salary', 'net_salary',
-            'status', 'calculated_at', 'approved_by', 'approved_by_name',
+            'status', 'calculated_at', 'is_stale', 'approved_by', 'approved_by_name',
             'approved_at', 'paid_at'
         ]
 
@@ -136,15 +169,15 @@ class PayrollDetailSerializer(serializers.ModelSerializer):
             'payroll_period', 'period_name', 'base_salary', 'hourly_rate',
             'total_working_days', 'days_worked', 'days_absent', 'days_on_leave',
             'regular_hours', 'overtime_hours', 'gross_salary', 'overtime_amount',
-            'total_bonuses', 'total_deductions', 'tax_amount', 'net_salary',
-            'status', 'calculated_at', 'approved_by', 'approved_by_name',
-            'approved_at', 'paid_at', 'notes', 'deductions', 'bonuses',
+            'total_bonuses', 'total_deductions', 'tax_amount', 'adjustment_amount',
+            'net_salary', 'status', 'calculated_at', 'is_stale', 'approved_by', 'approved_by_name',
+            'approved_at', 'paid_at', 'payment_batch', 'notes', 'deductions', 'bonuses',
             'created_at', 'updated_at'
         ]
         read_only_fields = [
             'gross_salary', 'overtime_amount', 'total_bonuses', 'total_deductions',
-            'tax_amount', 'net_salary', 'calculated_at', 'approved_by',
-            'approved_at', 'paid_at', 'created_at', 'updated_at'
+            'tax_amount', 'adjustment_amount', 'net_salary', 'calculated_at', 'is_stale', 'approved_by',
+            'approved_at', 'paid_at', 'payment_batch', 'created_at', 'updated_at'
         ]
 
 
@@ -196,6 +229,7 @@ class PayrollCreateSerializer(serializers.ModelSerializer):
             PayrollBonus.objects.create(payroll=payroll, **bonus_data)
         
         # Calculate salary
+        reconcile_period_overtime(payroll.payroll_period, [payroll.employee_id])
         payroll.calculate_salary()
         
         return payroll
@@ -216,6 +250,10 @@ class PayrollCalculationSerializer(serializers.Serializer):
         default=False,
         help_text="Whether to recalculate existing payrolls"
     )
+    instrument = serializers.BooleanField(
+        default=False,
+        help_text="Whether to return per-stage timing and query counts"
+    )
     
     def validate_payroll_period_id(self, value):
         """Validate payroll period exists"""
@@ -241,6 +279,82 @@ class PayrollApprovalSerializer(serializers.Serializer):
     )
 
 
+class BankFileSerializer(serializers.Serializer):
+    """Serializer for bank transfer file generation"""
+    
+    file_format = serializers.ChoiceField(
+        choices=['CSV', 'FIXED'],
+        default='CSV',
+        help_text="CSV or fixed-width bank transfer file"
+    )
+    mark_paid = serializers.BooleanField(
+        default=False,
+        help_text="Mark the included payrolls as paid"
+    )
+    notes = serializers.CharField(
+        max_length=500,
+        required=False,
+        allow_blank=True,
+        help_text="Optional notes for the payment history"
+    )
+
+
+class RetroAdjustmentSerializer(serializers.Serializer):
+    """Serializer for retroactive adjustment parameters"""
+    
+    target_period_id = serializers.IntegerField(
+        required=False,
+        help_text="Open payroll period receiving the adjustments. Defaults to the current period."
+    )
+    since = serializers.DateTimeField(
+        required=False,
+        help_text="Pick up attendance corrections made since this time"
+    )
+    employee_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        help_text="Employees whose salary changed retroactively"
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    reason = serializers.CharField(
+        max_length=500,
+        required=False,
+        allow_blank=True,
+        help_text="Reason recorded on the adjustments"
+    )
+    
+    def validate(self, attrs):
+        """Validate that at least one change source is given"""
+        if not attrs.get('since') and not attrs.get('employee_ids'):
+            raise serializers.ValidationError(
+                "Provide either 'since' or 'employee_ids'."
+            )
+        
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must be before date_to.")
+        
+        return attrs
+
+
+class PayrollAdjustmentSerializer(serializers.ModelSerializer):
+    """Serializer for PayrollAdjustment model"""
+    
+    employee_name = serializers.CharField(source='employee.get_full_name', read_only=True)
+    source_period_name = serializers.CharField(source='source_payroll.payroll_period.name', read_only=True)
+    target_period_name = serializers.CharField(source='target_period.name', read_only=True)
+    
+    class Meta:
+        model = PayrollAdjustment
+        fields = [
+            'id', 'employee', 'employee_name', 'source_payroll', 'source_period_name',
+            'target_period', 'target_period_name', 'gross_delta', 'overtime_delta',
+            'deduction_delta', 'tax_delta', 'net_delta', 'reason', 'created_by',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_at', 'updated_at']
+
+
 class PayrollHistorySerializer(serializers.ModelSerializer):
     """Serializer for PayrollHistory model"""
     
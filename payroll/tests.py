@@ -1,3 +1,522 @@
+import csv
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from attendance.models import AttendanceRecord, OvertimeRequest
+from attendance.utils import OvertimeReconciler
+from employees.models import Employee
+from .models import Holiday, Payroll, PayrollPeriod, PayrollAdjustment
+from . import views as payroll_views
+from .utils import (
+    PayrollCalculator, PayrollCalendarGenerator, PayrollInstrumentation, RetroPayCalculator,
+    PayrollAnomalyDetector, BankPaymentFileGenerator, calculate_payroll_locked
+)
+
+
+class RetroPayCalculatorTests(TestCase):
+    """Arrears of a finalized payroll must be raised once, whichever period pays them"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True, is_active=False)
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001', base_salary=Decimal('3000.00'))
+
+        self.january = PayrollPeriod.objects.create(
+            name='Jan 2026', start_date=date(2026, 1, 1), end_date=date(2026, 1, 31), pay_date=date(2026, 2, 1)
+        )
+        self.february = PayrollPeriod.objects.create(
+            name='Feb 2026', start_date=date(2026, 2, 1), end_date=date(2026, 2, 28), pay_date=date(2026, 3, 1)
+        )
+        self.march = PayrollPeriod.objects.create(
+            name='Mar 2026', start_date=date(2026, 3, 1), end_date=date(2026, 3, 31), pay_date=date(2026, 4, 1)
+        )
+
+        for day in range(5, 17):
+            time_in = timezone.make_aware(datetime.combine(date(2026, 1, day), time(9, 0)))
+            AttendanceRecord.objects.create(
+                employee=self.employee, date=date(2026, 1, day), time_in=time_in, time_out=time_in + timedelta(hours=8)
+            )
+
+        self.payroll = Payroll.objects.create(employee=self.employee, payroll_period=self.january)
+        self.payroll.calculate_salary()
+        self.payroll.approve(self.admin)
+        self.january.is_finalized = True
+        self.january.save()
+
+    def raise_salary(self, base_salary):
+        Employee.objects.filter(pk=self.employee.pk).update(base_salary=base_salary)
+
+    def retro_adjust(self, target_period):
+        return RetroPayCalculator(target_period, created_by=self.admin).run(
+            employee_ids=[self.employee.id], date_from=date(2026, 1, 1)
+        )
+
+    def owed(self):
+        """Get the net difference between the frozen payroll and one recomputed now"""
+        self.employee.refresh_from_db()
+        calculator = PayrollCalculator(self.employee, self.january)
+        calculator.calculation_date = self.january.end_date
+        return calculator.recompute_payroll(self.payroll, [])['net_salary'] - self.payroll.net_salary
+
+    def total_raised(self):
+        return PayrollAdjustment.objects.filter(source_payroll=self.payroll).aggregate(
+            total=Sum('net_delta')
+        )['total']
+
+    def test_rerun_in_same_period_updates(self):
+        self.raise_salary(Decimal('3300.00'))
+
+        first = self.retro_adjust(self.february)
+        second = self.retro_adjust(self.february)
+
+        self.assertEqual((len(first['created']), len(second['created']), len(second['updated'])), (1, 0, 1))
+        self.assertEqual(PayrollAdjustment.objects.count(), 1)
+        self.assertEqual(second['updated'][0].net_delta, first['created'][0].net_delta)
+
+    def test_rerun_in_another_period_raises_nothing(self):
+        self.raise_salary(Decimal('3300.00'))
+
+        first = self.retro_adjust(self.february)
+        net_delta = first['created'][0].net_delta
+        self.assertGreater(net_delta, 0)
+
+        second = self.retro_adjust(self.march)
+
+        self.assertEqual((len(second['created']), len(second['updated'])), (0, 0))
+        self.assertEqual(self.total_raised(), self.owed())
+
+    def test_further_change_raises_the_difference(self):
+        self.raise_salary(Decimal('3300.00'))
+        first = self.retro_adjust(self.february)
+
+        self.raise_salary(Decimal('3600.00'))
+        second = self.retro_adjust(self.march)
+
+        # The second period only pays what the first one does not
+        self.assertEqual(len(second['created']), 1)
+        self.assertEqual(second['created'][0].net_delta, self.owed() - first['created'][0].net_delta)
+        self.assertEqual(self.total_raised(), self.owed())
+
+    def test_rerun_moves_updated_at(self):
+        self.raise_salary(Decimal('3300.00'))
+        adjustment = self.retro_adjust(self.february)['created'][0]
+
+        self.raise_salary(Decimal('3600.00'))
+        self.retro_adjust(self.february)
+
+        adjustment_updated_at = adjustment.updated_at
+        adjustment.refresh_from_db()
+        self.assertGreater(adjustment.updated_at, adjustment_updated_at)
+
+    def test_deleted_record_raises_arrears(self):
+        since = timezone.now()
+        AttendanceRecord.objects.filter(employee=self.employee).order_by('date').last().delete()
+
+        result = RetroPayCalculator(self.february, created_by=self.admin).run(since=since)
+
+        self.assertEqual(len(result['created']), 1)
+        self.assertLess(result['created'][0].net_delta, 0)
+        self.assertEqual(result['created'][0].net_delta, self.owed())
+
+    def test_target_payroll_marked_stale(self):
+        march_payroll = Payroll.objects.create(employee=self.employee, payroll_period=self.march)
+        march_payroll.calculate_salary()
+        self.assertEqual(march_payroll.adjustment_amount, 0)
+        self.raise_salary(Decimal('3300.00'))
+
+        result = self.retro_adjust(self.march)
+
+        self.assertEqual(result['payrolls_marked_stale'], 1)
+        march_payroll.refresh_from_db()
+        self.assertTrue(march_payroll.is_stale)
+        with self.assertRaises(ValueError):
+            march_payroll.approve(self.admin)
+
+        march_payroll.calculate_salary()
+        self.assertFalse(march_payroll.is_stale)
+        self.assertEqual(march_payroll.adjustment_amount, result['created'][0].net_delta)
+
+
+class BankPaymentFileGeneratorTests(TestCase):
+    """Bank files must escape their fields and carry totals matching their records"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='ADMIN', is_staff=True, is_active=False)
+        self.period = PayrollPeriod.objects.create(
+            name='Jan 2026', start_date=date(2026, 1, 1), end_date=date(2026, 1, 31), pay_date=date(2026, 2, 1)
+        )
+        self.payrolls = [
+            self.create_payroll('EMP0007', 'Ann, "Annie"', 'Lee', '1500.25'),
+            self.create_payroll('EMP0042', 'Bo', 'Ng\nJr', '2000.50'),
+        ]
+
+    def create_payroll(self, employee_id, first_name, last_name, net_salary):
+        employee = Employee.objects.create(
+            username=employee_id.lower(), employee_id=employee_id, first_name=first_name, last_name=last_name
+        )
+        return Payroll.objects.create(
+            employee=employee, payroll_period=self.period, status='APPROVED', net_salary=Decimal(net_salary)
+        )
+
+    def test_csv(self):
+        rows = list(csv.reader(''.join(BankPaymentFileGenerator(self.period).stream()).splitlines(True)))
+
+        self.assertEqual(rows[0], ['record_type', 'payroll_id', 'employee_id', 'employee_name', 'amount'])
+        self.assertEqual(rows[1][2:], ['EMP0007', 'Ann, "Annie" Lee', '1500.25'])
+        self.assertEqual(rows[2][2:], ['EMP0042', 'Bo Ng\nJr', '2000.50'])
+        # Hash total of the employee numbers, 7 + 42
+        self.assertEqual(rows[3], ['T', '2', '', '49', '3500.75'])
+
+    def test_fixed_width(self):
+        lines = list(BankPaymentFileGenerator(self.period, 'FIXED').stream())
+
+        self.assertTrue(all(line.count('\n') == 1 for line in lines))
+        self.assertEqual({len(line) for line in lines[1:-1]}, {82})
+        self.assertEqual(lines[2][31:66].rstrip(), 'Bo Ng Jr')
+        self.assertEqual(lines[-1], 'T' + '2'.zfill(10) + '350075'.zfill(18) + '49'.zfill(18) + '\n')
+
+    def test_negative_amount_rejected(self):
+        Payroll.objects.filter(pk=self.payrolls[1].pk).update(net_salary=Decimal('-10.00'))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.post(f'/api/payroll/periods/{self.period.id}/bank_file/', {'mark_paid': True}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('EMP0042', response.data['error'])
+        self.assertFalse(Payroll.objects.filter(status='PAID').exists())
+
+    def test_paid_file_lists_its_own_batch(self):
+        first = BankPaymentFileGenerator(self.period)
+        self.assertEqual(first.mark_as_paid(self.admin), 2)
+
+        late = self.create_payroll('EMP0100', 'Cy', 'Ode', '900.00')
+        second = BankPaymentFileGenerator(self.period)
+        self.assertEqual(second.mark_as_paid(self.admin), 1)
+
+        self.assertEqual([row[0] for row in first.get_queryset()], [payroll.id for payroll in self.payrolls])
+        self.assertEqual([row[0] for row in second.get_queryset()], [late.id])
+        self.assertEqual(set(Payroll.objects.values_list('status', flat=True)), {'PAID'})
+
+
+class PayrollCalendarGeneratorTests(TestCase):
+    """Generated calendars must tile the year without gaps, overlaps or short periods"""
+
+    def generate(self, year, period_type, **kwargs):
+        skip_existing = kwargs.pop('skip_existing', False)
+        return PayrollCalendarGenerator(year, period_type, **kwargs).generate(skip_existing=skip_existing)
+
+    def assertContiguous(self, periods, length):
+        for previous, period in zip(periods, periods[1:]):
+            self.assertEqual(period.start_date, previous.end_date + timedelta(days=1))
+        self.assertEqual({(period.end_date - period.start_date).days + 1 for period in periods}, {length})
+
+    def test_weekly_periods_start_on_week_start(self):
+        # 1 January 2026 is a Thursday
+        created, _ = self.generate(2026, 'WEEKLY', week_start=0)
+
+        self.assertEqual(created[0].start_date, date(2026, 1, 5))
+        self.assertEqual(created[-1].start_date, date(2026, 12, 28))
+        self.assertEqual(created[-1].end_date, date(2027, 1, 3))
+        self.assertEqual(len(created), 52)
+        self.assertContiguous(created, 7)
+
+    def test_consecutive_years_follow_on(self):
+        for period_type, length in (('WEEKLY', 7), ('BI_WEEKLY', 14)):
+            with self.subTest(period_type=period_type):
+                previous, _ = self.generate(2026, period_type, week_start=4)
+                following, _ = self.generate(2027, period_type, week_start=4)
+
+                self.assertEqual({period.start_date.weekday() for period in previous + following}, {4})
+                self.assertContiguous(previous + following, length)
+                PayrollPeriod.objects.all().delete()
+
+    def test_monthly_working_days_skip_holidays(self):
+        Holiday.objects.create(name='New Year', date=date(2026, 1, 1))
+
+        created, _ = self.generate(2026, 'MONTHLY')
+
+        self.assertEqual(len(created), 12)
+        self.assertEqual((created[0].start_date, created[0].end_date), (date(2026, 1, 1), date(2026, 1, 31)))
+        self.assertEqual(created[0].working_days, 21)
+        self.assertEqual(created[-1].end_date, date(2026, 12, 31))
+
+    def test_overlapping_period_conflicts(self):
+        PayrollPeriod.objects.create(
+            name='Custom', start_date=date(2026, 1, 20), end_date=date(2026, 2, 3), pay_date=date(2026, 2, 5)
+        )
+
+        with self.assertRaises(ValueError):
+            self.generate(2026, 'WEEKLY', week_start=0)
+
+        created, skipped = self.generate(2026, 'WEEKLY', week_start=0, skip_existing=True)
+
+        self.assertEqual([period.start_date for period in skipped], [date(2026, 1, 19), date(2026, 1, 26), date(2026, 2, 2)])
+        self.assertEqual(len(created), 49)
+
+    def test_zero_working_days_is_kept(self):
+        employee = Employee.objects.create(username='alice', employee_id='EMP0001')
+        period = PayrollPeriod.objects.create(
+            name='Shutdown', start_date=date(2026, 12, 21), end_date=date(2026, 12, 27),
+            pay_date=date(2026, 12, 31), working_days=0
+        )
+        self.assertEqual(PayrollCalculator(employee, period).calculate_working_days(), 0)
+
+        period.working_days = None
+        self.assertEqual(PayrollCalculator(employee, period).calculate_working_days(), 5)
+
+
+class CalculatePayrollLockedTests(TestCase):
+    """Rows held by a concurrent run are skipped and reported, never calculated twice"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True, is_active=False)
+        self.employees = [
+            Employee.objects.create(username=f'user{index}', employee_id=f'EMP{index:04d}', base_salary=Decimal('3000.00'))
+            for index in range(1, 4)
+        ]
+        self.period = PayrollPeriod.objects.create(
+            name='Jan 2026', start_date=date(2026, 1, 1), end_date=date(2026, 1, 31), pay_date=date(2026, 2, 1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def lock_rows(self, *employees):
+        """Make the row lock of the given employees' payrolls look taken by another run"""
+        locked_ids = set(
+            Payroll.objects.filter(employee__in=employees).values_list('id', flat=True)
+        )
+
+        def calculate(payroll_id, **kwargs):
+            if payroll_id in locked_ids:
+                return None, 'locked'
+            return calculate_payroll_locked(payroll_id, **kwargs)
+
+        return mock.patch.object(payroll_views, 'calculate_payroll_locked', side_effect=calculate)
+
+    def calculate_bulk(self, **data):
+        response = self.client.post('/api/payroll/payrolls/calculate_bulk/', {
+            'payroll_period_id': self.period.id, **data
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_locked_rows_reported(self):
+        for employee in self.employees:
+            Payroll.objects.create(employee=employee, payroll_period=self.period)
+
+        with self.lock_rows(self.employees[1]):
+            data = self.calculate_bulk(recalculate=True)
+
+        self.assertEqual(data['skipped_locked'], [self.employees[1].id])
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(
+            [row['employee_id'] for row in data['results']], [self.employees[0].id, self.employees[2].id]
+        )
+        self.assertIsNone(Payroll.objects.get(employee=self.employees[1]).calculated_at)
+
+    def test_finished_rows_rechecked_under_lock(self):
+        payroll = Payroll.objects.create(employee=self.employees[0], payroll_period=self.period)
+
+        self.assertEqual(calculate_payroll_locked(payroll.id)[1], 'calculated')
+        self.assertEqual(calculate_payroll_locked(payroll.id)[1], 'exists')
+        Payroll.objects.filter(pk=payroll.pk).update(status='APPROVED')
+        self.assertEqual(calculate_payroll_locked(payroll.id, recalculate=True)[1], 'finalized')
+
+    def test_recalculate_conflicts_while_locked(self):
+        payroll = Payroll.objects.create(employee=self.employees[0], payroll_period=self.period)
+
+        with self.lock_rows(self.employees[0]):
+            response = self.client.post(f'/api/payroll/payrolls/{payroll.id}/recalculate/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(payroll.history.exists())
+
+
+class PayrollInstrumentationTests(TestCase):
+    """Instrumentation reports every calculation stage without changing the result"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True, is_active=False)
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001', base_salary=Decimal('3000.00'))
+        self.period = PayrollPeriod.objects.create(
+            name='Jan 2026', start_date=date(2026, 1, 1), end_date=date(2026, 1, 31), pay_date=date(2026, 2, 1)
+        )
+        for day in range(5, 10):
+            time_in = timezone.make_aware(datetime.combine(date(2026, 1, day), time(9, 0)))
+            AttendanceRecord.objects.create(
+                employee=self.employee, date=date(2026, 1, day), time_in=time_in, time_out=time_in + timedelta(hours=9)
+            )
+
+    def test_stages_recorded(self):
+        plain = Payroll.objects.create(employee=self.employee, payroll_period=self.period).calculate_salary()
+        instrumentation = PayrollInstrumentation()
+
+        payroll = Payroll.objects.select_related('employee', 'payroll_period').get(pk=plain.pk)
+        with CaptureQueriesContext(connection) as queries:
+            instrumented = payroll.calculate_salary(instrumentation=instrumentation)
+        metrics = instrumentation.as_dict()
+
+        # Every query of the calculation is counted against a stage
+        self.assertEqual(sum(stage['queries'] for stage in metrics.values()), len(queries))
+
+        self.assertEqual(instrumented.net_salary, plain.net_salary)
+        self.assertEqual(
+            set(metrics),
+            {'attendance', 'working_days', 'base_salary', 'bonuses', 'deductions', 'tax', 'adjustments', 'save'}
+        )
+        self.assertEqual(metrics['save']['calls'], 1)
+        self.assertGreater(metrics['attendance']['queries'], 0)
+        self.assertEqual(metrics['working_days']['queries'], 0)
+        self.assertTrue(all(stage['wall_time'] >= 0 for stage in metrics.values()))
+
+    def test_bulk_calculation_reports_stages_on_request(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        plain = client.post('/api/payroll/payrolls/calculate_bulk/', {
+            'payroll_period_id': self.period.id
+        }, format='json')
+        instrumented = client.post('/api/payroll/payrolls/calculate_bulk/', {
+            'payroll_period_id': self.period.id, 'recalculate': True, 'instrument': True
+        }, format='json')
+
+        self.assertEqual(plain.data['instrumentation'], {})
+        self.assertEqual(instrumented.data['results'][0]['net_salary'], plain.data['results'][0]['net_salary'])
+        self.assertEqual(instrumented.data['instrumentation']['lock']['calls'], 1)
+        self.assertIn('prepare', instrumented.data['instrumentation'])
+        self.assertIn('tax', instrumented.data['instrumentation'])
+
+
+class PayrollAnomalyDetectorTests(TestCase):
+    """Payrolls are flagged against their employee's own history"""
+
+    def setUp(self):
+        self.periods = [
+            PayrollPeriod.objects.create(
+                name=f'2026-{month:02d}', start_date=date(2026, month, 1), end_date=date(2026, month, 28),
+                pay_date=date(2026, month, 28)
+            )
+            for month in range(1, 7)
+        ]
+        self.current = self.periods[-1]
+
+    def create_payrolls(self, employee_id, amounts, status='APPROVED'):
+        employee = Employee.objects.create(username=employee_id.lower(), employee_id=employee_id)
+        for period, amount in zip(self.periods, amounts):
+            if amount is not None:
+                Payroll.objects.create(
+                    employee=employee, payroll_period=period, status=status if period != self.current else 'CALCULATED',
+                    gross_salary=Decimal(amount), net_salary=Decimal(amount) * Decimal('0.8'),
+                    tax_amount=Decimal(amount) * Decimal('0.2')
+                )
+        return employee
+
+    def detect(self, **kwargs):
+        result = PayrollAnomalyDetector(self.current, **kwargs).detect()
+        return result, {anomaly['employee_id']: anomaly for anomaly in result['anomalies']}
+
+    def test_flags(self):
+        self.create_payrolls('STEADY', [3000, 3010, 2990, 3005, 2995, 3000])
+        self.create_payrolls('SPIKE', [3000, 3010, 2990, 3005, 2995, 6000])
+        self.create_payrolls('NEW', [None, None, None, 3000, 3000, 9000])
+
+        result, anomalies = self.detect()
+
+        self.assertEqual(result['payrolls_scanned'], 3)
+        self.assertEqual(result['employees_with_history'], 3)
+        self.assertEqual(set(anomalies), {'SPIKE'})
+        flags = {flag['metric']: flag for flag in anomalies['SPIKE']['flags']}
+        self.assertEqual(set(flags), {'net_salary', 'gross_salary', 'tax_amount'})
+        self.assertEqual(flags['gross_salary']['mean'], 3000.0)
+        self.assertEqual(flags['gross_salary']['previous'], 2995.0)
+        self.assertEqual(flags['gross_salary']['change_percentage'], 100.3)
+        self.assertGreater(flags['gross_salary']['z_score'], 3)
+
+    def test_last_value_of_a_gap(self):
+        # Unpaid in May, the change is measured from April
+        self.create_payrolls('GAP', [3000, 3000, 3000, 2000, None, 3000])
+        self.create_payrolls('DRAFTED', [3000, 3000, 3000, 3000, 3000, 3000])
+        Payroll.objects.filter(employee__employee_id='DRAFTED', payroll_period=self.periods[4]).update(
+            status='DRAFT', gross_salary=Decimal('1000')
+        )
+
+        for batch in (PayrollAnomalyDetector.LAST_VALUE_BATCH, 0):
+            with self.subTest(batch=batch), mock.patch.object(PayrollAnomalyDetector, 'LAST_VALUE_BATCH', batch):
+                _, anomalies = self.detect(jump_threshold=0.4)
+
+                self.assertEqual(set(anomalies), {'GAP'})
+                self.assertEqual(anomalies['GAP']['history_periods'], 4)
+                self.assertEqual(anomalies['GAP']['flags'][0]['previous'], 1600.0)
+
+    def test_endpoint_validates_parameters(self):
+        admin = Employee.objects.create(username='admin', employee_id='ADMIN', is_staff=True, is_active=False)
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get(f'/api/payroll/periods/{self.current.id}/anomalies/', {'z_threshold': 'high'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class OvertimeReconciliationTests(TestCase):
+    """Payrolls pay punched overtime only up to the approved requests, previews write nothing"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True, is_active=False)
+        self.employee = Employee.objects.create(username='alice', employee_id='EMP0001', base_salary=Decimal('3000.00'))
+        self.period = PayrollPeriod.objects.create(
+            name='Mar 2026', start_date=date(2026, 3, 1), end_date=date(2026, 3, 31), pay_date=date(2026, 4, 1)
+        )
+        # Two hours over the day each, approved in full, in part, not at all, and approved but not worked
+        for day, hours, approved in [(2, 10, 2), (3, 10, 1), (4, 10, 0), (5, 8, 2)]:
+            time_in = timezone.make_aware(datetime.combine(date(2026, 3, day), time(9, 0)))
+            AttendanceRecord.objects.create(
+                employee=self.employee, date=date(2026, 3, day), time_in=time_in, time_out=time_in + timedelta(hours=hours)
+            )
+            if approved:
+                OvertimeRequest.objects.create(
+                    employee=self.employee, date=date(2026, 3, day), start_time=time(17, 0),
+                    end_time=time(17 + approved, 0), hours_requested=approved, reason='Release', status='APPROVED'
+                )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get_statuses(self):
+        return list(AttendanceRecord.objects.order_by('date').values_list('overtime_status', 'payable_overtime_hours'))
+
+    def test_preview_writes_nothing(self):
+        before = self.get_statuses()
+
+        response = self.client.post('/api/payroll/payrolls/calculate_preview/', {
+            'employee_id': self.employee.id, 'payroll_period_id': self.period.id
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['overtime_hours']), Decimal('3.00'))
+        self.assertEqual(self.get_statuses(), before)
+        self.assertFalse(Payroll.objects.exists())
+
+    def test_calculation_reconciles(self):
+        response = self.client.post('/api/payroll/payrolls/calculate_bulk/', {
+            'payroll_period_id': self.period.id, 'employee_ids': [self.employee.id]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Payroll.objects.get(employee=self.employee).overtime_hours, Decimal('3.00'))
+        self.assertEqual(self.get_statuses(), [
+            ('MATCHED', Decimal('2.00')), ('CAPPED', Decimal('1.00')),
+            ('UNAPPROVED', Decimal('0.00')), ('UNDER', Decimal('0.00'))
+        ])
 
-# Create your tests here.
+        # Reconciled records are left alone, and a preview now agrees with the payroll
+        self.assertEqual(OvertimeReconciler(date(2026, 3, 1), date(2026, 3, 31)).run()['records_updated'], 0)
+        attendance_data = PayrollCalculator(self.employee, self.period).get_attendance_data(preview=True)
+        self.assertEqual(attendance_data['overtime_hours'], Decimal('3.00'))
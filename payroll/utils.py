@@ -1,9 +1,28 @@
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime, timedelta
+from contextlib import contextmanager, nullcontext
+import csv
+import io
+import time
+import uuid
+from datetime import datetime, timedelta, date
+import calendar
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum, Count
-from .models import TaxSlab, DeductionType, BonusType
-from attendance.models import AttendanceRecord, LeaveApplication
+from django.db import connections, transaction
+from django.db.models import Sum, Count, Min, Q, F, Case, When, Value, FloatField, IntegerField
+from .models import TaxSlab, DeductionType, BonusType, Holiday
+from attendance.models import AttendanceRecord, AttendanceDeletion
+from attendance.utils import (
+    OvertimeReconciler, summarize_attendance, empty_attendance_summary, get_leave_balances
+)
+
+# Pay punched overtime as recorded instead of capping it at approved overtime requests
+PAYROLL_PAY_UNAPPROVED_OVERTIME = getattr(settings, 'PAYROLL_PAY_UNAPPROVED_OVERTIME', False)
+
+# Weekday weekly and bi-weekly periods start on, Monday = 0
+PAYROLL_WEEK_START = getattr(settings, 'PAYROLL_WEEK_START', 0)
+# Bi-weekly periods repeat every 14 days from the first week start on or after this date
+PAYROLL_CYCLE_ANCHOR = getattr(settings, 'PAYROLL_CYCLE_ANCHOR', date(2000, 1, 1))
 
 
 class PayrollCalculator:
@@ -16,6 +35,10 @@ class PayrollCalculator:
     
     def calculate_working_days(self):
         """Calculate total working days in the payroll period"""
+        # Use the working days precomputed from the holiday calendar when available
+        if self.payroll_period.working_days is not None:
+            return self.payroll_period.working_days
+        
         total_days = (self.payroll_period.end_date - self.payroll_period.start_date).days + 1
         
         # For simplicity, assume 5 working days per week (Monday to Friday)
@@ -31,40 +54,30 @@ class PayrollCalculator:
         
         return working_days
     
-    def get_attendance_data(self):
+    def get_attendance_data(self, preview=False):
         """Get attendance data for the employee in the payroll period"""
-        attendance_records = AttendanceRecord.objects.filter(
-            employee=self.employee,
-            date__gte=self.payroll_period.start_date,
-            date__lte=self.payroll_period.end_date
-        )
-        
-        # Calculate attendance metrics
-        total_records = attendance_records.count()
-        present_days = attendance_records.filter(status='PRESENT').count()
-        absent_days = attendance_records.filter(status='ABSENT').count()
-        leave_days = attendance_records.filter(status='LEAVE').count()
-        
-        # Calculate hours
-        total_hours = attendance_records.aggregate(
-            total=Sum('total_hours')
-        )['total'] or Decimal('0.00')
-        
-        regular_hours = attendance_records.aggregate(
-            total=Sum('regular_hours')
-        )['total'] or Decimal('0.00')
+        # Read whole months from the monthly rollups instead of re-aggregating records
+        summary = summarize_attendance(
+            self.payroll_period.start_date,
+            self.payroll_period.end_date,
+            [self.employee.id]
+        ).get(self.employee.id) or empty_attendance_summary()
         
-        overtime_hours = attendance_records.aggregate(
-            total=Sum('overtime_hours')
-        )['total'] or Decimal('0.00')
+        if preview and not PAYROLL_PAY_UNAPPROVED_OVERTIME:
+            # Reconciling writes the records, a preview adds what it would change instead
+            summary['payable_overtime_hours'] += OvertimeReconciler(
+                self.payroll_period.start_date, self.payroll_period.end_date, [self.employee.id]
+            ).get_payable_changes().get(self.employee.id, Decimal('0.00'))
         
         return {
-            'days_worked': present_days,
-            'days_absent': absent_days,
-            'days_on_leave': leave_days,
-            'regular_hours': regular_hours,
-            'overtime_hours': overtime_hours,
-            'total_hours': total_hours
+            'days_worked': summary['present_days'],
+            'days_absent': summary['absent_days'],
+            'days_on_leave': summary['leave_days'],
+            'regular_hours': summary['regular_hours'],
+            'overtime_hours': summary[
+                'overtime_hours' if PAYROLL_PAY_UNAPPROVED_OVERTIME else 'payable_overtime_hours'
+            ],
+            'total_hours': summary['total_hours']
         }
     
     def calculate_base_salary(self, attendance_data):
@@ -216,14 +229,15 @@ class PayrollCalculator:
         return total_tax.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     
     def calculate_net_salary(self, gross_salary, overtime_amount, total_bonuses, 
-                           total_deductions, tax_amount):
+                           total_deductions, tax_amount, adjustment_amount=Decimal('0.00')):
         """Calculate final net salary"""
         net_salary = (
             gross_salary + 
             overtime_amount + 
             total_bonuses - 
             total_deductions - 
-            tax_amount
+            tax_amount +
+            adjustment_amount
         )
         
         # Ensure net salary is not negative
@@ -231,18 +245,72 @@ class PayrollCalculator:
             Decimal('0.01'), rounding=ROUND_HALF_UP
         )
     
+    def calculate_adjustments(self):
+        """Calculate total retroactive adjustments payable in this period"""
+        from .models import PayrollAdjustment
+        
+        total_adjustments = PayrollAdjustment.objects.filter(
+            employee=self.employee,
+            target_period=self.payroll_period
+        ).aggregate(total=Sum('net_delta'))['total'] or Decimal('0.00')
+        
+        return total_adjustments.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    def recompute_payroll(self, payroll, mandatory_deduction_types):
+        """Recompute a payroll's amounts in memory without saving anything"""
+        attendance_data = self.get_attendance_data()
+        gross_salary = self.calculate_base_salary(attendance_data)
+        overtime_amount = self.calculate_overtime_amount(attendance_data)
+        
+        total_bonuses = Decimal('0.00')
+        taxable_income = gross_salary + overtime_amount
+        for bonus in payroll.bonuses.all():
+            total_bonuses += bonus.amount
+            if bonus.bonus_type.is_taxable:
+                taxable_income += bonus.amount
+        
+        # Manual deductions are kept, mandatory ones follow the recomputed gross salary
+        total_deductions = Decimal('0.00')
+        applied_types = set()
+        for deduction in payroll.deductions.all():
+            amount = deduction.amount
+            if deduction.deduction_type.is_mandatory:
+                amount = self.calculate_deduction_amount(deduction.deduction_type, gross_salary)
+            applied_types.add(deduction.deduction_type_id)
+            total_deductions += amount
+            if not deduction.deduction_type.is_taxable:
+                taxable_income -= amount
+        
+        for deduction_type in mandatory_deduction_types:
+            if deduction_type.id not in applied_types:
+                amount = self.calculate_deduction_amount(deduction_type, gross_salary)
+                if amount > 0:
+                    total_deductions += amount
+                    if not deduction_type.is_taxable:
+                        taxable_income -= amount
+        
+        tax_amount = self.calculate_tax(taxable_income)
+        
+        return {
+            'gross_salary': gross_salary,
+            'overtime_amount': overtime_amount,
+            'total_deductions': total_deductions.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            'tax_amount': tax_amount,
+            'net_salary': self.calculate_net_salary(
+                gross_salary, overtime_amount, total_bonuses, total_deductions,
+                tax_amount, payroll.adjustment_amount
+            )
+        }
+    
     def get_leave_balance(self):
         """Get employee's leave balance"""
         current_year = timezone.now().year
         
-        # Calculate used leave days for current year
-        used_leaves = LeaveApplication.objects.filter(
-            employee=self.employee,
-            status='APPROVED',
-            start_date__year=current_year
-        ).aggregate(
-            total_days=Sum('total_days')
-        )['total_days'] or 0
+        # Used days come from the maintained leave ledger balances
+        used_leaves = sum(
+            (balance.used for balance in get_leave_balances(self.employee, current_year)),
+            Decimal('0.00')
+        )
         
         return {
             'annual_leave_balance': self.employee.annual_leave_balance,
@@ -252,6 +320,374 @@ class PayrollCalculator:
         }
 
 
+def reconcile_period_overtime(payroll_period, employee_ids=None):
+    """Cap the period's punched overtime at approved requests before payrolls read it"""
+    if PAYROLL_PAY_UNAPPROVED_OVERTIME:
+        return None
+    
+    return OvertimeReconciler(payroll_period.start_date, payroll_period.end_date, employee_ids).run()
+
+
+def calculate_payroll_locked(payroll_id, recalculate=False, instrumentation=None):
+    """Calculate a payroll while holding its row lock
+    
+    Rows locked by a concurrent run are skipped instead of waited on, so
+    parallel runs over overlapping employees split the work between them.
+    Returns a (payroll, outcome) tuple where outcome is one of 'calculated',
+    'locked', 'exists' or 'finalized'.
+    """
+    from .models import Payroll
+    
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
+    
+    with transaction.atomic():
+        with instrumentation.stage('lock'):
+            payrolls = Payroll.objects.select_related('employee', 'payroll_period')
+            
+            # Lock only the payroll row, backends without FOR UPDATE OF lock the joined rows too
+            if connections[payrolls.db].features.has_select_for_update_of:
+                payrolls = payrolls.select_for_update(skip_locked=True, of=('self',))
+            else:
+                payrolls = payrolls.select_for_update(skip_locked=True)
+            
+            payroll = payrolls.filter(pk=payroll_id).first()
+        
+        if payroll is None:
+            return None, 'locked'
+        
+        # Re-check state under the lock, another run may have finished this row
+        if payroll.status in ['APPROVED', 'PAID']:
+            return payroll, 'finalized'
+        
+        if payroll.calculated_at and not recalculate:
+            return payroll, 'exists'
+        
+        payroll.calculate_salary(instrumentation=instrumentation)
+    
+    return payroll, 'calculated'
+
+
+class RetroPayCalculator:
+    """Utility class for computing retroactive adjustments of finalized payrolls"""
+    
+    DELTA_FIELDS = ['gross_delta', 'overtime_delta', 'deduction_delta', 'tax_delta', 'net_delta']
+    
+    def __init__(self, target_period, created_by=None):
+        self.target_period = target_period
+        self.created_by = created_by
+    
+    def find_affected(self, since=None, employee_ids=None, date_from=None, date_to=None):
+        """Get {period_id: {employee_id, ...}} for finalized periods touched by a change
+        
+        Attendance corrections are detected from records updated or deleted since
+        the given time. Salary changes have no history, so they are passed explicitly as
+        employee IDs with the date range the change applies to.
+        """
+        from .models import PayrollPeriod
+        
+        periods = list(
+            PayrollPeriod.objects.filter(is_finalized=True)
+            .exclude(id=self.target_period.id)
+            .order_by('start_date')
+        )
+        if not periods:
+            return {}
+        
+        affected = {}
+        
+        if since:
+            corrections = AttendanceRecord.objects.filter(
+                updated_at__gte=since,
+                date__gte=periods[0].start_date,
+                date__lte=periods[-1].end_date
+            ).order_by().values_list('employee_id', 'date')
+            deletions = AttendanceDeletion.objects.filter(
+                deleted_at__gte=since,
+                date__gte=periods[0].start_date,
+                date__lte=periods[-1].end_date
+            ).order_by().values_list('employee_id', 'date')
+            
+            for employee_id, record_date in corrections.union(deletions):
+                for period in periods:
+                    if period.start_date <= record_date <= period.end_date:
+                        affected.setdefault(period.id, set()).add(employee_id)
+        
+        if employee_ids:
+            for period in periods:
+                if date_from and period.end_date < date_from:
+                    continue
+                if date_to and period.start_date > date_to:
+                    continue
+                affected.setdefault(period.id, set()).update(employee_ids)
+        
+        return affected
+    
+    def get_payrolls(self, affected):
+        """Get the frozen payrolls for the affected employees and periods in one query"""
+        from .models import Payroll
+        
+        if not affected:
+            return []
+        
+        condition = Q()
+        for period_id, employee_ids in affected.items():
+            condition |= Q(payroll_period_id=period_id, employee_id__in=employee_ids)
+        
+        return Payroll.objects.filter(
+            condition, status__in=['APPROVED', 'PAID']
+        ).select_related('employee', 'payroll_period').prefetch_related(
+            'bonuses__bonus_type', 'deductions__deduction_type'
+        )
+    
+    def get_raised_deltas(self, payrolls):
+        """Get {source_payroll_id: {field: total}} already raised in other periods"""
+        from .models import PayrollAdjustment
+        
+        rows = PayrollAdjustment.objects.filter(
+            source_payroll__in=payrolls
+        ).exclude(
+            target_period=self.target_period
+        ).values('source_payroll_id').annotate(
+            **{field: Sum(field) for field in self.DELTA_FIELDS}
+        )
+        
+        return {
+            row['source_payroll_id']: {field: row[field] for field in self.DELTA_FIELDS}
+            for row in rows
+        }
+    
+    def run(self, reason='', **filters):
+        """Recompute affected payrolls and upsert adjustments in the target period"""
+        from .models import Payroll, PayrollAdjustment
+        
+        payrolls = list(self.get_payrolls(self.find_affected(**filters)))
+        mandatory_deduction_types = list(
+            DeductionType.objects.filter(is_mandatory=True, is_active=True)
+        )
+        raised = self.get_raised_deltas(payrolls)
+        
+        existing = {
+            adjustment.source_payroll_id: adjustment
+            for adjustment in PayrollAdjustment.objects.filter(
+                source_payroll__in=payrolls,
+                target_period=self.target_period
+            )
+        }
+        
+        to_create = []
+        to_update = []
+        for payroll in payrolls:
+            calculator = PayrollCalculator(payroll.employee, payroll.payroll_period)
+            # Tax slabs effective at the end of the original period apply
+            calculator.calculation_date = payroll.payroll_period.end_date
+            recomputed = calculator.recompute_payroll(payroll, mandatory_deduction_types)
+            
+            deltas = {
+                'gross_delta': recomputed['gross_salary'] - payroll.gross_salary,
+                'overtime_delta': recomputed['overtime_amount'] - payroll.overtime_amount,
+                'deduction_delta': recomputed['total_deductions'] - payroll.total_deductions,
+                'tax_delta': recomputed['tax_amount'] - payroll.tax_amount,
+                'net_delta': recomputed['net_salary'] - payroll.net_salary,
+            }
+            
+            # Arrears raised in earlier runs against other periods are already being paid
+            for field, value in raised.get(payroll.id, {}).items():
+                deltas[field] -= value
+            
+            adjustment = existing.get(payroll.id)
+            if adjustment:
+                for field, value in deltas.items():
+                    setattr(adjustment, field, value)
+                adjustment.reason = reason or adjustment.reason
+                # bulk_update skips auto_now
+                adjustment.updated_at = timezone.now()
+                to_update.append(adjustment)
+            elif any(deltas.values()):
+                to_create.append(PayrollAdjustment(
+                    employee=payroll.employee,
+                    source_payroll=payroll,
+                    target_period=self.target_period,
+                    reason=reason or f"Retroactive adjustment for {payroll.payroll_period.name}",
+                    created_by=self.created_by,
+                    **deltas
+                ))
+        
+        with transaction.atomic():
+            PayrollAdjustment.objects.bulk_create(to_create)
+            PayrollAdjustment.objects.bulk_update(
+                to_update, self.DELTA_FIELDS + ['reason', 'updated_at']
+            )
+            
+            # Calculated payrolls of the target period only pick adjustments up on recalculation
+            stale = Payroll.objects.filter(
+                payroll_period=self.target_period,
+                employee_id__in={adjustment.employee_id for adjustment in to_create + to_update},
+                status__in=['DRAFT', 'CALCULATED']
+            ).update(is_stale=True)
+        
+        return {
+            'payrolls_checked': len(payrolls),
+            'created': to_create,
+            'updated': to_update,
+            'payrolls_marked_stale': stale,
+        }
+
+
+class PayrollAnomalyDetector:
+    """Utility class for flagging payrolls that deviate from an employee's history"""
+    
+    METRICS = ['net_salary', 'gross_salary', 'overtime_amount', 'tax_amount']
+    # Employees whose last values are looked up by ID rather than by scanning their period
+    LAST_VALUE_BATCH = 500
+    
+    def __init__(self, payroll_period, history_periods=24, z_threshold=3.0,
+                 jump_threshold=0.5, min_history=3):
+        self.payroll_period = payroll_period
+        self.history_periods = history_periods
+        self.z_threshold = z_threshold
+        self.jump_threshold = jump_threshold
+        self.min_history = min_history
+    
+    def get_history_period_ids(self):
+        """Get IDs of the preceding periods of the same type"""
+        from .models import PayrollPeriod
+        
+        return list(
+            PayrollPeriod.objects.filter(
+                period_type=self.payroll_period.period_type,
+                end_date__lt=self.payroll_period.start_date
+            ).order_by('-start_date').values_list('id', flat=True)[:self.history_periods]
+        )
+    
+    def load_history(self):
+        """Get count, sum, sum of squares and last value per employee and metric
+        
+        The sums are grouped in the database, so the history comes back as one
+        row per employee however many periods are scanned. Last values are read
+        one period at a time, usually only the latest one.
+        """
+        from .models import Payroll
+        
+        period_ids = self.get_history_period_ids()
+        rows = Payroll.objects.filter(payroll_period_id__in=period_ids).exclude(status='DRAFT')
+        
+        # Position of the period in the history, 0 for the latest, without joining the periods
+        recency = Case(
+            *[When(payroll_period_id=period_id, then=Value(index)) for index, period_id in enumerate(period_ids)],
+            output_field=IntegerField()
+        )
+        totals = rows.order_by().values('employee_id').annotate(
+            history_count=Count('id'),
+            last_recency=Min(recency),
+            **{
+                f'{metric}_sum': Sum(metric, output_field=FloatField())
+                for metric in self.METRICS
+            },
+            **{
+                f'{metric}_squares': Sum(F(metric) * F(metric), output_field=FloatField())
+                for metric in self.METRICS
+            }
+        )
+        totals = {row['employee_id']: row for row in totals.iterator(chunk_size=5000)}
+        
+        employees_by_recency = {}
+        for employee_id, row in totals.items():
+            employees_by_recency.setdefault(row['last_recency'], set()).add(employee_id)
+        
+        last_values = {}
+        for index, employee_ids in employees_by_recency.items():
+            latest = rows.filter(payroll_period_id=period_ids[index])
+            if len(employee_ids) <= self.LAST_VALUE_BATCH:
+                latest = latest.filter(employee_id__in=employee_ids)
+            for row in latest.values_list('employee_id', *self.METRICS).iterator(chunk_size=5000):
+                if row[0] in employee_ids:
+                    last_values[row[0]] = row[1:]
+        
+        history = {}
+        for employee_id, row in totals.items():
+            stats = history[employee_id] = []
+            for metric, last in zip(self.METRICS, last_values[employee_id]):
+                stats += [
+                    row['history_count'],
+                    float(row[f'{metric}_sum']),
+                    float(row[f'{metric}_squares']),
+                    float(last),
+                ]
+        
+        return history
+    
+    def score(self, value, count, total, total_squares, last):
+        """Get the z-score and relative change of a value against its history"""
+        mean = total / count
+        variance = max(total_squares / count - mean * mean, 0.0)
+        std = variance ** 0.5
+        
+        # A flat history makes any change infinitely unlikely, leave it to the jump check
+        z_score = (value - mean) / std if std > 1e-9 else None
+        change = (value - last) / abs(last) if last else None
+        
+        return mean, z_score, change
+    
+    def detect(self):
+        """Get the anomalies of the period's calculated payrolls"""
+        from .models import Payroll
+        
+        history = self.load_history()
+        current = Payroll.objects.filter(
+            payroll_period=self.payroll_period
+        ).exclude(status='DRAFT').values_list(
+            'id', 'employee_id', 'employee__employee_id', 'employee__first_name',
+            'employee__last_name', 'status', *self.METRICS
+        )
+        
+        anomalies = []
+        scanned = 0
+        for row in current.iterator(chunk_size=5000):
+            scanned += 1
+            stats = history.get(row[1])
+            if stats is None or stats[0] < self.min_history:
+                continue
+            
+            flags = []
+            for index, metric in enumerate(self.METRICS):
+                value = float(row[index + 6])
+                count, total, total_squares, last = stats[index * 4:index * 4 + 4]
+                mean, z_score, change = self.score(value, count, total, total_squares, last)
+                
+                if (z_score is not None and abs(z_score) >= self.z_threshold) or \
+                        (change is not None and abs(change) >= self.jump_threshold):
+                    flags.append({
+                        'metric': metric,
+                        'value': round(value, 2),
+                        'mean': round(mean, 2),
+                        'previous': round(last, 2),
+                        'z_score': round(z_score, 2) if z_score is not None else None,
+                        'change_percentage': round(change * 100, 1) if change is not None else None,
+                    })
+            
+            if flags:
+                anomalies.append({
+                    'payroll_id': row[0],
+                    'employee_id': row[2],
+                    'employee_name': f"{row[3]} {row[4]}".strip(),
+                    'status': row[5],
+                    'history_periods': stats[0],
+                    'flags': flags,
+                })
+        
+        anomalies.sort(
+            key=lambda anomaly: max(abs(flag['z_score'] or 0) for flag in anomaly['flags']),
+            reverse=True
+        )
+        
+        return {
+            'payrolls_scanned': scanned,
+            'employees_with_history': len(history),
+            'anomaly_count': len(anomalies),
+            'anomalies': anomalies,
+        }
+
+
 class PayrollReportGenerator:
     """Utility class for generating payroll reports"""
     
@@ -338,6 +774,397 @@ class PayrollReportGenerator:
         }
 
 
+class BankPaymentFileGenerator:
+    """Utility class for generating bank transfer files for approved payrolls"""
+    
+    FILE_FORMATS = ['CSV', 'FIXED']
+    CHUNK_SIZE = 2000
+    
+    def __init__(self, payroll_period, file_format='CSV'):
+        if file_format not in self.FILE_FORMATS:
+            raise ValueError(f"Unsupported bank file format: {file_format}")
+        
+        self.payroll_period = payroll_period
+        self.file_format = file_format
+        self.generated_at = timezone.now()
+        self.payment_batch = None
+    
+    @property
+    def filename(self):
+        """Get file name for the bank transfer file"""
+        extension = 'csv' if self.file_format == 'CSV' else 'txt'
+        return (
+            f"bank_transfer_{self.payroll_period.start_date:%Y%m%d}_"
+            f"{self.payroll_period.end_date:%Y%m%d}.{extension}"
+        )
+    
+    def get_queryset(self):
+        """Get payrolls included in the file"""
+        from .models import Payroll
+        
+        if self.payment_batch:
+            # Only the payrolls marked as paid by this run
+            payrolls = Payroll.objects.filter(
+                payroll_period=self.payroll_period,
+                status='PAID',
+                payment_batch=self.payment_batch
+            )
+        else:
+            payrolls = Payroll.objects.filter(
+                payroll_period=self.payroll_period,
+                status='APPROVED'
+            )
+        
+        return payrolls.order_by('employee__employee_id').values_list(
+            'id', 'employee_id', 'employee__employee_id',
+            'employee__first_name', 'employee__last_name', 'net_salary'
+        )
+    
+    def check_amounts(self):
+        """Raise ValueError when a payroll in the file has a negative net salary"""
+        negative = list(
+            self.get_queryset().filter(net_salary__lt=0).values_list('employee__employee_id', flat=True)[:10]
+        )
+        if negative:
+            raise ValueError(
+                f"Negative net salaries cannot be paid by bank transfer: {', '.join(negative)}."
+            )
+    
+    def mark_as_paid(self, performed_by, notes=''):
+        """Mark all approved payrolls of the period as paid in one transaction"""
+        from .models import Payroll, PayrollHistory
+        
+        with transaction.atomic():
+            paid_at = timezone.now()
+            payment_batch = uuid.uuid4().hex
+            payrolls = Payroll.objects.select_for_update().filter(
+                payroll_period=self.payroll_period,
+                status='APPROVED'
+            )
+            payroll_ids = list(payrolls.values_list('id', flat=True))
+            self.check_amounts()
+            
+            Payroll.objects.filter(id__in=payroll_ids).update(
+                status='PAID',
+                paid_at=paid_at,
+                payment_batch=payment_batch,
+                updated_at=paid_at
+            )
+            
+            PayrollHistory.objects.bulk_create([
+                PayrollHistory(
+                    payroll_id=payroll_id,
+                    action='PAID',
+                    performed_by=performed_by,
+                    notes=notes or 'Included in bank transfer file'
+                )
+                for payroll_id in payroll_ids
+            ], batch_size=self.CHUNK_SIZE)
+        
+        self.payment_batch = payment_batch
+        return len(payroll_ids)
+    
+    def stream(self):
+        """Yield the bank transfer file line by line"""
+        record_count = 0
+        control_total = Decimal('0.00')
+        # Hash total of employee numbers, used by banks to detect altered files
+        hash_total = 0
+        
+        yield self.format_header()
+        
+        for row in self.get_queryset().iterator(chunk_size=self.CHUNK_SIZE):
+            payroll_id, employee_pk, employee_code, first_name, last_name, net_salary = row
+            net_salary = net_salary or Decimal('0.00')
+            
+            record_count += 1
+            control_total += net_salary
+            hash_total += self.employee_number(employee_code)
+            
+            yield self.format_record(
+                payroll_id, employee_code, f"{first_name} {last_name}".strip(), net_salary
+            )
+        
+        yield self.format_trailer(record_count, control_total, hash_total)
+    
+    def format_header(self):
+        """Format the file header line"""
+        if self.file_format == 'CSV':
+            return self.format_csv_row(['record_type', 'payroll_id', 'employee_id', 'employee_name', 'amount'])
+        
+        return (
+            'H'
+            f"{self.payroll_period.name[:30]:<30}"
+            f"{self.payroll_period.pay_date:%Y%m%d}"
+            f"{self.generated_at:%Y%m%d%H%M%S}"
+            '\n'
+        )
+    
+    def format_record(self, payroll_id, employee_code, employee_name, amount):
+        """Format a single payment record"""
+        if amount < 0:
+            raise ValueError(f"Negative net salary for {employee_code} cannot be paid by bank transfer.")
+        
+        if self.file_format == 'CSV':
+            return self.format_csv_row(['D', payroll_id, employee_code, employee_name, f'{amount:.2f}'])
+        
+        # Line breaks in a field would split the fixed-width record
+        employee_code = ' '.join(employee_code.split())
+        employee_name = ' '.join(employee_name.split())
+        return (
+            'D'
+            f"{payroll_id:010d}"
+            f"{employee_code[:20]:<20}"
+            f"{employee_name[:35]:<35}"
+            f"{self.to_cents(amount):015d}"
+            '\n'
+        )
+    
+    def format_trailer(self, record_count, control_total, hash_total):
+        """Format the trailer line with control and hash totals"""
+        if self.file_format == 'CSV':
+            return self.format_csv_row(['T', record_count, '', hash_total, f'{control_total:.2f}'])
+        
+        return (
+            'T'
+            f"{record_count:010d}"
+            f"{self.to_cents(control_total):018d}"
+            f"{hash_total % 10 ** 18:018d}"
+            '\n'
+        )
+    
+    @staticmethod
+    def format_csv_row(values):
+        """Format a CSV line, quoting and escaping fields as needed"""
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerow(values)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def employee_number(employee_code):
+        """Get the numeric part of an employee code, e.g. 42 for EMP0042"""
+        digits = ''.join(character for character in employee_code if character.isdigit())
+        return int(digits) if digits else 0
+    
+    @staticmethod
+    def to_cents(amount):
+        """Convert a currency amount to integer cents"""
+        return int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class PayrollCalendarGenerator:
+    """Utility class for generating a whole year of payroll periods"""
+    
+    def __init__(self, year, period_type, pay_date_offset=0, week_start=None):
+        self.year = year
+        self.period_type = period_type
+        self.pay_date_offset = pay_date_offset
+        self.week_start = PAYROLL_WEEK_START if week_start is None else week_start
+        self.year_start = date(year, 1, 1)
+        self.year_end = date(year, 12, 31)
+    
+    def get_first_cycle_start(self, length):
+        """Get the first day of the year on the weekly or bi-weekly cycle"""
+        anchor = PAYROLL_CYCLE_ANCHOR + timedelta(days=(self.week_start - PAYROLL_CYCLE_ANCHOR.weekday()) % 7)
+        return self.year_start + timedelta(days=(anchor - self.year_start).days % length)
+    
+    def get_period_ranges(self):
+        """Get (name, start_date, end_date) for every period starting in the year"""
+        ranges = []
+        
+        if self.period_type == 'MONTHLY':
+            for month in range(1, 13):
+                _, last_day = calendar.monthrange(self.year, month)
+                ranges.append((
+                    f"{calendar.month_name[month]} {self.year}",
+                    date(self.year, month, 1),
+                    date(self.year, month, last_day)
+                ))
+        
+        elif self.period_type == 'QUARTERLY':
+            for quarter in range(4):
+                start_month = quarter * 3 + 1
+                _, last_day = calendar.monthrange(self.year, start_month + 2)
+                ranges.append((
+                    f"Q{quarter + 1} {self.year}",
+                    date(self.year, start_month, 1),
+                    date(self.year, start_month + 2, last_day)
+                ))
+        
+        elif self.period_type in ['WEEKLY', 'BI_WEEKLY']:
+            length = 7 if self.period_type == 'WEEKLY' else 14
+            label = 'Week' if self.period_type == 'WEEKLY' else 'Bi-Week'
+            start_date = self.get_first_cycle_start(length)
+            number = 1
+            
+            # Periods keep their full length, the days before the first start belong
+            # to the last period of the previous year, which runs into January
+            while start_date <= self.year_end:
+                end_date = start_date + timedelta(days=length - 1)
+                ranges.append((f"{label} {number} {self.year}", start_date, end_date))
+                start_date = end_date + timedelta(days=1)
+                number += 1
+        
+        else:
+            raise ValueError(f"Unsupported period type: {self.period_type}")
+        
+        return ranges
+    
+    def get_holidays(self, start_date, end_date):
+        """Get active holiday dates of a date range in one query"""
+        return set(
+            Holiday.objects.filter(
+                is_active=True,
+                date__gte=start_date,
+                date__lte=end_date
+            ).values_list('date', flat=True)
+        )
+    
+    def build_periods(self):
+        """Build unsaved payroll periods with precomputed working days"""
+        from .models import PayrollPeriod
+        
+        ranges = self.get_period_ranges()
+        holidays = self.get_holidays(ranges[0][1], ranges[-1][2])
+        
+        return [
+            PayrollPeriod(
+                name=name,
+                period_type=self.period_type,
+                start_date=start_date,
+                end_date=end_date,
+                pay_date=end_date + timedelta(days=self.pay_date_offset),
+                working_days=count_working_days(start_date, end_date, holidays)
+            )
+            for name, start_date, end_date in ranges
+        ]
+    
+    def find_conflicts(self, periods):
+        """Get periods overlapping existing periods in one query"""
+        from .models import PayrollPeriod
+        
+        existing = list(
+            PayrollPeriod.objects.filter(
+                start_date__lte=max(period.end_date for period in periods),
+                end_date__gte=min(period.start_date for period in periods)
+            ).values_list('start_date', 'end_date')
+        )
+        
+        return [
+            period for period in periods
+            if any(
+                period.start_date <= end_date and start_date <= period.end_date
+                for start_date, end_date in existing
+            )
+        ]
+    
+    def generate(self, skip_existing=False):
+        """Create all periods of the year with a single bulk insert"""
+        from .models import PayrollPeriod
+        
+        periods = self.build_periods()
+        conflicts = self.find_conflicts(periods)
+        
+        if conflicts and not skip_existing:
+            raise ValueError(
+                "Payroll periods already exist for: " +
+                ", ".join(period.name for period in conflicts)
+            )
+        
+        periods = [period for period in periods if period not in conflicts]
+        
+        with transaction.atomic():
+            created = PayrollPeriod.objects.bulk_create(periods)
+        
+        return created, conflicts
+
+
+class QueryCounter:
+    """Context manager counting the queries executed on a database connection"""
+    
+    def __init__(self, using='default'):
+        self.using = using
+        self.count = 0
+        self._wrapper = None
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+    
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+
+
+class PayrollInstrumentation:
+    """Collects wall time and query counts per payroll calculation stage"""
+    
+    enabled = True
+    
+    def __init__(self):
+        self.stages = {}
+    
+    @contextmanager
+    def stage(self, name):
+        """Time a stage and count the queries it runs"""
+        with QueryCounter() as counter:
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - started
+                stage = self.stages.setdefault(
+                    name, {'calls': 0, 'wall_time': 0.0, 'queries': 0}
+                )
+                stage['calls'] += 1
+                stage['wall_time'] += elapsed
+                stage['queries'] += counter.count
+    
+    def as_dict(self):
+        """Get the aggregated stage metrics"""
+        return {
+            name: {
+                'calls': stage['calls'],
+                'wall_time': round(stage['wall_time'], 4),
+                'queries': stage['queries'],
+            }
+            for name, stage in self.stages.items()
+        }
+    
+    def log(self, logger, label):
+        """Write the aggregated stage metrics to a logger"""
+        for name, stage in self.as_dict().items():
+            logger.info(
+                "%s stage %s: %s calls, %.4fs, %s queries",
+                label, name, stage['calls'], stage['wall_time'], stage['queries']
+            )
+
+
+class NullInstrumentation:
+    """No-op instrumentation used when timing is disabled"""
+    
+    enabled = False
+    
+    def stage(self, name):
+        """Return a shared no-op context manager"""
+        return NULL_STAGE
+    
+    def as_dict(self):
+        """Return no metrics"""
+        return {}
+    
+    def log(self, logger, label):
+        """Log nothing"""
+
+
+NULL_STAGE = nullcontext()
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
 def round_currency(amount):
     """Round currency amount to 2 decimal places"""
     if amount is None:
@@ -373,3 +1200,60 @@ def get_pay_frequency_multiplier(frequency):
     }
     return multipliers.get(frequency, 12)  # Default to monthly
 
+
+def count_working_days(start_date, end_date, holidays=None):
+    """Count weekdays between two dates, excluding the given holiday dates"""
+    holidays = holidays or set()
+    working_days = 0
+    current_date = start_date
+    
+    while current_date <= end_date:
+        if current_date.weekday() < 5 and current_date not in holidays:
+            working_days += 1
+        current_date += timedelta(days=1)
+    
+    return working_days
+
+
+def refresh_period_working_days(dates):
+    """Recount working days of open periods covering the given dates and flag their payrolls stale"""
+    from .models import Payroll, PayrollPeriod
+    
+    if not dates:
+        return 0
+    
+    periods = [
+        period for period in PayrollPeriod.objects.filter(
+            is_finalized=False,
+            start_date__lte=max(dates),
+            end_date__gte=min(dates)
+        )
+        if any(period.start_date <= day <= period.end_date for day in dates)
+    ]
+    if not periods:
+        return 0
+    
+    holidays = set(
+        Holiday.objects.filter(
+            is_active=True,
+            date__gte=min(period.start_date for period in periods),
+            date__lte=max(period.end_date for period in periods)
+        ).values_list('date', flat=True)
+    )
+    
+    changed = []
+    for period in periods:
+        working_days = count_working_days(period.start_date, period.end_date, holidays)
+        if working_days != period.working_days:
+            period.working_days = working_days
+            changed.append(period)
+    
+    PayrollPeriod.objects.bulk_update(changed, ['working_days'])
+    
+    # Per-day salary and absence deductions of calculated payrolls depend on the working days
+    Payroll.objects.filter(
+        payroll_period__in=changed,
+        status__in=['DRAFT', 'CALCULATED']
+    ).update(is_stale=True)
+    
+    return len(changed)
@@ -2,13 +2,17 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Count, Sum, Avg, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
+import logging
 from .models import (
-    PayrollPeriod, TaxSlab, DeductionType, BonusType, Payroll,
+    PayrollPeriod, Holiday, TaxSlab, DeductionType, BonusType, Payroll,
     PayrollDeduction, PayrollBonus, PayrollHistory, PaySlip
 )
 from .serializers import (
@@ -16,12 +20,21 @@ from .serializers import (
     BonusTypeSerializer, PayrollListSerializer, PayrollDetailSerializer,
     PayrollCreateSerializer, PayrollCalculationSerializer, PayrollApprovalSerializer,
     PayrollHistorySerializer, PaySlipSerializer, PayrollStatsSerializer,
-    SalaryCalculationSerializer, SalaryCalculationResultSerializer
+    SalaryCalculationSerializer, SalaryCalculationResultSerializer, BankFileSerializer,
+    PayrollCalendarSerializer, HolidaySerializer, RetroAdjustmentSerializer,
+    PayrollAdjustmentSerializer
+)
+from .utils import (
+    BankPaymentFileGenerator, PayrollCalendarGenerator, PayrollInstrumentation,
+    NULL_INSTRUMENTATION, RetroPayCalculator, PayrollAnomalyDetector,
+    calculate_payroll_locked, reconcile_period_overtime, refresh_period_working_days
 )
 from employees.models import Employee
 from employees.permissions import CanManagePayroll, IsHROrManager
 from attendance.models import AttendanceRecord
 
+logger = logging.getLogger(__name__)
+
 
 class PayrollPeriodViewSet(viewsets.ModelViewSet):
     """ViewSet for PayrollPeriod CRUD operations"""
@@ -88,6 +101,100 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
         serializer = PayrollListSerializer(payrolls, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def anomalies(self, request, pk=None):
+        """Flag payrolls that deviate from each employee's history before approval"""
+        period = self.get_object()
+        
+        try:
+            detector = PayrollAnomalyDetector(
+                period,
+                history_periods=int(request.query_params.get('history_periods', 24)),
+                z_threshold=float(request.query_params.get('z_threshold', 3.0)),
+                jump_threshold=float(request.query_params.get('jump_threshold', 0.5)),
+                min_history=int(request.query_params.get('min_history', 3))
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Invalid anomaly detection parameters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(detector.detect())
+    
+    @action(detail=True, methods=['post'])
+    def bank_file(self, request, pk=None):
+        """Generate bank transfer file for approved payrolls"""
+        period = self.get_object()
+        serializer = BankFileSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            generator = BankPaymentFileGenerator(
+                period, serializer.validated_data['file_format']
+            )
+            
+            # The file is streamed, so amounts are checked before the first line is sent
+            try:
+                if serializer.validated_data['mark_paid']:
+                    paid_count = generator.mark_as_paid(
+                        request.user, serializer.validated_data.get('notes', '')
+                    )
+                else:
+                    generator.check_amounts()
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            if serializer.validated_data['mark_paid'] and not paid_count:
+                return Response(
+                    {'error': 'No approved payrolls found for this period.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            content_type = 'text/csv' if generator.file_format == 'CSV' else 'text/plain'
+            response = StreamingHttpResponse(generator.stream(), content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="{generator.filename}"'
+            return response
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def generate_calendar(self, request):
+        """Generate all payroll periods of a year in one bulk insert"""
+        serializer = PayrollCalendarSerializer(data=request.data)
+        
+        if serializer.is_valid():
+            generator = PayrollCalendarGenerator(
+                serializer.validated_data['year'],
+                serializer.validated_data['period_type'],
+                serializer.validated_data['pay_date_offset'],
+                serializer.validated_data.get('week_start')
+            )
+            
+            try:
+                created, skipped = generator.generate(
+                    skip_existing=serializer.validated_data['skip_existing']
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            return Response({
+                'message': f'Generated {len(created)} payroll periods.',
+                'created_count': len(created),
+                'skipped': [period.name for period in skipped],
+                'periods': [
+                    {
+                        'name': period.name,
+                        'start_date': period.start_date,
+                        'end_date': period.end_date,
+                        'pay_date': period.pay_date,
+                        'working_days': period.working_days
+                    }
+                    for period in created
+                ]
+            }, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Get current active payroll period"""
@@ -114,6 +221,39 @@ class PayrollPeriodViewSet(viewsets.ModelViewSet):
             )
 
 
+class HolidayViewSet(viewsets.ModelViewSet):
+    """ViewSet for Holiday CRUD operations"""
+    
+    queryset = Holiday.objects.all()
+    serializer_class = HolidaySerializer
+    permission_classes = [CanManagePayroll]
+    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    search_fields = ['name']
+    ordering_fields = ['date', 'name']
+    ordering = ['date']
+    filterset_fields = ['is_active', 'date']
+    
+    @transaction.atomic
+    def perform_create(self, serializer):
+        """Recount working days of the open periods covering the new holiday"""
+        holiday = serializer.save()
+        refresh_period_working_days([holiday.date])
+    
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """Recount working days of the open periods covering the old and new date"""
+        previous_date = serializer.instance.date
+        holiday = serializer.save()
+        refresh_period_working_days([previous_date, holiday.date])
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Recount working days of the open periods covering the removed holiday"""
+        holiday_date = instance.date
+        instance.delete()
+        refresh_period_working_days([holiday_date])
+
+
 class TaxSlabViewSet(viewsets.ModelViewSet):
     """ViewSet for TaxSlab CRUD operations"""
     
@@ -196,7 +336,7 @@ class PayrollViewSet(viewsets.ModelViewSet):
     ]
     ordering_fields = ['created_at', 'calculated_at', 'net_salary']
     ordering = ['-created_at']
-    filterset_fields = ['employee', 'payroll_period', 'status']
+    filterset_fields = ['employee', 'payroll_period', 'status', 'is_stale']
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
@@ -229,33 +369,72 @@ class PayrollViewSet(viewsets.ModelViewSet):
             payroll_period_id = serializer.validated_data['payroll_period_id']
             recalculate = serializer.validated_data.get('recalculate', False)
             
+            if serializer.validated_data.get('instrument') or getattr(settings, 'PAYROLL_INSTRUMENTATION', False):
+                instrumentation = PayrollInstrumentation()
+            else:
+                instrumentation = NULL_INSTRUMENTATION
+            
             try:
                 payroll_period = PayrollPeriod.objects.get(id=payroll_period_id)
                 
                 # Get employees to calculate for
                 if employee_ids:
-                    employees = Employee.objects.filter(id__in=employee_ids, is_active=True)
+                    employee_queryset = Employee.objects.filter(id__in=employee_ids, is_active=True)
                 else:
-                    employees = Employee.objects.filter(is_active=True)
+                    employee_queryset = Employee.objects.filter(is_active=True)
+                employees = list(employee_queryset.only('id', 'first_name', 'last_name'))
+                
+                with instrumentation.stage('prepare'):
+                    # Create missing payroll rows up front; concurrent runs ignore each other's inserts
+                    existing_ids = set(
+                        Payroll.objects.filter(
+                            payroll_period=payroll_period,
+                            employee__in=employee_queryset
+                        ).values_list('employee_id', flat=True)
+                    )
+                    Payroll.objects.bulk_create([
+                        Payroll(employee=employee, payroll_period=payroll_period, status='DRAFT')
+                        for employee in employees
+                        if employee.id not in existing_ids
+                    ], ignore_conflicts=True)
+                
+                with instrumentation.stage('overtime'):
+                    reconcile_period_overtime(payroll_period, employee_ids or None)
+                    payroll_ids = dict(
+                        Payroll.objects.filter(
+                            payroll_period=payroll_period,
+                            employee__in=employee_queryset
+                        ).values_list('employee_id', 'id')
+                    )
                 
                 results = []
                 errors = []
+                skipped = []
                 
                 for employee in employees:
+                    if employee.id in existing_ids and not recalculate:
+                        errors.append(f"Payroll already exists for {employee.get_full_name()}")
+                        continue
+                    
                     try:
-                        # Check if payroll already exists
-                        payroll, created = Payroll.objects.get_or_create(
-                            employee=employee,
-                            payroll_period=payroll_period,
-                            defaults={'status': 'DRAFT'}
+                        payroll, outcome = calculate_payroll_locked(
+                            payroll_ids[employee.id],
+                            recalculate=recalculate,
+                            instrumentation=instrumentation
                         )
                         
-                        if not created and not recalculate:
+                        if outcome == 'locked':
+                            # Another run holds this row and will calculate it
+                            skipped.append(employee.id)
+                            continue
+                        if outcome == 'exists':
                             errors.append(f"Payroll already exists for {employee.get_full_name()}")
                             continue
-                        
-                        # Calculate salary
-                        payroll.calculate_salary()
+                        if outcome == 'finalized':
+                            errors.append(
+                                f"Payroll for {employee.get_full_name()} is already {payroll.status.lower()}"
+                            )
+                            continue
                         
                         results.append({
                             'employee_id': employee.id,
@@ -268,10 +447,14 @@ class PayrollViewSet(viewsets.ModelViewSet):
                     except Exception as e:
                         errors.append(f"Error calculating for {employee.get_full_name()}: {str(e)}")
                 
+                instrumentation.log(logger, f'Payroll run for period {payroll_period.id}')
+                
                 return Response({
                     'message': f'Calculated payroll for {len(results)} employees.',
                     'results': results,
-                    'errors': errors
+                    'errors': errors,
+                    'skipped_locked': skipped,
+                    'instrumentation': instrumentation.as_dict()
                 })
                 
             except PayrollPeriod.DoesNotExist:
@@ -299,7 +482,8 @@ class PayrollViewSet(viewsets.ModelViewSet):
             try:
                 payrolls = Payroll.objects.filter(
                     id__in=payroll_ids,
-                    status='CALCULATED'
+                    status='CALCULATED',
+                    is_stale=False
                 )
                 
                 approved_count = 0
@@ -340,6 +524,12 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if payroll.is_stale:
+            return Response(
+                {'error': 'Attendance changed since calculation, recalculate the payroll first.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         payroll.approve(request.user)
         
         # Add history record
@@ -386,7 +576,19 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        payroll.calculate_salary()
+        reconcile_period_overtime(payroll.payroll_period, [payroll.employee_id])
+        payroll, outcome = calculate_payroll_locked(payroll.id, recalculate=True)
+        
+        if outcome == 'locked':
+            return Response(
+                {'error': 'Payroll is being calculated by another run.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        if outcome == 'finalized':
+            return Response(
+                {'error': 'Cannot recalculate approved or paid payrolls.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Add history record
         PayrollHistory.objects.create(
@@ -402,6 +604,54 @@ class PayrollViewSet(viewsets.ModelViewSet):
             'payroll': serializer.data
         })
     
+    @action(detail=False, methods=['post'])
+    def retro_adjust(self, request):
+        """Raise adjustments for finalized payrolls affected by retroactive changes"""
+        serializer = RetroAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        # Get target period, defaulting to the open period covering today
+        if data.get('target_period_id'):
+            target_period = PayrollPeriod.objects.filter(id=data['target_period_id']).first()
+        else:
+            today = timezone.now().date()
+            target_period = PayrollPeriod.objects.filter(
+                start_date__lte=today, end_date__gte=today
+            ).order_by('-start_date').first()
+        
+        if not target_period:
+            return Response(
+                {'error': 'Target payroll period not found.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if target_period.is_finalized:
+            return Response(
+                {'error': 'Adjustments can only be raised in an open payroll period.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        result = RetroPayCalculator(target_period, created_by=request.user).run(
+            reason=data.get('reason', ''),
+            since=data.get('since'),
+            employee_ids=data.get('employee_ids'),
+            date_from=data.get('date_from'),
+            date_to=data.get('date_to')
+        )
+        
+        adjustments = result['created'] + result['updated']
+        
+        return Response({
+            'message': f'{len(adjustments)} adjustments raised in {target_period.name}.',
+            'target_period': target_period.id,
+            'payrolls_checked': result['payrolls_checked'],
+            'created': len(result['created']),
+            'updated': len(result['updated']),
+            'payrolls_marked_stale': result['payrolls_marked_stale'],
+            'adjustments': PayrollAdjustmentSerializer(adjustments, many=True).data
+        })
+    
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
         """Get payroll history"""
@@ -448,8 +698,10 @@ class PayrollViewSet(viewsets.ModelViewSet):
                 if 'hourly_rate_override' in serializer.validated_data:
                     temp_payroll.hourly_rate = serializer.validated_data['hourly_rate_override']
                 
-                # Calculate without saving
-                temp_payroll.calculate_salary()
+                # Calculate without saving, the temporary payroll row is rolled back
+                with transaction.atomic():
+                    temp_payroll.calculate_salary(preview=True)
+                    transaction.set_rollback(True)
                 
                 # Add bonus/deduction overrides
                 bonus_amount = serializer.validated_data.get('bonus_amount', Decimal('0.00'))
@@ -9,8 +9,28 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import include, path
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payroll_backend.settings')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from attendance.views import presence_stream  # noqa: E402 (needs the app registry)
+
+# Long-lived Server-Sent Events streams are only routed here, they would tie up WSGI workers
+urlpatterns = [
+    path('api/attendance/presence/stream/', presence_stream, name='presence-stream'),
+    path('', include('payroll_backend.urls')),
+]
+
+
+class PayrollASGIHandler(ASGIHandler):
+    """ASGI handler resolving requests against the URLconf above"""
+
+    async def get_response_async(self, request):
+        request.urlconf = __name__
+        return await super().get_response_async(request)
+
+
+application = PayrollASGIHandler()
@@ -107,6 +107,29 @@ DATABASES = {
 # }
 
 
+# Cache
+# Attendance stats are invalidated by writes from every worker and from management
+# commands, so the cache must be shared between processes. The database cache needs
+# `python manage.py createcachetable`; set REDIS_CACHE_URL to use Redis instead.
+# Every stats version bump is a cache set, about 5 statements with the database cache;
+# set ATTENDANCE_STATS_CACHE to another CACHES alias to keep them off the database.
+
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
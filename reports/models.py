@@ -182,7 +182,7 @@ class AttendanceAnalytics(models.Model):
 
     def calculate_metrics(self):
         """Calculate all attendance metrics for the period"""
-        from attendance.models import AttendanceRecord
+        from attendance.utils import summarize_attendance, empty_attendance_summary
         from calendar import monthrange
         
         # Get the date range for the month
@@ -190,23 +190,22 @@ class AttendanceAnalytics(models.Model):
         _, last_day = monthrange(self.year, self.month)
         end_date = date(self.year, self.month, last_day)
         
-        # Get attendance records for the period
-        records = AttendanceRecord.objects.filter(
-            employee=self.employee,
-            date__range=[start_date, end_date]
-        )
+        # Get the month's counters from the attendance rollup
+        summary = summarize_attendance(
+            start_date, end_date, [self.employee_id]
+        ).get(self.employee_id) or empty_attendance_summary()
         
         # Calculate basic metrics
-        self.total_working_days = records.count()
-        self.days_present = records.filter(status='PRESENT').count()
-        self.days_absent = records.filter(status='ABSENT').count()
-        self.days_on_leave = records.filter(status='LEAVE').count()
-        self.days_late = records.filter(is_late=True).count()
+        self.total_working_days = summary['total_records']
+        self.days_present = summary['present_days']
+        self.days_absent = summary['absent_days']
+        self.days_on_leave = summary['leave_days']
+        self.days_late = summary['late_days']
         
         # Calculate time metrics
-        self.total_hours_worked = sum(record.total_hours for record in records)
-        self.regular_hours = sum(record.regular_hours for record in records)
-        self.overtime_hours = sum(record.overtime_hours for record in records)
+        self.total_hours_worked = summary['total_hours']
+        self.regular_hours = summary['regular_hours']
+        self.overtime_hours = summary['overtime_hours']
         
         if self.days_present > 0:
             self.average_daily_hours = self.total_hours_worked / self.days_present
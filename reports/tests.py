@@ -1,3 +1,174 @@
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import Count, Q, Sum
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from attendance import utils as attendance_utils
+from attendance.models import AttendanceRecord
+from attendance.utils import AttendanceArchive
+from employees.models import Employee
+from payroll.models import PayrollPeriod
+
+
+class WorkingHoursReportTests(TestCase):
+    """The report reads rollups and archive files but must agree with the raw records"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True, is_active=False)
+        self.employees = [
+            Employee.objects.create(username=f'user{index}', employee_id=f'EMP{index:04d}')
+            for index in range(1, 4)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def create_records(self, start_date, end_date):
+        day = start_date
+        while day <= end_date:
+            if day.weekday() < 5:
+                for index, employee in enumerate(self.employees):
+                    if (day.day + index) % 7 == 0:
+                        AttendanceRecord.objects.create(employee=employee, date=day, status='ABSENT')
+                        continue
+                    time_in = timezone.make_aware(datetime.combine(day, time(9, index * 10)))
+                    AttendanceRecord.objects.create(
+                        employee=employee, date=day, time_in=time_in,
+                        time_out=time_in + timedelta(hours=8 + index), is_late=index == 2
+                    )
+            day += timedelta(days=1)
+
+    def get_report(self, start_date, end_date, **params):
+        response = self.client.get('/api/reports/reports/working_hours/', {
+            'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(), **params
+        })
+        self.assertEqual(response.status_code, 200)
+        return {row['employee_id']: row for row in response.data['data']}
+
+    def get_expected(self, start_date, end_date):
+        rows = AttendanceRecord.objects.filter(date__range=[start_date, end_date]).values(
+            'employee__employee_id'
+        ).annotate(
+            present_days=Count('id', filter=Q(status='PRESENT')),
+            absent_days=Count('id', filter=Q(status='ABSENT')),
+            total_hours=Sum('total_hours'),
+            overtime_hours=Sum('overtime_hours'),
+        )
+        return {row.pop('employee__employee_id'): row for row in rows}
+
+    def assertReportMatches(self, report, expected):
+        self.assertEqual(set(report), set(expected))
+        for employee_id, row in expected.items():
+            self.assertEqual(report[employee_id]['present_days'], row['present_days'])
+            self.assertEqual(report[employee_id]['absent_days'], row['absent_days'])
+            self.assertEqual(Decimal(report[employee_id]['total_hours']), row['total_hours'])
+            self.assertEqual(Decimal(report[employee_id]['overtime_hours']), row['overtime_hours'])
+
+    def test_whole_and_partial_months(self):
+        self.create_records(date(2026, 1, 20), date(2026, 3, 20))
+
+        # January and March are read from records, February from its rollups
+        start_date, end_date = date(2026, 1, 26), date(2026, 3, 10)
+        self.assertReportMatches(self.get_report(start_date, end_date), self.get_expected(start_date, end_date))
+
+    def test_archived_year(self):
+        self.create_records(date(2024, 11, 18), date(2024, 12, 31))
+        PayrollPeriod.objects.create(
+            name='2024', start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+            pay_date=date(2025, 1, 5), is_finalized=True
+        )
+        start_date, end_date = date(2024, 11, 25), date(2024, 12, 31)
+        expected = self.get_expected(start_date, end_date)
+        daily = {
+            employee_id: len(row['daily_breakdown'])
+            for employee_id, row in self.get_report(start_date, end_date, include_daily='true').items()
+        }
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(attendance_utils, 'ATTENDANCE_ARCHIVE_DIR', directory):
+            AttendanceArchive().archive_year(2024)
+            self.assertFalse(AttendanceRecord.objects.filter(date__year=2024).exists())
+
+            report = self.get_report(start_date, end_date, include_daily='true')
+
+        self.assertReportMatches(report, expected)
+        self.assertEqual({employee_id: len(row['daily_breakdown']) for employee_id, row in report.items()}, daily)
+
+
+class OvertimeReportTests(TestCase):
+    """The overtime report sums live years in the database and archived years from their files"""
+
+    def setUp(self):
+        self.admin = Employee.objects.create(username='admin', employee_id='EMP0000', is_staff=True, is_active=False)
+        self.employees = [
+            Employee.objects.create(username=f'user{index}', employee_id=f'EMP{index:04d}')
+            for index in range(1, 3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def create_records(self, start_date, end_date):
+        day = start_date
+        while day <= end_date:
+            if day.weekday() < 5:
+                for index, employee in enumerate(self.employees):
+                    time_in = timezone.make_aware(datetime.combine(day, time(9, 0)))
+                    AttendanceRecord.objects.create(
+                        employee=employee, date=day, time_in=time_in,
+                        time_out=time_in + timedelta(hours=8 + (day.day + index) % 3)
+                    )
+            day += timedelta(days=1)
+
+    def get_report(self, start_date, end_date):
+        response = self.client.get('/api/reports/reports/overtime/', {
+            'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()
+        })
+        self.assertEqual(response.status_code, 200)
+        return {row['employee_id']: row for row in response.data['data']}
+
+    def test_live_year(self):
+        self.create_records(date(2026, 1, 26), date(2026, 3, 6))
+        start_date, end_date = date(2026, 1, 28), date(2026, 3, 4)
+
+        report = self.get_report(start_date, end_date)
+
+        records = AttendanceRecord.objects.filter(date__range=[start_date, end_date], overtime_hours__gt=0)
+        for employee in self.employees:
+            row = report[employee.employee_id]
+            overtime = records.filter(employee=employee)
+            self.assertEqual(
+                Decimal(row['total_overtime_hours']), overtime.aggregate(total=Sum('overtime_hours'))['total']
+            )
+            self.assertEqual(row['overtime_days'], overtime.count())
+            self.assertEqual([month['month'] for month in row['monthly_breakdown']], ['2026-01', '2026-02', '2026-03'])
+            self.assertEqual(
+                sum(Decimal(week['overtime_hours']) for week in row['weekly_breakdown']),
+                Decimal(row['total_overtime_hours'])
+            )
+            first_week = row['weekly_breakdown'][0]
+            self.assertEqual((first_week['week_start'], first_week['week_end']), (date(2026, 1, 28), date(2026, 2, 3)))
+            self.assertEqual(
+                Decimal(first_week['overtime_hours']),
+                overtime.filter(date__lte=date(2026, 2, 3)).aggregate(total=Sum('overtime_hours'))['total']
+            )
+
+    def test_archived_year(self):
+        self.create_records(date(2024, 11, 25), date(2024, 12, 31))
+        self.create_records(date(2025, 1, 1), date(2025, 1, 10))
+        PayrollPeriod.objects.create(
+            name='2024', start_date=date(2024, 1, 1), end_date=date(2024, 12, 31),
+            pay_date=date(2025, 1, 5), is_finalized=True
+        )
+        start_date, end_date = date(2024, 12, 2), date(2025, 1, 8)
+        expected = self.get_report(start_date, end_date)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(attendance_utils, 'ATTENDANCE_ARCHIVE_DIR', directory):
+            AttendanceArchive().archive_year(2024)
+            report = self.get_report(start_date, end_date)
 
-# Create your tests here.
+        self.assertEqual(report, expected)
@@ -16,6 +16,9 @@ from .serializers import (
 from employees.models import Employee, Department
 from employees.permissions import CanViewReports, CanGenerateReports
 from attendance.models import AttendanceRecord, LeaveApplication, LeaveType
+from attendance.utils import (
+    summarize_attendance, empty_attendance_summary, attendance_history, split_archived_range
+)
 from payroll.models import Payroll, PayrollPeriod
 
 
@@ -68,37 +71,33 @@ class ReportsViewSet(viewsets.ViewSet):
         
         report_data = []
         
+        # Get attendance counters for all employees at once, from rollups where possible
+        summaries = summarize_attendance(start_date, end_date, employees.values('id'))
+        total_days = (end_date - start_date).days + 1
+        working_days = self.calculate_working_days(start_date, end_date)
+        
+        # Daily records for all employees at once, archived years are read from their files
+        daily_records = {}
+        if request.query_params.get('include_daily') == 'true':
+            for record in attendance_history(start_date, end_date, employees.values_list('id', flat=True)):
+                daily_records.setdefault(record.employee_id, []).append(record)
+        
         for employee in employees:
-            # Get attendance records for the period
-            attendance_records = AttendanceRecord.objects.filter(
-                employee=employee,
-                date__gte=start_date,
-                date__lte=end_date
-            )
+            summary = summaries.get(employee.id) or empty_attendance_summary()
             
             # Calculate metrics
-            total_days = (end_date - start_date).days + 1
-            working_days = self.calculate_working_days(start_date, end_date)
-            present_days = attendance_records.filter(status='PRESENT').count()
-            absent_days = attendance_records.filter(status='ABSENT').count()
-            leave_days = attendance_records.filter(status='LEAVE').count()
+            present_days = summary['present_days']
+            absent_days = summary['absent_days']
+            leave_days = summary['leave_days']
             
             # Calculate hours
-            total_hours = attendance_records.aggregate(
-                total=Sum('total_hours')
-            )['total'] or Decimal('0.00')
-            
-            regular_hours = attendance_records.aggregate(
-                total=Sum('regular_hours')
-            )['total'] or Decimal('0.00')
-            
-            overtime_hours = attendance_records.aggregate(
-                total=Sum('overtime_hours')
-            )['total'] or Decimal('0.00')
+            total_hours = summary['total_hours']
+            regular_hours = summary['regular_hours']
+            overtime_hours = summary['overtime_hours']
             
             # Calculate rates
             attendance_rate = (present_days / working_days * 100) if working_days > 0 else 0
-            late_days = attendance_records.filter(is_late=True).count()
+            late_days = summary['late_days']
             punctuality_rate = ((present_days - late_days) / present_days * 100) if present_days > 0 else 0
             
             average_daily_hours = total_hours / present_days if present_days > 0 else Decimal('0.00')
@@ -106,7 +105,7 @@ class ReportsViewSet(viewsets.ViewSet):
             # Daily breakdown (optional)
             daily_breakdown = []
             if request.query_params.get('include_daily') == 'true':
-                for record in attendance_records.order_by('date'):
+                for record in daily_records.get(employee.id, []):
                     daily_breakdown.append({
                         'date': record.date,
                         'status': record.status,
@@ -156,21 +155,69 @@ class ReportsViewSet(viewsets.ViewSet):
         
         report_data = []
         
+        # Weeks run from the start date, months follow the calendar
+        weeks = []
+        current_date = start_date
+        while current_date <= end_date:
+            week_end = min(current_date + timedelta(days=6), end_date)
+            weeks.append((current_date, week_end))
+            current_date = week_end + timedelta(days=1)
+        
+        months = []
+        current_month = start_date.replace(day=1)
+        while current_month <= end_date:
+            month_end = (current_month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            months.append((max(current_month, start_date), min(month_end, end_date)))
+            current_month = month_end + timedelta(days=1)
+        
+        buckets = {
+            **{f'week_{index}': week for index, week in enumerate(weeks)},
+            **{f'month_{index}': month for index, month in enumerate(months)},
+        }
+        
+        live_days = Q(pk__in=[])
+        archived_days = []
+        for first_day, last_day, is_archived in split_archived_range(start_date, end_date):
+            if is_archived:
+                archived_days.append((first_day, last_day))
+            else:
+                live_days |= Q(date__range=[first_day, last_day])
+        
+        # Live years are summed per employee, week and month in one grouped query
+        employee_overtime = {}
+        rows = AttendanceRecord.objects.filter(
+            live_days, employee__in=employees, overtime_hours__gt=0
+        ).order_by().values('employee_id').annotate(
+            total=Sum('overtime_hours'),
+            days=Count('id'),
+            **{key: Sum('overtime_hours', filter=Q(date__range=bucket)) for key, bucket in buckets.items()}
+        )
+        for row in rows:
+            employee_overtime[row.pop('employee_id')] = {
+                key: value if value is not None else Decimal('0.00') for key, value in row.items()
+            }
+        
+        # Archived years only keep their files, stream the overtime days in
+        for first_day, last_day in archived_days:
+            for record in attendance_history(first_day, last_day, employees.values_list('id', flat=True)):
+                if record.overtime_hours <= 0:
+                    continue
+                
+                overtime = employee_overtime.setdefault(record.employee_id, {
+                    'total': Decimal('0.00'), 'days': 0, **dict.fromkeys(buckets, Decimal('0.00'))
+                })
+                overtime['total'] += record.overtime_hours
+                overtime['days'] += 1
+                for key, (bucket_start, bucket_end) in buckets.items():
+                    if bucket_start <= record.date <= bucket_end:
+                        overtime[key] += record.overtime_hours
+        
         for employee in employees:
-            # Get attendance records with overtime
-            overtime_records = AttendanceRecord.objects.filter(
-                employee=employee,
-                date__gte=start_date,
-                date__lte=end_date,
-                overtime_hours__gt=0
-            )
+            overtime = employee_overtime.get(employee.id)
             
             # Calculate overtime metrics
-            total_overtime_hours = overtime_records.aggregate(
-                total=Sum('overtime_hours')
-            )['total'] or Decimal('0.00')
-            
-            overtime_days = overtime_records.count()
+            total_overtime_hours = overtime['total'] if overtime else Decimal('0.00')
+            overtime_days = overtime['days'] if overtime else 0
             average_overtime_per_day = (
                 total_overtime_hours / overtime_days if overtime_days > 0 else Decimal('0.00')
             )
@@ -187,48 +234,28 @@ class ReportsViewSet(viewsets.ViewSet):
             
             # Weekly breakdown
             weekly_breakdown = []
-            current_date = start_date
-            while current_date <= end_date:
-                week_end = min(current_date + timedelta(days=6), end_date)
-                week_overtime = overtime_records.filter(
-                    date__gte=current_date,
-                    date__lte=week_end
-                ).aggregate(total=Sum('overtime_hours'))['total'] or Decimal('0.00')
+            for index, (week_start, week_end) in enumerate(weeks):
+                week_overtime = overtime[f'week_{index}'] if overtime else Decimal('0.00')
                 
                 if week_overtime > 0:
                     weekly_breakdown.append({
-                        'week_start': current_date,
+                        'week_start': week_start,
                         'week_end': week_end,
                         'overtime_hours': week_overtime,
                         'overtime_amount': week_overtime * overtime_rate
                     })
-                
-                current_date = week_end + timedelta(days=1)
             
             # Monthly breakdown
             monthly_breakdown = []
-            current_month = start_date.replace(day=1)
-            while current_month <= end_date:
-                month_end = (current_month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-                month_end = min(month_end, end_date)
-                
-                month_overtime = overtime_records.filter(
-                    date__gte=current_month,
-                    date__lte=month_end
-                ).aggregate(total=Sum('overtime_hours'))['total'] or Decimal('0.00')
+            for index, (month_start, month_end) in enumerate(months):
+                month_overtime = overtime[f'month_{index}'] if overtime else Decimal('0.00')
                 
                 if month_overtime > 0:
                     monthly_breakdown.append({
-                        'month': current_month.strftime('%Y-%m'),
+                        'month': month_start.strftime('%Y-%m'),
                         'overtime_hours': month_overtime,
                         'overtime_amount': month_overtime * overtime_rate
                     })
-                
-                # Move to next month
-                if current_month.month == 12:
-                    current_month = current_month.replace(year=current_month.year + 1, month=1)
-                else:
-                    current_month = current_month.replace(month=current_month.month + 1)
             
             employee_data = {
                 'employee_id': employee.employee_id,
@@ -460,26 +487,22 @@ class ReportsViewSet(viewsets.ViewSet):
         
         report_data = []
         
+        # Get attendance counters for all employees at once, from rollups where possible
+        summaries = summarize_attendance(start_date, end_date, employees.values('id'))
+        working_days = self.calculate_working_days(start_date, end_date)
+        
         for employee in employees:
             # Get performance metrics
-            attendance_records = AttendanceRecord.objects.filter(
-                employee=employee,
-                date__gte=start_date,
-                date__lte=end_date
-            )
-            
-            working_days = self.calculate_working_days(start_date, end_date)
-            days_present = attendance_records.filter(status='PRESENT').count()
-            days_late = attendance_records.filter(is_late=True).count()
+            summary = summaries.get(employee.id) or empty_attendance_summary()
+            days_present = summary['present_days']
+            days_late = summary['late_days']
             
             # Calculate scores (0-100)
             attendance_reliability_score = (days_present / working_days * 100) if working_days > 0 else 0
             punctuality_score = ((days_present - days_late) / days_present * 100) if days_present > 0 else 0
             
             # Overtime efficiency (subjective metric)
-            total_overtime = attendance_records.aggregate(
-                total=Sum('overtime_hours')
-            )['total'] or Decimal('0.00')
+            total_overtime = summary['overtime_hours']
             overtime_efficiency_score = min(100, max(0, 100 - float(total_overtime) * 2))  # Penalty for excessive overtime
             
             # Leave utilization score